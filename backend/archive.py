@@ -0,0 +1,106 @@
+"""Cold archive of settled months.
+
+Once every order of a month is delivered or cancelled and its driver payouts
+and cash collections are closed, the month's rows of the hot tables are
+copied to the archive_chunks table: orders, payments and cash collections
+created in it, and every payout, event, deadline, payment or collection of
+its orders, so no row is left pointing at an archived order. Chunks are
+gzip-compressed JSON lines, up to ARCHIVE_CHUNK_SIZE rows each, one chunk
+sequence per table and month. The copy is committed first; the rows leave
+the hot tables (their partition dropped on PostgreSQL, see partitions.py)
+only afterwards, in a second transaction. The archive lives in the database
+because it is the storage every worker shares and that survives a deploy;
+web services get no persistent disk. Chunks are read back only on demand, by
+the export endpoints, when a requested date range reaches an archived month.
+
+Rows are written and read a chunk at a time, so archiving or exporting a
+month keeps memory flat. Values are stored as the API shows them: amounts in
+pesos, enums as their value, datetimes as ISO 8601 (parsed back when read).
+The chunk model comes from server.py.
+"""
+import gzip
+import json
+from collections import namedtuple
+from datetime import datetime
+from enum import Enum
+
+from sqlalchemy import DateTime, delete, func, insert, select
+
+ARCHIVE_CHUNK_SIZE = 5000
+
+
+def _plain(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def pack_rows(rows) -> bytes:
+    """Row mappings -> gzip-compressed JSON lines"""
+    lines = [json.dumps({key: _plain(value) for key, value in row.items()}, separators=(",", ":")) for row in rows]
+    return gzip.compress(("\n".join(lines) + "\n").encode("utf-8"), compresslevel=6)
+
+
+def unpack_rows(data: bytes, table):
+    """gzip-compressed JSON lines of table -> row dicts, datetime columns parsed back"""
+    datetime_columns = [column.name for column in table.columns if isinstance(column.type, DateTime)]
+    rows = []
+    for line in gzip.decompress(data).decode("utf-8").splitlines():
+        row = json.loads(line)
+        for name in datetime_columns:
+            if row.get(name):
+                row[name] = datetime.fromisoformat(row[name])
+        rows.append(row)
+    return rows
+
+
+def write_archive(db, chunk_model, table_name: str, month: datetime, chunks):
+    """Store chunks of row mappings as table_name's archive of month, replacing any earlier attempt
+
+    Runs in the caller's transaction, which must commit before the archived
+    rows are deleted. Returns (rows, compressed bytes).
+    """
+    db.execute(delete(chunk_model).where(chunk_model.table_name == table_name, chunk_model.month == month))
+    rows = stored_bytes = 0
+    for seq, chunk in enumerate(chunk for chunk in chunks if chunk):
+        data = pack_rows(chunk)
+        db.execute(insert(chunk_model).values(table_name=table_name, month=month, seq=seq, row_count=len(chunk), data=data))
+        rows += len(chunk)
+        stored_bytes += len(data)
+    return rows, stored_bytes
+
+
+def archived_row_count(db, chunk_model, table_name: str, month: datetime) -> int:
+    """Rows stored in the archive of table_name for month, as committed"""
+    return db.execute(select(func.coalesce(func.sum(chunk_model.row_count), 0)).where(
+        chunk_model.table_name == table_name, chunk_model.month == month
+    )).scalar()
+
+
+def iter_archive_chunks(session_factory, chunk_model, table, months, columns, date_column: str, start: datetime = None, end: datetime = None):
+    """Rows of table's archived months as tuples of `columns` (attribute access too, like result rows), within [start, end)
+
+    Reads one chunk at a time, in its own session (closed when done).
+    """
+    ArchivedRow = namedtuple("ArchivedRow", columns)
+    db = session_factory()
+    try:
+        for month in months:
+            seqs = db.execute(select(chunk_model.seq).where(
+                chunk_model.table_name == table.name, chunk_model.month == month
+            ).order_by(chunk_model.seq)).scalars().all()
+            for seq in seqs:
+                data = db.execute(select(chunk_model.data).where(
+                    chunk_model.table_name == table.name, chunk_model.month == month, chunk_model.seq == seq
+                )).scalar()
+                rows = [
+                    ArchivedRow(*(row.get(name) for name in columns))
+                    for row in unpack_rows(data, table)
+                    if (start is None or row[date_column] >= start) and (end is None or row[date_column] < end)
+                ]
+                if rows:
+                    yield rows
+    finally:
+        db.close()
@@ -0,0 +1,125 @@
+"""Hot table size vs query cost, before and after moving settled months to the cold archive.
+
+Fills a throwaway SQLite orders table with `months` months of delivered
+orders, times the admin-style queries (newest page, revenue SUM, one month's
+export), then archives all but the last `keep` months the way the archive
+loop does (write_archive to the archive_chunks table, commit, then delete)
+and times them again, plus exporting an archived month back from its
+compressed chunks:
+
+    cd backend && python benchmarks/archive_benchmark.py [orders_per_month] [months] [keep]
+
+Partition pruning itself needs PostgreSQL and is not measured here.
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, String, Text, create_engine, delete, func, insert, select, text
+from sqlalchemy.orm import declarative_base
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from archive import iter_archive_chunks, write_archive  # noqa: E402
+from ids import UUIDKey, new_id  # noqa: E402
+from money import Cents  # noqa: E402
+from partitions import add_months, month_start  # noqa: E402
+
+Base = declarative_base()
+
+
+class Order(Base):
+    __tablename__ = "orders"
+    id = Column(UUIDKey(), primary_key=True, default=new_id)
+    client_id = Column(UUIDKey(), nullable=False, index=True)
+    title = Column(String, nullable=False)
+    description = Column(Text, nullable=False)
+    status = Column(String, nullable=False)
+    financials = Column(Text)
+    total_amount = Column(Cents)
+    created_at = Column(DateTime, nullable=False, index=True)
+
+
+class ArchiveChunk(Base):
+    __tablename__ = "archive_chunks"
+    table_name = Column(String, primary_key=True)
+    month = Column(DateTime, primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    row_count = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+
+
+def timed(function, repeat: int = 5):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - t0) / repeat * 1000, result
+
+
+def measure(engine, label: str, recent_month: datetime):
+    end = add_months(recent_month, 1)
+    with engine.connect() as connection:
+        page_ms, _ = timed(lambda: connection.execute(select(Order.__table__).order_by(Order.created_at.desc()).limit(200)).all())
+        sum_ms, _ = timed(lambda: connection.execute(select(func.count(), func.sum(Order.total_amount))).one())
+        export_ms, rows = timed(lambda: connection.execute(
+            select(Order.__table__).where(Order.created_at >= recent_month, Order.created_at < end).order_by(Order.created_at)
+        ).all())
+    size = os.path.getsize(engine.url.database) / 2 ** 20
+    print(f"{label:<8} database {size:7.1f} MiB  newest page {page_ms:6.1f} ms  count+SUM {sum_ms:7.1f} ms  "
+          f"one month export {export_ms:6.1f} ms ({len(rows):,} rows)")
+
+
+def main(per_month: int = 20_000, months: int = 24, keep: int = 6):
+    random.seed(5)
+    directory = tempfile.mkdtemp()
+    engine = create_engine(f"sqlite:///{os.path.join(directory, 'orders.db')}")
+    Base.metadata.create_all(engine)
+    first = add_months(month_start(datetime.utcnow()), -months + 1)
+    clients = [new_id() for _ in range(2000)]
+    with engine.begin() as connection:
+        for index in range(months):
+            month = add_months(first, index)
+            span = (add_months(month, 1) - month).total_seconds()
+            connection.execute(insert(Order), [{
+                "id": new_id(), "client_id": random.choice(clients), "title": "Mandado", "description": "Recoger paquete " * 8,
+                "status": "delivered", "financials": '{"total_amount": 133.4, "owner_earnings": 33.4}',
+                "total_amount": round(random.uniform(50, 900), 2), "created_at": month + timedelta(seconds=random.uniform(0, span)),
+            } for _ in range(per_month)])
+    recent = add_months(first, months - 1)
+    measure(engine, "before", recent)
+
+    table = Order.__table__
+    archived_rows = archived_bytes = 0
+    t0 = time.perf_counter()
+    for index in range(months - keep):
+        month = add_months(first, index)
+        in_month = (table.c.created_at >= month, table.c.created_at < add_months(month, 1))
+        with engine.begin() as connection:
+            result = connection.execute(
+                select(table).where(*in_month).order_by(table.c.created_at).execution_options(stream_results=True, yield_per=5000)
+            )
+            rows, size = write_archive(connection, ArchiveChunk, table.name, month, result.mappings().partitions())
+        with engine.begin() as connection: # Deleted once the archive is committed
+            connection.execute(delete(table).where(*in_month))
+        archived_rows += rows
+        archived_bytes += size
+    archive_seconds = time.perf_counter() - t0
+    with engine.connect() as connection:
+        connection.execute(text("VACUUM"))
+    print(f"archived {months - keep} months, {archived_rows:,} rows in {archive_seconds:.1f} s -> {archived_bytes / 2 ** 20:.1f} MiB gzip")
+    measure(engine, "after", recent)
+
+    old = first
+    columns = [column.name for column in table.columns]
+    t0 = time.perf_counter()
+    exported = sum(len(chunk) for chunk in iter_archive_chunks(engine.connect, ArchiveChunk, table, [old], columns, "created_at"))
+    print(f"cold     one archived month export {(time.perf_counter() - t0) * 1000:6.1f} ms ({exported:,} rows)")
+    assert exported == per_month
+    shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:4]])
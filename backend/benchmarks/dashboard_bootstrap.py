@@ -0,0 +1,63 @@
+"""Compare admin panel bootstrap: 8 parallel requests vs GET /admin/dashboard.
+
+Runs against a live backend with an admin token and reports the time until
+all data for the first render is available (what fetchData waits for):
+
+    cd backend && BACKEND_URL=http://localhost:8000 ADMIN_TOKEN=... \
+        python benchmarks/dashboard_bootstrap.py [rounds]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+LEGACY_ENDPOINTS = [
+    "/admin/stats",
+    "/admin/users",
+    "/orders",
+    "/admin/commission-config",
+    "/payments/transactions",
+    "/admin/driver-payouts",
+    "/admin/cash-collections",
+    "/admin/pending-drivers",
+]
+
+
+async def legacy_bootstrap(client):
+    responses = await asyncio.gather(*[client.get(endpoint) for endpoint in LEGACY_ENDPOINTS])
+    for response in responses:
+        response.raise_for_status()
+    return sum(len(response.content) for response in responses)
+
+
+async def dashboard_bootstrap(client):
+    response = await client.get("/admin/dashboard")
+    response.raise_for_status()
+    return len(response.content)
+
+
+async def measure(label, bootstrap, client, rounds: int):
+    await bootstrap(client) # Warm up connections
+    timings = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        size = await bootstrap(client)
+        timings.append(time.perf_counter() - t0)
+    print(f"{label:<28} median {statistics.median(timings) * 1000:7.1f} ms  p95 {sorted(timings)[int(len(timings) * 0.95) - 1] * 1000:7.1f} ms  ({size / 1024:.0f} KiB)")
+    return statistics.median(timings)
+
+
+async def main(rounds: int = 20):
+    base_url = os.environ.get("BACKEND_URL", "http://localhost:8000").rstrip("/") + "/api"
+    headers = {"Authorization": f"Bearer {os.environ['ADMIN_TOKEN']}", "Cache-Control": "no-cache"}
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, timeout=60) as client:
+        legacy = await measure("8 parallel requests", legacy_bootstrap, client, rounds)
+        dashboard = await measure("GET /admin/dashboard", dashboard_bootstrap, client, rounds)
+    print(f"⏱️ time to first render data: {legacy * 1000:.0f} ms -> {dashboard * 1000:.0f} ms ({(1 - dashboard / legacy) * 100:.0f}% less)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*[int(arg) for arg in sys.argv[1:2]]))
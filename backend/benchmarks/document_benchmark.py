@@ -0,0 +1,131 @@
+"""Document image pipeline: event loop stalls, throughput, stored size and duplicate detection.
+
+Generates synthetic 12 MP document photos (base64 JPEG, like the app's
+uploads), then processes them with process_document_image:
+
+- inline, on the event loop, as a request handler would;
+- through a spawned ProcessPoolExecutor, as the app's document workers do;
+
+while a heartbeat task measures how late the event loop runs (what every other
+request would wait). Then checks the perceptual hash: each photo against a
+re-taken copy of itself (rescaled, slightly rotated, blurred, brighter,
+recompressed) and against the other documents:
+
+    cd backend && python benchmarks/document_benchmark.py [documents] [workers]
+"""
+import asyncio
+import base64
+import io
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from documents import hamming_distances, process_document_image  # noqa: E402
+
+MAX_SIDE = 1600
+THUMBNAIL_SIDES = {"review": 800, "small": 200}
+DUPLICATE_DISTANCE = 5
+
+
+def document_photo(seed: int, size=(4000, 3000)):
+    """A card-like document: background, photo block, lines of 'text'"""
+    random = np.random.default_rng(seed)
+    image = Image.new("RGB", size, tuple(int(v) for v in random.integers(180, 245, 3)))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([200, 300, 1300, 1700], fill=tuple(int(v) for v in random.integers(40, 160, 3)))
+    for _ in range(int(random.integers(10, 25))):
+        x, y = int(random.integers(1400, 3400)), int(random.integers(250, 2700))
+        draw.rectangle([x, y, x + int(random.integers(200, 1400)), y + int(random.integers(40, 110))], fill=(30, 30, 40))
+    noise = random.normal(0, 6, (size[1], size[0], 1)) # Sensor noise, so the JPEGs are photo sized
+    return Image.fromarray(np.clip(np.asarray(image, dtype=np.float32) + noise, 0, 255).astype(np.uint8))
+
+
+def retaken(image: Image.Image, seed: int):
+    """The same document photographed again"""
+    random = np.random.default_rng(seed)
+    image = image.rotate(float(random.uniform(-2, 2)), resample=Image.Resampling.BILINEAR, fillcolor=(200, 200, 200))
+    image = image.resize((int(image.width * 0.8), int(image.height * 0.8)))
+    image = ImageEnhance.Brightness(image.filter(ImageFilter.GaussianBlur(1.5))).enhance(float(random.uniform(0.85, 1.15)))
+    return image
+
+
+def upload(image: Image.Image, quality: int = 90) -> str:
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+async def heartbeat(lags, stop, interval: float = 0.005):
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - expected) * 1000)
+
+
+async def timed_run(label: str, work):
+    lags, stop = [], asyncio.Event()
+    monitor = asyncio.create_task(heartbeat(lags, stop))
+    await asyncio.sleep(0.05)
+    t0 = time.perf_counter()
+    results = await work()
+    seconds = time.perf_counter() - t0
+    stop.set()
+    await monitor
+    lags.sort()
+    print(f"{label:<22} {len(results) / seconds:6.1f} docs/s   event loop lag p50 {statistics.median(lags):7.1f} ms  "
+          f"p99 {lags[int(len(lags) * 0.99) - 1]:7.1f} ms  max {lags[-1]:7.1f} ms")
+    return results
+
+
+async def main(count: int = 24, workers: int = 4):
+    images = [document_photo(seed) for seed in range(count)]
+    uploads = [upload(image) for image in images]
+    print(f"{count} uploads, {uploads and len(uploads[0]) * 3 // 4 // 1024} KB each (4000x3000 JPEG)")
+
+    async def inline():
+        results = []
+        for data in uploads:
+            results.append(process_document_image(data, MAX_SIDE, THUMBNAIL_SIDES))
+            await asyncio.sleep(0) # Between requests at best
+        return results
+
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"), max_tasks_per_child=500)
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*[loop.run_in_executor(pool, process_document_image, uploads[0], MAX_SIDE, THUMBNAIL_SIDES) for _ in range(workers)])
+
+    async def pooled():
+        return await asyncio.gather(*[
+            loop.run_in_executor(pool, process_document_image, data, MAX_SIDE, THUMBNAIL_SIDES) for data in uploads
+        ])
+
+    await timed_run("inline (event loop)", inline)
+    results = await timed_run(f"process pool x{workers}", pooled)
+    pool.shutdown()
+
+    steps = {step: statistics.median(result["timings"][step] for result in results) for step in results[0]["timings"]}
+    print("median step ms:", ", ".join(f"{step} {value:.1f}" for step, value in steps.items()))
+    original = sum(result["original_bytes"] for result in results)
+    stored = sum(result["processed_bytes"] for result in results)
+    thumbnails = sum(len(data) * 3 // 4 for result in results for data in result["thumbnails"].values())
+    print(f"stored {original / 2 ** 20:.1f} MiB -> {stored / 2 ** 20:.1f} MiB ({stored / original:.0%}), thumbnails {thumbnails / 2 ** 20:.1f} MiB")
+    assert all(not result["issues"] and max(result["width"], result["height"]) == MAX_SIDE for result in results)
+
+    hashes = [result["phash"] for result in results]
+    again = [process_document_image(upload(retaken(image, seed), 75), MAX_SIDE, THUMBNAIL_SIDES)["phash"] for seed, image in enumerate(images)]
+    same = [int(hamming_distances(hashes[i], [again[i]])[0]) for i in range(count)]
+    different = [int(d) for i in range(count) for d in hamming_distances(hashes[i], hashes[i + 1:] + again[:i] + again[i + 1:])]
+    print(f"phash distance, same document re-taken: max {max(same)} (median {statistics.median(same)}); "
+          f"different documents: min {min(different)} (median {statistics.median(different)})")
+    print(f"at {DUPLICATE_DISTANCE} bits: {sum(d > DUPLICATE_DISTANCE for d in same)}/{len(same)} re-takes missed, "
+          f"{sum(d <= DUPLICATE_DISTANCE for d in different)}/{len(different)} different pairs flagged")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*[int(arg) for arg in sys.argv[1:3]]))
@@ -0,0 +1,146 @@
+"""Content-addressed document storage vs rewriting the base64 blob on every upload.
+
+Replays a driver upload mix on two throwaway SQLite databases: the old way
+(every upload rewrites documents.file_data and is validated / processed
+again) and the content-addressed way (SHA-256 of the decoded bytes, one
+document_blobs row per content with a reference count, identical re-uploads
+short-circuited). Reports the dedup ratio, bytes written and database size,
+and the upload handling time, processing included:
+
+    cd backend && python benchmarks/document_dedup_benchmark.py [drivers] [distinct_photos]
+"""
+import base64
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+from sqlalchemy import BigInteger, Column, Integer, MetaData, String, Table, Text, create_engine, func, insert, select, update
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from documents import process_document_image, upload_digest  # noqa: E402
+
+MAX_SIDE = 1600
+THUMBNAIL_SIDES = {"review": 800, "small": 200}
+
+
+def photo(seed: int) -> str:
+    """A 3000x2000 phone-photo-sized JPEG upload (base64)"""
+    pixels = np.random.default_rng(seed).normal(140, 25, (2000 // 8, 3000 // 8, 3)).clip(0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).resize((3000, 2000), Image.Resampling.BICUBIC).save(buffer, format="JPEG", quality=90)
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def upload_mix(drivers: int, photos: int):
+    """(driver, document type, photo index): each driver uploads INE and license, often sending
+    the very same file again (double taps, retries, both upload endpoints), sometimes a new photo"""
+    random.seed(3)
+    uploads, next_photo = [], 0
+    for driver in range(drivers):
+        for document_type in ("ine", "drivers_license"):
+            current = next_photo % photos
+            next_photo += 1
+            uploads.append((driver, document_type, current))
+            for _ in range(random.choice([0, 0, 1, 1, 2, 3])):
+                if random.random() < 0.2:
+                    current = next_photo % photos
+                    next_photo += 1
+                uploads.append((driver, document_type, current))
+    return uploads
+
+
+def tables(metadata):
+    legacy = Table("documents", metadata, Column("id", String, primary_key=True), Column("file_data", Text, nullable=False))
+    documents = Table("documents_ca", metadata, Column("id", String, primary_key=True), Column("content_sha256", String(64)))
+    blobs = Table(
+        "document_blobs", metadata,
+        Column("sha256", String(64), primary_key=True), Column("data", Text, nullable=False),
+        Column("upload_bytes", BigInteger, nullable=False), Column("stored_bytes", BigInteger, nullable=False),
+        Column("ref_count", Integer, nullable=False), Column("upload_count", Integer, nullable=False),
+    )
+    return legacy, documents, blobs
+
+
+def run_legacy(engine, legacy, uploads, files):
+    t0, processed, written = time.perf_counter(), 0, 0
+    with engine.begin() as connection:
+        for driver, document_type, index in uploads:
+            key = f"{driver}:{document_type}"
+            process_document_image(files[index], MAX_SIDE, THUMBNAIL_SIDES) # Validated again every time
+            processed += 1
+            values = {"file_data": files[index]}
+            if not connection.execute(update(legacy).where(legacy.c.id == key).values(values)).rowcount:
+                connection.execute(insert(legacy).values(id=key, **values))
+            written += len(files[index])
+    return time.perf_counter() - t0, processed, written
+
+
+def run_content_addressed(engine, documents, blobs, uploads, files):
+    t0, processed, written = time.perf_counter(), 0, 0
+    with engine.begin() as connection:
+        for driver, document_type, index in uploads:
+            key = f"{driver}:{document_type}"
+            digest, size, data = upload_digest(files[index])
+            current = connection.execute(select(documents.c.content_sha256).where(documents.c.id == key)).scalar()
+            counters = {"upload_count": blobs.c.upload_count + 1}
+            if current == digest: # Identical re-upload: nothing stored, nothing validated
+                connection.execute(update(blobs).where(blobs.c.sha256 == digest).values(counters))
+                continue
+            counters["ref_count"] = blobs.c.ref_count + 1
+            if not connection.execute(update(blobs).where(blobs.c.sha256 == digest).values(counters)).rowcount:
+                result = process_document_image(data, MAX_SIDE, THUMBNAIL_SIDES) # Once per content
+                processed += 1
+                connection.execute(insert(blobs).values(
+                    sha256=digest, data=result["file_data"], upload_bytes=size, stored_bytes=result["processed_bytes"],
+                    ref_count=1, upload_count=1,
+                ))
+                written += len(result["file_data"])
+            if current:
+                connection.execute(update(blobs).where(blobs.c.sha256 == current).values(ref_count=blobs.c.ref_count - 1))
+                connection.execute(blobs.delete().where(blobs.c.sha256 == current, blobs.c.ref_count <= 0))
+                connection.execute(update(documents).where(documents.c.id == key).values(content_sha256=digest))
+            else:
+                connection.execute(insert(documents).values(id=key, content_sha256=digest))
+    return time.perf_counter() - t0, processed, written
+
+
+def main(drivers: int = 60, photos: int = 150):
+    files = [photo(seed) for seed in range(photos)]
+    uploads = upload_mix(drivers, photos)
+    directory = tempfile.mkdtemp()
+    results = {}
+    for name in ("legacy", "content_addressed"):
+        engine = create_engine(f"sqlite:///{os.path.join(directory, name + '.db')}")
+        metadata = MetaData()
+        legacy, documents, blobs = tables(metadata)
+        metadata.create_all(engine)
+        if name == "legacy":
+            seconds, processed, written = run_legacy(engine, legacy, uploads, files)
+        else:
+            seconds, processed, written = run_content_addressed(engine, documents, blobs, uploads, files)
+            with engine.connect() as connection:
+                # What GET /admin/documents/storage reports
+                contents, upload_count, uploaded, unique = connection.execute(select(
+                    func.count(blobs.c.sha256), func.sum(blobs.c.upload_count),
+                    func.sum(blobs.c.upload_count * blobs.c.upload_bytes), func.sum(blobs.c.upload_bytes),
+                )).one()
+        with engine.connect() as connection:
+            connection.exec_driver_sql("VACUUM")
+        size = os.path.getsize(engine.url.database)
+        results[name] = (seconds, processed, written, size)
+
+    print(f"{len(uploads)} uploads by {drivers} drivers ({len(files[0]) * 3 // 4 // 1024} KB photos)")
+    for name, (seconds, processed, written, size) in results.items():
+        print(f"{name:<18} handled in {seconds:6.1f} s ({seconds / len(uploads) * 1000:5.0f} ms/upload)  pipeline runs {processed:4}  "
+              f"base64 written {written / 2 ** 20:7.1f} MiB  database {size / 2 ** 20:6.1f} MiB")
+    print(f"live contents {contents}, uploads counted {upload_count}, dedup ratio {upload_count / contents:.2f}, "
+          f"bytes saved by dedup {(uploaded - unique) / 2 ** 20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,55 @@
+"""Fire duplicate in-flight requests with the same Idempotency-Key at a slow endpoint.
+
+Checks that the endpoint body runs once per key and every duplicate gets the
+same response, then reports replay latency:
+
+    cd backend && python benchmarks/idempotency_concurrency.py [duplicates]
+"""
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from idempotency import IdempotencyStore, idempotency_middleware  # noqa: E402
+
+executions = {"count": 0}
+app = FastAPI()
+app.middleware("http")(idempotency_middleware(IdempotencyStore(ttl_seconds=60), [r"/api/orders"]))
+
+
+@app.post("/api/orders")
+async def create_order(payload: dict):
+    executions["count"] += 1
+    await asyncio.sleep(0.2) # Slow enough for every duplicate to arrive while in flight
+    return {"order_id": f"order-{executions['count']}", "title": payload["title"]}
+
+
+async def main(duplicates: int = 50):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        headers = {"Idempotency-Key": "retry-123", "Authorization": "Bearer client-a"}
+        t0 = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.post("/api/orders", json={"title": "Mandado"}, headers=headers) for _ in range(duplicates)
+        ])
+        t1 = time.perf_counter()
+        replay = await client.post("/api/orders", json={"title": "Mandado"}, headers=headers)
+        t2 = time.perf_counter()
+        mismatch = await client.post("/api/orders", json={"title": "Otro"}, headers=headers)
+
+    bodies = {r.text for r in responses}
+    assert executions["count"] == 1, executions
+    assert len(bodies) == 1 and all(r.status_code == 200 for r in responses), bodies
+    assert replay.headers.get("Idempotent-Replayed") == "true" and replay.text in bodies
+    assert mismatch.status_code == 422
+
+    print(f"✅ {duplicates} concurrent duplicates -> 1 execution, identical responses ({t1 - t0:.2f}s)")
+    print(f"🔁 replay after completion: {(t2 - t1) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*[int(arg) for arg in sys.argv[1:2]]))
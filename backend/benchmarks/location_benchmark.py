@@ -0,0 +1,83 @@
+"""Benchmark the in-memory driver location store and the batched history flush.
+
+Simulates a fleet reporting around Mexico City, then measures ingest rate,
+"drivers near P" latency and the time to flush the buffered points to a
+throwaway SQLite history table:
+
+    cd backend && python benchmarks/location_benchmark.py [drivers] [points_per_driver]
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, DateTime, Float, Integer, String, create_engine
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from locations import LocationStore, flush_positions  # noqa: E402
+
+Base = declarative_base()
+CDMX = (19.4326, -99.1332)
+
+
+class DriverLocation(Base):
+    __tablename__ = "driver_location_history"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    driver_id = Column(String, nullable=False)
+    lat = Column(Float, nullable=False)
+    lng = Column(Float, nullable=False)
+    accuracy = Column(Float)
+    speed = Column(Float)
+    heading = Column(Float)
+    recorded_at = Column(DateTime, nullable=False)
+    received_at = Column(DateTime, nullable=False)
+
+
+def main(drivers: int = 5000, points_per_driver: int = 20):
+    random.seed(11)
+    store = LocationStore(max_pending=drivers * points_per_driver)
+    start = datetime.utcnow() - timedelta(seconds=points_per_driver)
+    positions = {f"driver-{i}": (CDMX[0] + random.uniform(-0.25, 0.25), CDMX[1] + random.uniform(-0.25, 0.25)) for i in range(drivers)}
+
+    # Drivers send 5-point batches, like the app does between uploads
+    batches = []
+    for step in range(0, points_per_driver, 5):
+        for driver_id, (lat, lng) in positions.items():
+            batch = []
+            for offset in range(5):
+                lat += random.uniform(-0.0005, 0.0005)
+                lng += random.uniform(-0.0005, 0.0005)
+                batch.append((lat, lng, 8.0, 6.5, 90.0, start + timedelta(seconds=step + offset)))
+            positions[driver_id] = (lat, lng)
+            batches.append((driver_id, batch))
+
+    t0 = time.perf_counter()
+    for driver_id, batch in batches:
+        store.ingest(driver_id, batch)
+    ingest = time.perf_counter() - t0
+    total = drivers * points_per_driver
+    print(f"📍 ingested {total} points from {drivers} drivers in {ingest:.2f}s ({total / ingest:,.0f} points/s)")
+
+    queries = 1000
+    t0 = time.perf_counter()
+    found = 0
+    for _ in range(queries):
+        found += len(store.near(CDMX[0] + random.uniform(-0.2, 0.2), CDMX[1] + random.uniform(-0.2, 0.2), 3.0, limit=20))
+    near = time.perf_counter() - t0
+    print(f"🔎 {queries} nearby queries (3 km, top 20): {near / queries * 1000:.3f} ms each, {found / queries:.1f} drivers on average")
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    pending = store.drain()
+    t0 = time.perf_counter()
+    flush_positions(db, DriverLocation, pending)
+    db.commit()
+    flush = time.perf_counter() - t0
+    print(f"💾 flushed {len(pending)} history rows in {flush:.2f}s ({len(pending) / flush:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,67 @@
+"""Compare revenue stats over float pesos in JSON vs BIGINT centavo columns.
+
+Builds a throwaway SQLite orders table with financials stored both ways and
+times the old get_admin_stats approach (load every delivered order, parse the
+financials JSON, sum floats in Python) against SUM() over the Cents columns.
+Also reports how far the float sum drifts from the exact total:
+
+    cd backend && python benchmarks/money_benchmark.py [orders]
+"""
+import json
+import os
+import random
+import sys
+import time
+
+from sqlalchemy import Column, Integer, Text, create_engine, func, insert, select
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from financials import calculate_order_financials_batch, financials_rows  # noqa: E402
+from money import Cents, to_cents  # noqa: E402
+
+Base = declarative_base()
+
+
+class Order(Base):
+    __tablename__ = "orders"
+    id = Column(Integer, primary_key=True)
+    financials = Column(Text)
+    total_amount = Column(Cents)
+    owner_earnings = Column(Cents)
+
+
+def main(orders: int = 200_000):
+    random.seed(3)
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    prices = [round(random.uniform(50, 5000), 2) for _ in range(orders)]
+    rows = financials_rows(calculate_order_financials_batch(prices, 0.15, 15.0))
+    with Session() as db:
+        db.execute(insert(Order), [
+            {"financials": json.dumps(row), "total_amount": row["total_amount"], "owner_earnings": row["owner_earnings"]}
+            for row in rows
+        ])
+        db.commit()
+
+        t0 = time.perf_counter()
+        loaded = db.execute(select(Order.financials)).scalars().all()
+        float_revenue = sum(json.loads(financials).get("total_amount", 0) for financials in loaded)
+        float_commission = sum(json.loads(financials).get("owner_earnings", 0) for financials in loaded)
+        json_seconds = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        revenue, commission = db.execute(select(func.sum(Order.total_amount), func.sum(Order.owner_earnings))).one()
+        sql_seconds = time.perf_counter() - t0
+
+    exact = sum(to_cents(row["total_amount"]) for row in rows)
+    assert to_cents(revenue) == exact
+    print(f"💰 {orders:,} delivered orders")
+    print(f"   JSON + float sum: {json_seconds * 1000:8.1f} ms  revenue {float_revenue!r}  commission {float_commission!r}")
+    print(f"   SUM(centavos):    {sql_seconds * 1000:8.1f} ms  revenue {revenue!r}  commission {commission!r}")
+    print(f"   float drift: {abs(float_revenue * 100 - exact):.6f} centavos, speedup {json_seconds / sql_seconds:.0f}x")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
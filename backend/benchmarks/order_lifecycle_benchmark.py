@@ -0,0 +1,309 @@
+"""Order lifecycle writes: one commit per request vs the commit-per-step handlers they replaced.
+
+Replays the database work of create_order, update_order_status (to delivered)
+and complete_cash_payment both ways on throwaway tables, one session per
+request like get_db:
+
+- multi-commit: a commit and a db.refresh after each step, read-modify-write
+  counters, the payout created from a second session, and
+- single commit: one unit of work, atomic ``x = x + :n`` counters, no refresh.
+
+Reports latency percentiles and statements / commits per request, and checks
+both leave the same counters and rows behind:
+
+    cd backend && python benchmarks/order_lifecycle_benchmark.py [requests]
+    cd backend && DATABASE_URL=postgresql://... python benchmarks/order_lifecycle_benchmark.py [requests]
+
+Without DATABASE_URL it runs on a SQLite file. Tables are prefixed bench_ and
+dropped at the end.
+"""
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, String, Text, create_engine, event, func, select
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+Base = declarative_base()
+
+
+class User(Base):
+    __tablename__ = "bench_users"
+    id = Column(String, primary_key=True)
+    name = Column(String, nullable=False)
+    total_orders = Column(Integer, default=0, nullable=False)
+    total_earnings = Column(Float, default=0.0, nullable=False)
+
+
+class Order(Base):
+    __tablename__ = "bench_orders"
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    client_id = Column(String, ForeignKey("bench_users.id"), nullable=False, index=True)
+    driver_id = Column(String, ForeignKey("bench_users.id"), nullable=True, index=True)
+    title = Column(String, nullable=False)
+    price = Column(Float, nullable=False)
+    status = Column(String, default="pending", nullable=False)
+    payment_status = Column(String, default="pending", nullable=False)
+    payment_method = Column(String, default="cash", nullable=False)
+    financials = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    delivered_at = Column(DateTime, nullable=True)
+
+
+class PaymentTransaction(Base):
+    __tablename__ = "bench_payment_transactions"
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    order_id = Column(String, nullable=True, index=True)
+    amount = Column(Float, nullable=False)
+    payment_method = Column(String, nullable=False)
+    payment_status = Column(String, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class CashCollection(Base):
+    __tablename__ = "bench_cash_collections"
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    driver_id = Column(String, ForeignKey("bench_users.id"), nullable=False, index=True)
+    order_id = Column(String, ForeignKey("bench_orders.id"), nullable=False, index=True)
+    amount_collected = Column(Float, nullable=False)
+    commission_owed = Column(Float, nullable=False)
+    payment_status = Column(String, default="pending", nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class DriverPayout(Base):
+    __tablename__ = "bench_driver_payouts"
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    driver_id = Column(String, ForeignKey("bench_users.id"), nullable=False, index=True)
+    order_id = Column(String, ForeignKey("bench_orders.id"), nullable=False, index=True)
+    amount = Column(Float, nullable=False)
+    transfer_status = Column(String, default="pending", nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+def financials(price: float):
+    return {"total_amount": round(price * 1.15, 2), "owner_earnings": round(price * 0.25, 2), "driver_earnings": round(price * 0.9, 2)}
+
+
+def order_response(order: Order, client_name: str):
+    return {"id": order.id, "title": order.title, "status": order.status, "created_at": order.created_at, "client_name": client_name}
+
+
+# Multi-commit handlers (before)
+def create_order_multi(Session, client: dict, title: str, price: float):
+    with Session() as db:
+        order = Order(client_id=client["id"], title=title, price=price, financials=json.dumps(financials(price)))
+        db.add(order)
+        db.commit()
+        db.refresh(order)
+        client_db = db.query(User).filter(User.id == client["id"]).first()
+        client_db.total_orders += 1
+        db.add(client_db)
+        db.commit()
+        db.refresh(client_db)
+        return order_response(order, client["name"])
+
+
+def deliver_order_multi(Session, order_id: str):
+    with Session() as db:
+        order = db.query(Order).filter(Order.id == order_id).first()
+        order.status = "delivered"
+        order.delivered_at = datetime.utcnow()
+        driver = db.query(User).filter(User.id == order.driver_id).first()
+        driver.total_earnings += json.loads(order.financials).get("driver_earnings", 0)
+        db.add(driver)
+        db.commit()
+        db.refresh(driver)
+        db.add(order)
+        db.commit()
+        db.refresh(order)
+
+
+def create_payout_own_session(Session, order_id: str):
+    with Session() as db:
+        order = db.query(Order).filter(Order.id == order_id).first()
+        if db.query(DriverPayout).filter(DriverPayout.order_id == order_id).first():
+            return
+        payout = DriverPayout(driver_id=order.driver_id, order_id=order_id, amount=json.loads(order.financials)["driver_earnings"])
+        db.add(payout)
+        db.commit()
+        db.refresh(payout)
+
+
+def complete_cash_payment_multi(Session, order_id: str):
+    with Session() as db:
+        order = db.query(Order).filter(Order.id == order_id).first()
+        order.payment_status = "paid"
+        db.add(order)
+        db.commit()
+        db.refresh(order)
+        transaction = db.query(PaymentTransaction).filter(
+            PaymentTransaction.order_id == order_id, PaymentTransaction.payment_method == "cash", PaymentTransaction.payment_status == "pending"
+        ).first()
+        if transaction:
+            transaction.payment_status = "paid"
+            transaction.updated_at = datetime.utcnow()
+            db.add(transaction)
+            db.commit()
+            db.refresh(transaction)
+        amounts = json.loads(order.financials)
+        collection = CashCollection(driver_id=order.driver_id, order_id=order.id, amount_collected=amounts["total_amount"],
+                                    commission_owed=amounts["owner_earnings"])
+        db.add(collection)
+        db.commit()
+        db.refresh(collection)
+    create_payout_own_session(Session, order_id)
+
+
+# Single-commit handlers (after)
+def create_order_single(Session, client: dict, title: str, price: float):
+    with Session() as db:
+        order = Order(client_id=client["id"], title=title, price=price, financials=json.dumps(financials(price)))
+        db.add(order)
+        db.flush()
+        db.query(User).filter(User.id == client["id"]).update({User.total_orders: User.total_orders + 1}, synchronize_session=False)
+        response = order_response(order, client["name"])
+        db.commit()
+        return response
+
+
+def deliver_order_single(Session, order_id: str):
+    with Session() as db:
+        order = db.query(Order).filter(Order.id == order_id).first()
+        order.status = "delivered"
+        order.delivered_at = datetime.utcnow()
+        db.query(User).filter(User.id == order.driver_id).update(
+            {User.total_earnings: User.total_earnings + json.loads(order.financials).get("driver_earnings", 0)}, synchronize_session=False
+        )
+        db.commit()
+
+
+def complete_cash_payment_single(Session, order_id: str):
+    with Session() as db:
+        order = db.query(Order).filter(Order.id == order_id).first()
+        order.payment_status = "paid"
+        db.query(PaymentTransaction).filter(
+            PaymentTransaction.order_id == order_id, PaymentTransaction.payment_method == "cash", PaymentTransaction.payment_status == "pending"
+        ).update({PaymentTransaction.payment_status: "paid", PaymentTransaction.updated_at: datetime.utcnow()}, synchronize_session=False)
+        amounts = json.loads(order.financials)
+        db.add(CashCollection(driver_id=order.driver_id, order_id=order.id, amount_collected=amounts["total_amount"],
+                              commission_owed=amounts["owner_earnings"]))
+        if not db.query(DriverPayout.id).filter(DriverPayout.order_id == order.id).first():
+            db.add(DriverPayout(driver_id=order.driver_id, order_id=order.id, amount=amounts["driver_earnings"]))
+        db.commit()
+
+
+VARIANTS = {
+    "multi-commit": (create_order_multi, deliver_order_multi, complete_cash_payment_multi),
+    "single commit": (create_order_single, deliver_order_single, complete_cash_payment_single),
+}
+
+
+class Counter:
+    """Statements and commits sent by the engine"""
+
+    def __init__(self, engine):
+        self.statements = self.commits = 0
+        event.listen(engine, "before_cursor_execute", self._statement)
+        event.listen(engine, "commit", self._commit)
+
+    def _statement(self, *args):
+        self.statements += 1
+
+    def _commit(self, *args):
+        self.commits += 1
+
+    def snapshot(self):
+        return self.statements, self.commits
+
+
+def measure(counter, calls):
+    """Run calls one after the other; returns per-call latencies (ms), statements and commits per call"""
+    statements, commits = counter.snapshot()
+    latencies = []
+    for call in calls:
+        t0 = time.perf_counter()
+        call()
+        latencies.append((time.perf_counter() - t0) * 1000)
+    after_statements, after_commits = counter.snapshot()
+    return latencies, (after_statements - statements) / len(calls), (after_commits - commits) / len(calls)
+
+
+def seed(Session, clients: int, drivers: int):
+    """Clients as the handlers get them (id and name, like current_user) and driver ids"""
+    users = [{"id": str(uuid.uuid4()), "name": f"Cliente {i}"} for i in range(clients)]
+    users += [{"id": str(uuid.uuid4()), "name": f"Repartidor {i}"} for i in range(drivers)]
+    with Session() as db:
+        db.add_all([User(**user, total_orders=0, total_earnings=0.0) for user in users])
+        db.commit()
+    return users[:clients], [user["id"] for user in users[clients:]]
+
+
+def run_variant(engine, counter, name: str, requests: int):
+    create_order, deliver_order, complete_cash_payment = VARIANTS[name]
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    rng = random.Random(5)
+    clients, drivers = seed(Session, 50, 20)
+
+    plan = [(rng.choice(clients), f"Entregar paquete {i}", round(rng.uniform(40, 900), 2)) for i in range(requests)]
+    created = []
+    results = {"create_order": measure(counter, [
+        lambda client=client, title=title, price=price: created.append(create_order(Session, client, title, price)["id"])
+        for client, title, price in plan
+    ])}
+
+    # Drivers accept the orders and a cash transaction is pending for each, outside the timed handlers
+    with Session() as db:
+        for order_id in created:
+            db.query(Order).filter(Order.id == order_id).update({Order.driver_id: rng.choice(drivers), Order.status: "accepted"})
+            db.add(PaymentTransaction(order_id=order_id, amount=0.0, payment_method="cash", payment_status="pending"))
+        db.commit()
+
+    results["update_order_status"] = measure(counter, [lambda order_id=order_id: deliver_order(Session, order_id) for order_id in created])
+    results["complete_cash_payment"] = measure(counter, [lambda order_id=order_id: complete_cash_payment(Session, order_id) for order_id in created])
+
+    with Session() as db:
+        total_orders, total_earnings = db.execute(select(func.sum(User.total_orders), func.sum(User.total_earnings))).one()
+        state = (
+            (total_orders, round(total_earnings, 2)),
+            db.query(CashCollection).count(), db.query(DriverPayout).count(),
+            db.query(PaymentTransaction).filter(PaymentTransaction.payment_status == "paid").count(),
+        )
+    return results, state
+
+
+def main(requests: int = 2000):
+    url = os.environ.get("DATABASE_URL") or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'lifecycle.db')}"
+    engine = create_engine(url)
+    counter = Counter(engine)
+    print(f"🧾 {engine.dialect.name}: {requests:,} orders created, delivered and paid in cash per variant")
+
+    measured, states = {}, {}
+    for name in VARIANTS:
+        measured[name], states[name] = run_variant(engine, counter, name, requests)
+    Base.metadata.drop_all(engine)
+    assert len(set(states.values())) == 1, f"variants disagree: {states}"
+    total_orders, total_earnings = states["single commit"][0]
+    assert total_orders == requests and all(count == requests for count in states["single commit"][1:]), states
+
+    for handler in measured["single commit"]:
+        medians = {}
+        for name in VARIANTS:
+            latencies, statements, commits = measured[name][handler]
+            medians[name] = statistics.median(latencies)
+            p95 = sorted(latencies)[int(len(latencies) * 0.95)]
+            print(f"   {handler:<22} {name:<14} median {medians[name]:6.2f} ms  p95 {p95:6.2f} ms  "
+                  f"{statements:4.1f} statements  {commits:3.1f} commits")
+        print(f"   {'':<22} {'':<14} median {medians['multi-commit'] / medians['single commit']:.1f}x faster with one commit")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,77 @@
+"""Benchmark order quotes through RouteService with the local geocoder.
+
+Measures cold quotes (geocode + persist), warm quotes (in-process LRU) and
+quotes after a restart (served from the route_cache table), on SQLite:
+
+    cd backend && python benchmarks/route_quote_benchmark.py [pairs]
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Float, String, create_engine
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from routing import LocalGeocoder, RouteService, quote_price  # noqa: E402
+
+Base = declarative_base()
+
+
+class GeocodeCache(Base):
+    __tablename__ = "geocode_cache"
+    key = Column(String, primary_key=True)
+    address = Column(String, nullable=False)
+    lat = Column(Float, nullable=False)
+    lng = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class RouteCache(Base):
+    __tablename__ = "route_cache"
+    key = Column(String, primary_key=True)
+    distance_km = Column(Float, nullable=False)
+    duration_minutes = Column(Float, nullable=False)
+    pickup_lat = Column(Float, nullable=False)
+    pickup_lng = Column(Float, nullable=False)
+    delivery_lat = Column(Float, nullable=False)
+    delivery_lng = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+def run(label, service, db, pairs):
+    t0 = time.perf_counter()
+    routes = [service.route(db, pickup, delivery) for pickup, delivery in pairs]
+    db.commit()
+    elapsed = time.perf_counter() - t0
+    cached = sum(route.cached for route in routes)
+    print(f"{label:<34} {elapsed / len(pairs) * 1000:7.3f} ms/quote  ({cached}/{len(pairs)} cached)")
+    return routes
+
+
+def main(pairs: int = 2000):
+    random.seed(3)
+    streets = [f"Calle {n}" for n in range(400)]
+    addresses = [f"{random.choice(streets)} #{random.randint(1, 999)}, Col. Centro, CDMX" for _ in range(pairs)]
+    pairs = [(random.choice(addresses), random.choice(addresses)) for _ in range(pairs)]
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    service = RouteService(LocalGeocoder(), GeocodeCache, RouteCache)
+
+    cold = run("cold (geocode + persist)", service, db, pairs)
+    warm = run("warm (in-process LRU)", service, db, pairs)
+    restarted = RouteService(LocalGeocoder(), GeocodeCache, RouteCache)
+    run("after restart (route_cache table)", restarted, db, pairs)
+
+    # Same input, same answer: cache layers must not change results
+    assert [r.distance_km for r in cold] == [r.distance_km for r in warm]
+    sample = cold[0]
+    print(f"🧭 e.g. {sample.distance_km} km, {sample.duration_minutes} min -> ${quote_price(sample, 35.0, 9.5, 1.5, 50.0, 10000.0)} MXN")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
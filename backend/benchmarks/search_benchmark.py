@@ -0,0 +1,173 @@
+"""Admin search latency: ranked, paginated order and user search (search.py).
+
+Fills throwaway orders / users tables with generated Spanish-looking data,
+creates the search indexes the way the search_indexes migration does, checks
+the results are right (every term matches, best match first, triggers keep
+the index in sync) and reports latency percentiles for typical admin queries:
+
+    cd backend && python benchmarks/search_benchmark.py [orders] [users]
+    cd backend && DATABASE_URL=postgresql://... python benchmarks/search_benchmark.py [orders] [users]
+
+Without DATABASE_URL it runs on a SQLite file (FTS5 fallback).
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, Text, create_engine, insert, select, update
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ids import UUIDKey, new_id  # noqa: E402
+from search import create_search_indexes, drop_search_indexes, order_search, search_terms, user_search  # noqa: E402
+
+BATCH = 20000
+ITEMS = ["paquete", "documentos", "despensa", "medicinas", "flores", "pastel", "llaves", "laptop", "ropa", "comida"]
+VERBS = ["Recoger", "Entregar", "Llevar", "Comprar", "Enviar"]
+STREETS = ["Av. Reforma", "Insurgentes Sur", "Calle Durango", "Av. Universidad", "Calzada de Tlalpan", "Calle Madero", "Av. Chapultepec"]
+COLONIAS = ["Roma Norte", "Condesa", "Del Valle", "Coyoacán", "Polanco", "Narvarte", "Centro", "Escandón"]
+FIRST = ["Juan", "María", "José", "Guadalupe", "Luis", "Ana", "Carlos", "Sofía", "Miguel", "Fernanda"]
+LAST = ["Hernández", "García", "Martínez", "López", "González", "Pérez", "Rodríguez", "Sánchez", "Ramírez", "Flores"]
+QUERIES = {
+    "common term": "paquete",
+    "two terms": "entregar flores",
+    "prefix while typing": "medic",
+    "address": "tlalpan coyoacan",
+    "rare term": "xochimilco",
+}
+
+
+def address():
+    return f"{random.choice(STREETS)} {random.randint(1, 999)}, {random.choice(COLONIAS)}, CDMX"
+
+
+def build(metadata):
+    users = Table(
+        "users", metadata,
+        Column("id", UUIDKey(), primary_key=True),
+        Column("name", String, nullable=False),
+        Column("email", String, nullable=False),
+        Column("phone", String, nullable=False),
+    )
+    orders = Table(
+        "orders", metadata,
+        Column("id", UUIDKey(), primary_key=True),
+        Column("client_id", UUIDKey(), nullable=False),
+        Column("title", String, nullable=False),
+        Column("description", Text, nullable=False),
+        Column("pickup_address", String, nullable=False),
+        Column("delivery_address", String, nullable=False),
+        Column("created_at", DateTime, nullable=False, index=True),
+    )
+    return orders, users
+
+
+def fill(engine, orders, users, order_count: int, user_count: int):
+    now = datetime.utcnow()
+    user_ids = []
+    with engine.begin() as connection:
+        for start in range(0, user_count, BATCH):
+            rows = []
+            for i in range(start, min(start + BATCH, user_count)):
+                first, last = random.choice(FIRST), random.choice(LAST)
+                rows.append({
+                    "id": new_id(), "name": f"{first} {last} {random.choice(LAST)}",
+                    "email": f"{first.lower()}.{last.lower()}{i}@correo.mx", "phone": f"+52 55 {random.randint(1000, 9999)} {i % 10000:04d}",
+                })
+            connection.execute(insert(users), rows)
+            user_ids += [row["id"] for row in rows]
+        for start in range(0, order_count, BATCH):
+            connection.execute(insert(orders), [{
+                "id": new_id(), "client_id": random.choice(user_ids),
+                "title": f"{random.choice(VERBS)} {random.choice(ITEMS)}",
+                "description": f"{random.choice(VERBS)} {random.choice(ITEMS)} y {random.choice(ITEMS)}, tocar el timbre",
+                "pickup_address": address(), "delivery_address": address(),
+                "created_at": now - timedelta(seconds=random.uniform(0, 365 * 86400)),
+            } for _ in range(min(BATCH, order_count - start))])
+
+
+def page(connection, search, base, table, query: str, dialect: str, limit: int = 20):
+    statement, rank = search(base, table, query, dialect)
+    return connection.execute(statement.add_columns(rank.label("rank")).order_by(rank.desc()).limit(limit + 1)).all()
+
+
+def latency(connection, search, base, table, query: str, dialect: str, rounds: int = 30):
+    costs = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        rows = page(connection, search, base, table, query, dialect)
+        costs.append((time.perf_counter() - t0) * 1000)
+    costs.sort()
+    return statistics.median(costs), costs[int(len(costs) * 0.95) - 1], len(rows)
+
+
+def check(connection, orders, users, dialect: str):
+    rows = page(connection, order_search, select(orders), orders, "entregar flores", dialect)
+    assert rows, "no results"
+    for row in rows:
+        text = f"{row.title} {row.description} {row.pickup_address} {row.delivery_address}".lower()
+        assert "entreg" in text and "flor" in text, text
+    assert [row.rank for row in rows] == sorted((row.rank for row in rows), reverse=True)
+    # The title carries the most weight
+    assert rows[0].title.lower() in ("entregar flores",), rows[0].title
+
+    # Triggers / generated column follow updates
+    order_id = rows[-1].id
+    connection.execute(update(orders).where(orders.c.id == order_id).values(title="Recoger piñata"))
+    assert [row.id for row in page(connection, order_search, select(orders), orders, "piñata", dialect)] == [order_id]
+    assert page(connection, order_search, select(orders), orders, order_id, dialect)[0].id == order_id
+
+    email = connection.execute(select(users.c.email).limit(1)).scalar()
+    fragment = email.split("@")[0][2:9]
+    found = page(connection, user_search, select(users), users, fragment, dialect, limit=5000)
+    assert email in [row.email for row in found], (fragment, email)
+    for row in found:
+        fields = f"{row.name} {row.email} {row.phone}".lower()
+        assert all(term in fields for term in search_terms(fragment)), (fragment, fields)
+
+
+def main(order_count: int = 1_000_000, user_count: int = 50_000):
+    random.seed(11)
+    url = os.environ.get("DATABASE_URL") or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'search.db')}"
+    engine = create_engine(url)
+    metadata = MetaData()
+    orders, users = build(metadata)
+    with engine.begin() as connection:
+        if engine.dialect.name == "postgresql":
+            drop_search_indexes(connection)
+        metadata.drop_all(connection)
+        metadata.create_all(connection)
+
+    t0 = time.perf_counter()
+    fill(engine, orders, users, order_count, user_count)
+    fill_seconds = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    with engine.begin() as connection:
+        create_search_indexes(connection)
+        if engine.dialect.name == "postgresql":
+            connection.exec_driver_sql("ANALYZE")
+    print(f"🔎 {engine.dialect.name}: {order_count:,} orders, {user_count:,} users loaded in {fill_seconds:.0f} s, "
+          f"search indexes built in {time.perf_counter() - t0:.0f} s")
+
+    with engine.begin() as connection:
+        check(connection, orders, users, engine.dialect.name)
+        connection.rollback()
+
+    with engine.connect() as connection:
+        for label, query in QUERIES.items():
+            median, p95, rows = latency(connection, order_search, select(orders), orders, query, engine.dialect.name)
+            print(f"   orders  {label:<20} {query!r:<20} median {median:6.1f} ms  p95 {p95:6.1f} ms  ({min(rows, 20)} on the page)")
+        for query in ("garcía", "ana.lo", "55 12", "fernanda flores"):
+            median, p95, rows = latency(connection, user_search, select(users), users, query, engine.dialect.name)
+            print(f"   users   {search_terms(query)!s:<41} median {median:6.1f} ms  p95 {p95:6.1f} ms  ({min(rows, 20)} on the page)")
+    with engine.begin() as connection:
+        if engine.dialect.name == "postgresql":
+            drop_search_indexes(connection)
+        metadata.drop_all(connection)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
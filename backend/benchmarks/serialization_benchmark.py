@@ -0,0 +1,211 @@
+"""Microbenchmark: serializing the admin GET /orders list (10k orders by default).
+
+Compares the previous path (query orders, look up client/driver per row,
+Order.model_validate().model_dump() -> OrderResponse(...) -> response_model
+validation -> JSON) with the rows-to-JSON path in serialization.py, on a
+throwaway SQLite database:
+
+    cd backend && python benchmarks/serialization_benchmark.py [orders]
+"""
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import List, Optional
+
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy import Column, DateTime, Enum as SQLEnum, Float, ForeignKey, String, Text, case, create_engine, func, insert, null, select
+from sqlalchemy.orm import aliased, declarative_base, sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import serialization  # noqa: E402
+from serialization import json_rows_response, response_columns  # noqa: E402
+
+Base = declarative_base()
+
+
+class OrderStatus(str, Enum):
+    PENDING = "pending"
+    ACCEPTED = "accepted"
+    DELIVERED = "delivered"
+
+
+class PaymentStatus(str, Enum):
+    PENDING = "pending"
+    COMPLETED = "completed"
+
+
+class PaymentMethod(str, Enum):
+    CASH = "cash"
+
+
+class DBUser(Base):
+    __tablename__ = "users"
+    id = Column(String, primary_key=True)
+    name = Column(String)
+
+
+class DBOrder(Base):
+    __tablename__ = "orders"
+    id = Column(String, primary_key=True)
+    client_id = Column(String, ForeignKey("users.id"))
+    driver_id = Column(String, ForeignKey("users.id"))
+    title = Column(String)
+    description = Column(Text)
+    pickup_address = Column(String)
+    delivery_address = Column(String)
+    price = Column(Float)
+    status = Column(SQLEnum(OrderStatus))
+    payment_status = Column(SQLEnum(PaymentStatus))
+    payment_method = Column(SQLEnum(PaymentMethod))
+    financials = Column(Text)
+    created_at = Column(DateTime)
+    accepted_at = Column(DateTime)
+    delivered_at = Column(DateTime)
+    stripe_payment_intent = Column(String)
+
+
+class Order(BaseModel):
+    id: Optional[str] = None
+    client_id: str
+    driver_id: Optional[str] = None
+    title: str
+    description: str
+    pickup_address: str
+    delivery_address: str
+    price: float
+    status: OrderStatus = OrderStatus.PENDING
+    payment_status: PaymentStatus = PaymentStatus.PENDING
+    payment_method: Optional[PaymentMethod] = PaymentMethod.CASH
+    created_at: Optional[datetime] = None
+    accepted_at: Optional[datetime] = None
+    delivered_at: Optional[datetime] = None
+    stripe_payment_intent: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class OrderResponse(BaseModel):
+    id: str
+    client_id: str
+    client_name: str
+    driver_id: Optional[str] = None
+    driver_name: Optional[str] = None
+    title: str
+    description: str
+    pickup_address: str
+    delivery_address: str
+    price: float
+    status: OrderStatus
+    payment_status: PaymentStatus
+    payment_method: Optional[PaymentMethod] = None
+    created_at: datetime
+    accepted_at: Optional[datetime] = None
+    delivered_at: Optional[datetime] = None
+
+
+RESPONSE_ADAPTER = TypeAdapter(List[OrderResponse]) # What FastAPI does with response_model
+
+
+def seed(db, orders: int):
+    users = [{"id": str(uuid.uuid4()), "name": f"Usuario {i}"} for i in range(500)]
+    db.execute(insert(DBUser), users)
+    now = datetime(2024, 1, 1)
+    rows = []
+    for i in range(orders):
+        delivered = random.random() < 0.7
+        rows.append({
+            "id": str(uuid.uuid4()),
+            "client_id": random.choice(users)["id"],
+            "driver_id": random.choice(users)["id"] if delivered else None,
+            "title": f"Mandado {i}",
+            "description": "Recoger paquete en recepción y entregar en oficina",
+            "pickup_address": "Av. Reforma 222, CDMX",
+            "delivery_address": "Insurgentes Sur 1602, CDMX",
+            "price": round(random.uniform(50, 900), 2),
+            "status": OrderStatus.DELIVERED if delivered else OrderStatus.PENDING,
+            "payment_status": PaymentStatus.COMPLETED if delivered else PaymentStatus.PENDING,
+            "payment_method": PaymentMethod.CASH,
+            "created_at": now + timedelta(minutes=i),
+            "accepted_at": now + timedelta(minutes=i, seconds=30) if delivered else None,
+            "delivered_at": now + timedelta(minutes=i + 40) if delivered else None,
+        })
+    db.execute(insert(DBOrder), rows)
+    db.commit()
+
+
+def old_path(db):
+    order_responses = []
+    for order in db.query(DBOrder).all():
+        client = db.query(DBUser).filter(DBUser.id == order.client_id).first()
+        driver_name = None
+        if order.driver_id:
+            driver = db.query(DBUser).filter(DBUser.id == order.driver_id).first()
+            driver_name = driver.name if driver else "Unknown"
+        order_data = Order.model_validate(order).model_dump()
+        order_responses.append(OrderResponse(**order_data, client_name=client.name if client else "Unknown", driver_name=driver_name))
+    return RESPONSE_ADAPTER.dump_json(RESPONSE_ADAPTER.validate_python(order_responses))
+
+
+def old_path_serialization_only(db):
+    # Same as old_path without the per-row lookups, to isolate the Pydantic round trips
+    names = dict(db.query(DBUser.id, DBUser.name).all())
+    order_responses = []
+    for order in db.query(DBOrder).all():
+        order_data = Order.model_validate(order).model_dump()
+        driver_name = names.get(order.driver_id, "Unknown") if order.driver_id else None
+        order_responses.append(OrderResponse(**order_data, client_name=names.get(order.client_id, "Unknown"), driver_name=driver_name))
+    return RESPONSE_ADAPTER.dump_json(RESPONSE_ADAPTER.validate_python(order_responses))
+
+
+def new_path(db):
+    client, driver = aliased(DBUser), aliased(DBUser)
+    columns = response_columns(
+        OrderResponse, DBOrder,
+        client_name=func.coalesce(client.name, "Unknown"),
+        driver_name=case((DBOrder.driver_id.is_(None), null()), else_=func.coalesce(driver.name, "Unknown")),
+    )
+    statement = select(*columns).outerjoin(client, client.id == DBOrder.client_id).outerjoin(driver, driver.id == DBOrder.driver_id)
+    return json_rows_response(db.execute(statement)).body
+
+
+def timed(label, fn, db, repeat: int = 3):
+    best = None
+    for _ in range(repeat):
+        db.expunge_all()
+        t0 = time.perf_counter()
+        body = fn(db)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<42} {best * 1000:8.1f} ms  ({len(body) / 1024:.0f} KiB)")
+    return body
+
+
+def main(orders: int = 10_000):
+    random.seed(7)
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    seed(db, orders)
+    print(f"📦 {orders} orders, orjson {'installed' if serialization.orjson else 'not installed'}")
+
+    old = timed("old: N+1 lookups + 3 Pydantic passes", old_path, db)
+    timed("old without N+1 (Pydantic passes only)", old_path_serialization_only, db)
+    new = timed("new: joined rows -> JSON bytes", new_path, db)
+
+    serialization.orjson, saved = None, serialization.orjson
+    timed("new, TypeAdapter encoder (no orjson)", new_path, db)
+    serialization.orjson = saved
+
+    # Same content: decode both and compare the objects
+    import json
+    assert json.loads(old) == json.loads(new), "outputs differ"
+    print("✅ identical JSON content")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
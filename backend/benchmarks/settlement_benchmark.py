@@ -0,0 +1,100 @@
+"""Benchmark the batch settlement engine on 1M payout + cash collection rows.
+
+Uses a throwaway SQLite database with the same columns the engine touches, so
+it runs without PostgreSQL:
+
+    cd backend && python benchmarks/settlement_benchmark.py [rows] [drivers]
+"""
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, DateTime, Float, Integer, String, create_engine, insert
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from settlement import SettlementSource, run_settlement  # noqa: E402
+
+Base = declarative_base()
+
+
+class Payout(Base):
+    __tablename__ = "driver_payouts"
+    id = Column(String, primary_key=True)
+    driver_id = Column(String, index=True)
+    amount = Column(Float)
+    transfer_status = Column(String, index=True)
+    created_at = Column(DateTime)
+    settlement_batch_id = Column(String, index=True)
+
+
+class Collection(Base):
+    __tablename__ = "cash_collections"
+    id = Column(String, primary_key=True)
+    driver_id = Column(String, index=True)
+    commission_owed = Column(Float)
+    payment_status = Column(String, index=True)
+    collection_date = Column(DateTime)
+    settlement_batch_id = Column(String, index=True)
+
+
+class Settlement(Base):
+    __tablename__ = "driver_settlements"
+    id = Column(String, primary_key=True)
+    batch_id = Column(String)
+    driver_id = Column(String)
+    period_start = Column(DateTime)
+    period_end = Column(DateTime)
+    payouts_total = Column(Float)
+    commission_total = Column(Float)
+    net_amount = Column(Float)
+    payout_count = Column(Integer)
+    collection_count = Column(Integer)
+    status = Column(String)
+    created_at = Column(DateTime)
+    created_by = Column(String)
+
+
+def main(rows: int = 1_000_000, drivers: int = 5_000):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    start = datetime(2025, 1, 1)
+    driver_ids = [str(uuid.uuid4()) for _ in range(drivers)]
+    half = rows // 2
+    with engine.begin() as conn:
+        conn.execute(insert(Payout), [
+            {"id": str(i), "driver_id": random.choice(driver_ids), "amount": round(random.uniform(50, 900), 2),
+             "transfer_status": "pending", "created_at": start + timedelta(seconds=i)}
+            for i in range(half)
+        ])
+        conn.execute(insert(Collection), [
+            {"id": str(i), "driver_id": random.choice(driver_ids), "commission_owed": round(random.uniform(10, 200), 2),
+             "payment_status": "pending", "collection_date": start + timedelta(seconds=i)}
+            for i in range(rows - half)
+        ])
+
+    payouts = SettlementSource(Payout, Payout.amount, Payout.transfer_status, Payout.created_at, "pending", "completed")
+    collections = SettlementSource(Collection, Collection.commission_owed, Collection.payment_status, Collection.collection_date, "pending", "paid")
+    period_end = start + timedelta(days=30)
+
+    db = Session()
+    t0 = time.perf_counter()
+    preview = run_settlement(db, payouts, collections, Settlement, start, period_end, dry_run=True)
+    t1 = time.perf_counter()
+    result = run_settlement(db, payouts, collections, Settlement, start, period_end, settlement_status="pending")
+    db.commit()
+    t2 = time.perf_counter()
+    db.close()
+
+    print(f"📊 {rows:,} rows, {drivers:,} drivers")
+    print(f"🔍 dry run: {len(preview['settlements']):,} settlements in {t1 - t0:.2f}s")
+    print(f"✅ settle:  {len(result['settlements']):,} settlements, all rows marked in {t2 - t1:.2f}s")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
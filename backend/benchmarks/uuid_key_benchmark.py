@@ -0,0 +1,94 @@
+"""Insert / lookup benchmark: VARCHAR uuid4 keys vs native time-ordered UUID keys.
+
+Creates two throwaway orders-like tables (primary key + indexed client_id
+foreign key column), one keyed the old way (``str(uuid4())`` in VARCHAR) and
+one with ``UUIDKey`` + ``new_id``, inserts the same number of rows in batches,
+then looks rows up by primary key and by client_id. On PostgreSQL it also
+reports table and index sizes:
+
+    cd backend && DATABASE_URL=postgresql://... python benchmarks/uuid_key_benchmark.py [rows]
+
+Without DATABASE_URL it runs on SQLite files in a temporary directory (sizes
+are then whole database files).
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, insert, select, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ids import UUIDKey, new_id  # noqa: E402
+
+BATCH = 5000
+
+
+def build(metadata, name, key_type):
+    return Table(
+        name, metadata,
+        Column("id", key_type, primary_key=True),
+        Column("client_id", key_type, nullable=False, index=True),
+        Column("price", Integer, nullable=False),
+    )
+
+
+def run(engine, table, make_id, rows: int, lookups: int):
+    clients = [make_id() for _ in range(max(rows // 50, 1))]
+    ids = []
+    t0 = time.perf_counter()
+    with engine.begin() as connection:
+        for start in range(0, rows, BATCH):
+            batch = [{"id": make_id(), "client_id": random.choice(clients), "price": 100} for _ in range(min(BATCH, rows - start))]
+            connection.execute(insert(table), batch)
+            ids.extend(row["id"] for row in batch)
+    insert_seconds = time.perf_counter() - t0
+
+    sample = random.sample(ids, min(lookups, len(ids)))
+    with engine.connect() as connection:
+        t0 = time.perf_counter()
+        for key in sample:
+            connection.execute(select(table.c.price).where(table.c.id == key)).one()
+        pk_seconds = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for client_id in random.sample(clients, min(lookups // 10, len(clients))):
+            connection.execute(select(table.c.id).where(table.c.client_id == client_id)).all()
+        fk_seconds = time.perf_counter() - t0
+    return insert_seconds, pk_seconds / len(sample), fk_seconds
+
+
+def sizes(engine, table):
+    if engine.dialect.name != "postgresql":
+        return os.path.getsize(engine.url.database) / 2 ** 20, None
+    with engine.connect() as connection:
+        table_mb = connection.execute(text(f"SELECT pg_table_size('{table.name}')")).scalar() / 2 ** 20
+        index_mb = connection.execute(text(f"SELECT pg_indexes_size('{table.name}')")).scalar() / 2 ** 20
+    return table_mb, index_mb
+
+
+def main(rows: int = 500_000, lookups: int = 20_000):
+    random.seed(7)
+    url = os.environ.get("DATABASE_URL")
+    tmp = tempfile.mkdtemp()
+    variants = [
+        ("keys_varchar_v4", String, lambda: str(uuid.uuid4())),
+        ("keys_uuid_v7", UUIDKey(), new_id),
+    ]
+    for name, key_type, make_id in variants:
+        engine = create_engine(url or f"sqlite:///{os.path.join(tmp, name)}.db")
+        metadata = MetaData()
+        table = build(metadata, name, key_type)
+        metadata.drop_all(engine)
+        metadata.create_all(engine)
+        insert_seconds, pk_lookup, fk_seconds = run(engine, table, make_id, rows, lookups)
+        table_mb, index_mb = sizes(engine, table)
+        size = f"table {table_mb:.1f} MiB, indexes {index_mb:.1f} MiB" if index_mb is not None else f"database {table_mb:.1f} MiB"
+        print(f"{name:<16} insert {rows / insert_seconds:>9,.0f} rows/s  pk lookup {pk_lookup * 1e6:6.1f} µs  "
+              f"client_id lookups {fk_seconds * 1000:6.0f} ms  {size}")
+        metadata.drop_all(engine)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,147 @@
+"""Change versions for ETag / Last-Modified on list and stats endpoints.
+
+Every committed write bumps a per-table counter in a small ``change_versions``
+table, in the same transaction as the write. A GET derives its ETag from the
+counters of the tables it reads (one primary-key lookup), so an unchanged
+resource is answered with 304 before any rows are loaded or serialized.
+Counters live in the database, so every worker hands out the same ETags.
+
+Some columns are shown by fewer endpoints than their table (or by none):
+``column_resources`` maps them to a resource of their own, or to None, so an
+UPDATE touching only those columns leaves the table's counter, and every
+ETag built on it, alone.
+
+The version model comes from server.py, like the other modules.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from sqlalchemy import event, insert, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+
+_CHANGED_KEY = "changed_tables"
+
+
+def resources_written(table_name: str, columns, column_resources) -> set:
+    """Resources to bump for a write to table_name; columns is None for inserts and deletes (whole rows)"""
+    mapping = column_resources.get(table_name)
+    if not mapping or columns is None:
+        return {table_name}
+    return {mapping.get(column, table_name) for column in columns} - {None}
+
+
+def _updated_columns(orm_execute_state):
+    """Column names set by a bulk UPDATE, None when unknown"""
+    values = orm_execute_state.statement._values # SET clause given with .values()
+    if values:
+        return {getattr(key, "key", key) for key in values}
+    parameters = orm_execute_state.parameters # Or bound per execution (executemany)
+    if isinstance(parameters, (list, tuple)):
+        parameters = parameters[0] if parameters else None
+    return set(parameters) if parameters else None
+
+
+def track_changes(session_class, version_model, column_resources=None):
+    """Register session hooks that bump version_model for every table written in a transaction
+
+    column_resources: {table: {column: resource or None}}, see the module docstring.
+    """
+    version_table = version_model.__table__.name
+    column_resources = column_resources or {}
+
+    def changed(session):
+        return session.info.setdefault(_CHANGED_KEY, set())
+
+    @event.listens_for(session_class, "after_flush")
+    def collect_flushed(session, flush_context):
+        for obj in list(session.new) + list(session.deleted):
+            table = getattr(obj, "__table__", None)
+            if table is not None:
+                changed(session).add(table.name)
+        for obj in session.dirty:
+            table = getattr(obj, "__table__", None)
+            if table is None:
+                continue
+            state = inspect(obj) # History still holds what this flush wrote
+            columns = {prop.key for prop in state.mapper.column_attrs if state.attrs[prop.key].history.has_changes()}
+            if columns:
+                changed(session).update(resources_written(table.name, columns, column_resources))
+
+    @event.listens_for(session_class, "do_orm_execute")
+    def collect_bulk(orm_execute_state):
+        # Bulk insert/update/delete statements never reach after_flush
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            table = getattr(orm_execute_state.statement, "table", None)
+            if table is not None:
+                columns = _updated_columns(orm_execute_state) if orm_execute_state.is_update else None
+                changed(orm_execute_state.session).update(resources_written(table.name, columns, column_resources))
+
+    @event.listens_for(session_class, "before_commit")
+    def bump_versions(session):
+        session.flush() # before_commit runs ahead of the final flush
+        tables = session.info.pop(_CHANGED_KEY, set()) - {version_table}
+        if tables:
+            bump(session.connection(), version_model, tables)
+
+    @event.listens_for(session_class, "after_rollback")
+    def forget_changes(session):
+        session.info.pop(_CHANGED_KEY, None)
+
+
+def bump(connection, version_model, tables, now: datetime = None):
+    """version = version + 1 for each table, creating missing rows; runs last so row locks are short"""
+    now = now or datetime.utcnow()
+    for name in sorted(tables): # Fixed order, so concurrent commits can't deadlock
+        statement = (
+            update(version_model).where(version_model.resource == name)
+            .values(version=version_model.version + 1, changed_at=now)
+        )
+        if connection.execute(statement).rowcount:
+            continue
+        try:
+            with connection.begin_nested():
+                connection.execute(insert(version_model).values(resource=name, version=1, changed_at=now))
+        except IntegrityError:
+            connection.execute(statement)
+
+
+def read_versions(db, version_model, resources):
+    """{resource: (version, changed_at)} for the given tables, unseen tables are (0, None)"""
+    rows = db.execute(
+        select(version_model.resource, version_model.version, version_model.changed_at)
+        .where(version_model.resource.in_(resources))
+    )
+    versions = {resource: (0, None) for resource in resources}
+    versions.update({resource: (version, changed_at) for resource, version, changed_at in rows})
+    return versions
+
+
+def validators(versions, vary: str = ""):
+    """(etag, last_modified) for a set of versions, vary separates per-user / per-query variants"""
+    key = "|".join([vary] + [f"{resource}:{versions[resource][0]}" for resource in sorted(versions)])
+    etag = 'W/"' + hashlib.sha1(key.encode("utf-8")).hexdigest()[:20] + '"'
+    changed = [changed_at for _, changed_at in versions.values() if changed_at]
+    last_modified = max(changed).replace(tzinfo=timezone.utc, microsecond=0) if changed else None
+    return etag, last_modified
+
+
+def not_modified(headers, etag: str, last_modified: datetime = None):
+    """Whether the request's If-None-Match / If-Modified-Since still matches"""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None: # Takes precedence over If-Modified-Since
+        return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            return last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def cache_headers(etag: str, last_modified: datetime = None):
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"} # Always revalidate, never serve blind
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    return headers
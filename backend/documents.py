@@ -0,0 +1,147 @@
+"""Driver document image pipeline (runs in a process pool).
+
+An upload is stored as it arrives and queued; ``process_document_image`` then
+does the CPU-bound work in a worker process, away from the event loop:
+
+1. decode the base64 upload and open the image (JPEG decoding is already
+   scaled down by the codec, ``Image.draft``, when the photo is much larger
+   than the target), applying the EXIF orientation;
+2. downscale to at most ``max_side`` pixels and recompress as JPEG, which
+   replaces the upload;
+3. thumbnails for the admin review screen;
+4. a 64-bit perceptual hash (DCT hash of the 32x32 grayscale image), close
+   for the same document photographed or scanned again, so a document reused
+   by another driver can be caught with a Hamming distance.
+
+Every step is timed. Everything returned is plain data, so results pickle
+cheaply back to the web worker.
+
+Uploads are stored once per content (``upload_digest``: SHA-256 of the decoded
+bytes), so the pipeline runs once per distinct image, however many times and
+by whichever endpoint it is uploaded.
+"""
+import base64
+import binascii
+import hashlib
+import io
+import math
+import time
+
+import numpy as np
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+HASH_SIZE = 8 # 8x8 low frequencies -> 64 bits
+HASH_IMAGE_SIDE = 32
+JPEG_QUALITY = 82
+THUMBNAIL_QUALITY = 75
+MAX_PIXELS = 50_000_000 # Refuse to decode anything larger (decompression bombs)
+MIN_SIDE = 400 # Smaller images are unreadable as identity documents
+
+
+def _dct_matrix(size: int):
+    k = np.arange(size)
+    matrix = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * size)) * np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+DCT_MATRIX = _dct_matrix(HASH_IMAGE_SIDE)
+
+
+def perceptual_hash(image: Image.Image) -> int:
+    """64-bit DCT hash as a signed integer (fits a BIGINT column)"""
+    pixels = np.asarray(image.convert("L").resize((HASH_IMAGE_SIDE, HASH_IMAGE_SIDE), Image.Resampling.LANCZOS), dtype=np.float64)
+    low = (DCT_MATRIX @ pixels @ DCT_MATRIX.T)[:HASH_SIZE, :HASH_SIZE].flatten()
+    bits = low > np.median(low[1:]) # The DC term only tells the brightness
+    return int(np.packbits(bits).view(">i8")[0])
+
+
+def hamming_distances(value: int, hashes) -> np.ndarray:
+    """Number of differing bits between value and each of hashes (signed 64-bit integers)"""
+    differing = np.asarray(hashes, dtype=np.int64) ^ np.int64(value)
+    return np.unpackbits(differing.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def _jpeg_base64(image: Image.Image, quality: int) -> str:
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def strip_data_url(file_data: str) -> str:
+    return file_data.partition(",")[2] if file_data.startswith("data:") else file_data
+
+
+def decode_upload(file_data: str) -> bytes:
+    """Bytes of a base64 upload, with or without a data URL prefix"""
+    return base64.b64decode(strip_data_url(file_data), validate=True)
+
+
+def upload_digest(file_data: str):
+    """(SHA-256 hex of the decoded bytes, decoded size, base64 without data URL prefix); ValueError if not base64"""
+    raw = decode_upload(file_data)
+    return hashlib.sha256(raw).hexdigest(), len(raw), strip_data_url(file_data)
+
+
+def process_document_image(file_data: str, max_side: int, thumbnail_sides: dict, quality: int = JPEG_QUALITY):
+    """Decode, downscale, recompress, thumbnail and hash one upload
+
+    Returns a dict: ``issues`` (empty when the image is usable), and when it
+    could be decoded, ``file_data`` (the recompressed JPEG, base64), the size,
+    ``thumbnails`` ({name: base64 JPEG}), ``phash`` and ``timings`` in ms.
+    """
+    timings = {}
+    started = t0 = time.perf_counter()
+
+    def lap(step):
+        nonlocal t0
+        now = time.perf_counter()
+        timings[step] = round((now - t0) * 1000, 2)
+        t0 = now
+
+    try:
+        raw = decode_upload(file_data)
+        image = Image.open(io.BytesIO(raw))
+        original_size, original_format = image.size, image.format
+        if image.width * image.height > MAX_PIXELS:
+            return {"issues": [f"Imagen demasiado grande ({image.width}x{image.height})"], "timings": timings}
+        scale = min(1.0, max_side / max(image.size))
+        # JPEG: decode at 1/2, 1/4 or 1/8 scale when the long side still reaches max_side
+        image.draft("RGB", (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+    except (binascii.Error, ValueError, UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        return {"issues": [f"No es una imagen válida: {e}"], "timings": timings}
+    lap("decode_ms")
+
+    issues = []
+    if min(image.size) < MIN_SIDE:
+        issues.append(f"Imagen de muy baja resolución ({image.width}x{image.height})")
+    image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    width, height = image.size
+    lap("resize_ms")
+    processed = _jpeg_base64(image, quality)
+    lap("encode_ms")
+
+    thumbnails = {}
+    for name, side in sorted(thumbnail_sides.items(), key=lambda item: -item[1]):
+        image.thumbnail((side, side), Image.Resampling.LANCZOS) # Largest first, each one from the previous
+        thumbnails[name] = _jpeg_base64(image, THUMBNAIL_QUALITY)
+    lap("thumbnails_ms")
+    phash = perceptual_hash(image) # From the smallest thumbnail: the hash only looks at 32x32
+    lap("hash_ms")
+    timings["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    return {
+        "issues": issues,
+        "file_data": processed,
+        "width": width,
+        "height": height,
+        "original_width": original_size[0],
+        "original_height": original_size[1],
+        "original_format": original_format,
+        "original_bytes": len(raw),
+        "processed_bytes": len(processed) * 3 // 4,
+        "thumbnails": thumbnails,
+        "phash": phash,
+        "timings": timings,
+    }
@@ -0,0 +1,102 @@
+"""Streaming exports (CSV / Parquet) for the owner's financial reports.
+
+Rows are read from a server-side cursor in fixed-size chunks and encoded chunk
+by chunk, so memory stays flat no matter how many rows are exported.
+"""
+import csv
+import importlib.util
+import io
+
+EXPORT_CHUNK_SIZE = 5000
+
+
+def iter_query_chunks(session_factory, statement, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """Yield lists of rows from a server-side cursor, in its own session (closed when done)"""
+    db = session_factory()
+    try:
+        result = db.execute(statement.execution_options(stream_results=True, yield_per=chunk_size))
+        for partition in result.partitions(chunk_size):
+            yield partition
+    finally:
+        db.close()
+
+
+def stream_csv(columns, chunks, row_transform=None):
+    """Encode row chunks as CSV, one bytes block per chunk"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode("utf-8")
+
+    for chunk in chunks:
+        buffer.seek(0)
+        buffer.truncate(0)
+        rows = (row_transform(row) for row in chunk) if row_transform else chunk
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ParquetSink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain"""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        # Parquet records absolute offsets, so position keeps counting across drains
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def parquet_available():
+    """Parquet export is optional, it needs pyarrow installed"""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def _arrow_type(pa, name):
+    return {
+        "string": pa.string(),
+        "float": pa.float64(),
+        "int": pa.int64(),
+        "bool": pa.bool_(),
+        "datetime": pa.timestamp("us"),
+    }[name]
+
+
+def stream_parquet(columns, chunks, row_transform=None, column_types=None):
+    """Encode row chunks as a Parquet file, one row group per chunk (requires pyarrow)
+
+    column_types maps column name -> "string" | "float" | "int" | "bool" | "datetime";
+    unlisted columns are written as strings.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    column_types = column_types or {}
+    schema = pa.schema([(name, _arrow_type(pa, column_types.get(name, "string"))) for name in columns])
+    sink = _ParquetSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+
+    for chunk in chunks:
+        rows = [row_transform(row) for row in chunk] if row_transform else chunk
+        if not rows:
+            continue
+        data = {name: list(values) for name, values in zip(columns, zip(*rows))}
+        writer.write_table(pa.Table.from_pydict(data, schema=schema))
+        yield sink.drain()
+
+    writer.close()
+    yield sink.drain()
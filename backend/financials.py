@@ -0,0 +1,105 @@
+"""Vectorized order financials.
+
+Every field is computed for a whole array of prices in a single NumPy pass;
+single orders (``calculate_order_financials_single``) go through the same
+code as a batch of one, so an order is priced the same whichever endpoint
+creates it. The arithmetic is done on int64
+centavos (see money.py), so the parts of every order add up to its total
+exactly and batch sums do not drift; pesos only appear at the edges.
+"""
+from decimal import Decimal
+
+import numpy as np
+
+from money import cents_array, from_cents, pesos_array, to_cents
+
+IVA_RATE = 0.16  # IVA México
+
+FINANCIAL_FIELDS = (
+    "subtotal",
+    "service_fee",
+    "iva_amount",
+    "commission_amount",
+    "driver_earnings",
+    "owner_earnings",
+    "total_amount",
+)
+
+
+def _times_rate(cents, rate: float):
+    """cents * rate rounded half-up, exactly: the rate is taken as the decimal it prints as
+
+    In floats 180 * 0.175 is 31.4999..., which would round a half centavo down.
+    """
+    numerator, denominator = Decimal(str(rate)).as_integer_ratio()
+    if cents.size and int(np.abs(cents).max()) * 2 * numerator + denominator >= 2 ** 63: # Rates with many digits: Python ints
+        cents = cents.astype(object)
+    return ((cents * (2 * numerator) + denominator) // (2 * denominator)).astype(np.int64)
+
+
+def calculate_order_financials_cents(subtotal, commission_rate: float, service_fee: int, iva_rate: float = IVA_RATE):
+    """Financials in centavos: subtotal is an int64 array, service_fee an int, returns int64 arrays"""
+    subtotal = np.asarray(subtotal, dtype=np.int64)
+    service_fee_arr = np.full(subtotal.shape, service_fee, dtype=np.int64)
+
+    # Commission is taken from the order value, IVA applies to what the client pays
+    commission_amount = _times_rate(subtotal, commission_rate)
+    iva_amount = _times_rate(subtotal + service_fee_arr, iva_rate)
+    total_amount = subtotal + service_fee_arr + iva_amount
+
+    # Driver keeps the order value minus commission, owner gets commission + service fee + IVA
+    driver_earnings = subtotal - commission_amount
+    owner_earnings = commission_amount + service_fee_arr + iva_amount
+
+    return {
+        "subtotal": subtotal,
+        "service_fee": service_fee_arr,
+        "iva_amount": iva_amount,
+        "commission_amount": commission_amount,
+        "driver_earnings": driver_earnings,
+        "owner_earnings": owner_earnings,
+        "total_amount": total_amount,
+    }
+
+
+def calculate_order_financials_batch(prices, commission_rate: float, service_fee: float, iva_rate: float = IVA_RATE):
+    """Calculate financials for many orders at once, returns a dict of peso arrays keyed like OrderFinancials"""
+    batch = calculate_order_financials_cents(cents_array(prices), commission_rate, to_cents(service_fee), iva_rate)
+    return {field: pesos_array(values) for field, values in batch.items()}
+
+
+def calculate_order_financials_single(price: float, commission_rate: float, service_fee: float, iva_rate: float = IVA_RATE):
+    """One order's financials as a dict of pesos, computed exactly as a batch of one"""
+    return financials_rows(calculate_order_financials_batch([price], commission_rate, service_fee, iva_rate))[0]
+
+
+def financials_rows(batch):
+    """Turn a batch result back into one plain dict per order (for JSON storage)"""
+    columns = [batch[field].tolist() for field in FINANCIAL_FIELDS]
+    return [dict(zip(FINANCIAL_FIELDS, values)) for values in zip(*columns)]
+
+
+def prices_from_chunks(chunks, column: int = 0):
+    """Collect one numeric column from row chunks (e.g. a server-side cursor) into a float array"""
+    arrays = [np.fromiter((row[column] for row in chunk), dtype=np.float64, count=len(chunk)) for chunk in chunks]
+    return np.concatenate(arrays) if arrays else np.empty(0, dtype=np.float64)
+
+
+def summarize_financials(batch):
+    """Totals per OrderFinancials field for a batch result, summed in centavos"""
+    return {field: from_cents(int(cents_array(batch[field]).sum())) for field in FINANCIAL_FIELDS}
+
+
+def simulate_commission_change(prices, current: dict, proposed: dict, iva_rate: float = IVA_RATE):
+    """Compare financial totals for the same orders under the current and a proposed configuration
+
+    current/proposed are dicts with commission_rate and service_fee.
+    """
+    before = summarize_financials(calculate_order_financials_batch(prices, current["commission_rate"], current["service_fee"], iva_rate))
+    after = summarize_financials(calculate_order_financials_batch(prices, proposed["commission_rate"], proposed["service_fee"], iva_rate))
+    return {
+        "orders": int(len(prices)),
+        "current": before,
+        "proposed": after,
+        "difference": {field: from_cents(to_cents(after[field]) - to_cents(before[field])) for field in FINANCIAL_FIELDS},
+    }
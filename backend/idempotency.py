@@ -0,0 +1,278 @@
+"""Idempotency-Key support for endpoints that create orders or payments.
+
+A retried request that carries the same ``Idempotency-Key`` (same caller,
+same route, same body) gets the stored response back instead of running the
+endpoint again. Duplicates arriving while the first request is still running
+wait for it and share its result.
+
+Two stores:
+- ``IdempotencyStore``: per process (hashed key -> status code + body bytes),
+  with TTL and size-based eviction. Duplicates reaching another worker run again.
+- ``DatabaseIdempotencyStore``: a shared table. The first request claims the
+  key with one atomic upsert of an in-flight placeholder row, so exactly one
+  request per key runs across all workers; duplicates poll the row until the
+  response is stored. The table model comes from server.py.
+"""
+import asyncio
+import hashlib
+import re
+import time
+import zlib
+from collections import OrderedDict
+
+from sqlalchemy import delete, select, update
+from starlette.responses import JSONResponse, Response
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAY_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+COMPRESS_MIN_BYTES = 512
+
+
+def _pack(body: bytes):
+    """(stored bytes, compressed)"""
+    compressed = len(body) >= COMPRESS_MIN_BYTES
+    return (zlib.compress(body) if compressed else body), compressed
+
+
+class _StoredResponse:
+    __slots__ = ("key", "fingerprint", "status_code", "media_type", "body", "compressed")
+
+    def __init__(self, key: bytes, fingerprint: bytes, status_code=None, media_type=None, body=b"", compressed=False):
+        self.key = key
+        self.fingerprint = fingerprint
+        self.status_code = status_code # None while the first request is in flight
+        self.media_type = media_type
+        self.body = body
+        self.compressed = compressed
+
+    def response(self):
+        body = zlib.decompress(self.body) if self.compressed else self.body
+        return Response(content=body, status_code=self.status_code, media_type=self.media_type, headers={REPLAY_HEADER: "true"})
+
+
+class _Entry(_StoredResponse):
+    __slots__ = ("expires_at", "done")
+
+    def __init__(self, key: bytes, fingerprint: bytes, expires_at: float):
+        super().__init__(key, fingerprint)
+        self.expires_at = expires_at
+        self.done = asyncio.Event()
+
+
+class IdempotencyStore:
+    """Key -> stored response, evicted after ttl_seconds or when more than max_entries are held
+
+    Only touched from the event loop, so no locking is needed.
+    """
+
+    def __init__(self, ttl_seconds: float = 86400, max_entries: int = 100_000, clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self, now: float):
+        # Every entry gets the same TTL, so insertion order is expiry order
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[key]
+            entry.done.set() # Release anyone still waiting on an evicted in-flight entry
+
+    def begin(self, key: bytes, fingerprint: bytes):
+        """Returns (state, entry), state being "new", "replay", "in_flight" or "mismatch" """
+        now = self.clock()
+        self._evict(now)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = _Entry(key, fingerprint, now + self.ttl_seconds)
+            self._entries[key] = entry
+            return "new", entry
+        if entry.fingerprint != fingerprint:
+            return "mismatch", entry
+        return ("replay" if entry.status_code is not None else "in_flight"), entry
+
+    def complete(self, entry: _Entry, status_code: int, body: bytes, media_type: str = None):
+        """Store the response of the first request and wake up duplicates"""
+        entry.status_code = status_code
+        entry.media_type = media_type
+        entry.body, entry.compressed = _pack(body)
+        entry.done.set()
+
+    def release(self, entry: _Entry):
+        """Forget a key whose request failed, so the next retry runs the endpoint again"""
+        if self._entries.get(entry.key) is entry:
+            del self._entries[entry.key]
+        entry.done.set()
+
+    async def wait(self, entry: _Entry, timeout: float):
+        """Until the in-flight request of entry finishes, or timeout"""
+        try:
+            await asyncio.wait_for(entry.done.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class DatabaseIdempotencyStore:
+    """Key -> stored response in a shared table (key, fingerprint, status_code, media_type, body, compressed, expires_at)
+
+    A row with no status_code is the placeholder of a request in flight. It
+    only holds the key for lease_seconds, so a worker dying mid-request does
+    not block the key for the whole TTL. Expired rows are taken over by the
+    next request with their key, and purged in batches as new keys come in.
+    Every method but wait does blocking I/O: call them from a worker thread.
+    """
+
+    def __init__(self, session_factory, key_model, ttl_seconds: float = 86400, lease_seconds: float = 300,
+                 poll_interval: float = 0.05, purge_every: int = 1000, purge_batch: int = 1000, clock=time.time):
+        self.session_factory = session_factory
+        self.model = key_model
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.purge_every = purge_every
+        self.purge_batch = purge_batch
+        self.clock = clock
+        self._claims = 0
+
+    def _insert(self, dialect: str):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        return insert
+
+    def begin(self, key: bytes, fingerprint: bytes):
+        """Returns (state, entry), state being "new", "replay", "in_flight" or "mismatch" """
+        now = self.clock()
+        model = self.model
+        db = self.session_factory()
+        try:
+            insert = self._insert(db.get_bind().dialect.name)
+            placeholder = {
+                "fingerprint": fingerprint.hex(), "status_code": None, "media_type": None, "body": None,
+                "compressed": False, "expires_at": now + self.lease_seconds,
+            }
+            # Claim the key, or take over an expired row, in one statement: two requests can't both get "new"
+            statement = insert(model).values(key=key.hex(), **placeholder)
+            statement = statement.on_conflict_do_update(
+                index_elements=[model.key], set_=placeholder, where=model.expires_at <= now,
+            ).returning(model.key)
+            claimed = db.execute(statement).first() is not None
+            db.commit()
+            if claimed:
+                self._claims += 1
+                if self._claims % self.purge_every == 0:
+                    self.purge_expired(db, now)
+                return "new", _StoredResponse(key, fingerprint)
+
+            row = db.execute(select(
+                model.fingerprint, model.status_code, model.media_type, model.body, model.compressed
+            ).where(model.key == key.hex())).first()
+        finally:
+            db.close()
+        if row is None: # Released between the two statements: look again
+            return "in_flight", _StoredResponse(key, fingerprint)
+        if row.fingerprint != fingerprint.hex():
+            return "mismatch", _StoredResponse(key, bytes.fromhex(row.fingerprint))
+        entry = _StoredResponse(key, fingerprint, row.status_code, row.media_type, row.body or b"", row.compressed)
+        return ("replay" if row.status_code is not None else "in_flight"), entry
+
+    def complete(self, entry: _StoredResponse, status_code: int, body: bytes, media_type: str = None):
+        """Store the response of the first request, kept for ttl_seconds"""
+        model = self.model
+        stored, compressed = _pack(body)
+        db = self.session_factory()
+        try:
+            db.execute(update(model).where(model.key == entry.key.hex(), model.status_code.is_(None)).values(
+                status_code=status_code, media_type=media_type, body=stored, compressed=compressed,
+                expires_at=self.clock() + self.ttl_seconds,
+            ))
+            db.commit()
+        finally:
+            db.close()
+
+    def release(self, entry: _StoredResponse):
+        """Delete the placeholder of a request that failed, so the next retry runs the endpoint again"""
+        model = self.model
+        db = self.session_factory()
+        try:
+            db.execute(delete(model).where(model.key == entry.key.hex(), model.status_code.is_(None)))
+            db.commit()
+        finally:
+            db.close()
+
+    def purge_expired(self, db, now: float):
+        """Delete up to purge_batch expired rows, returns how many"""
+        model = self.model
+        batch = select(model.key).where(model.expires_at <= now).limit(self.purge_batch)
+        purged = db.execute(delete(model).where(model.key.in_(batch))).rowcount
+        db.commit()
+        return purged
+
+    async def wait(self, entry: _StoredResponse, timeout: float):
+        """The request in flight may be on another worker: poll"""
+        await asyncio.sleep(min(self.poll_interval, timeout))
+
+
+def idempotency_middleware(store, path_patterns, wait_timeout: float = 30.0, blocking: bool = False):
+    """HTTP middleware applying Idempotency-Key to POST requests on the given path regexes
+
+    blocking=True runs the store's begin/complete/release in a worker thread
+    (for DatabaseIdempotencyStore).
+    """
+    patterns = [re.compile(pattern) for pattern in path_patterns]
+
+    async def call(method, *args):
+        if blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def middleware(request, call_next):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key or request.method != "POST" or not any(p.fullmatch(request.url.path) for p in patterns):
+            return await call_next(request)
+        if len(key) > MAX_KEY_LENGTH:
+            return JSONResponse(status_code=400, content={"detail": f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters"})
+
+        body = await request.body()
+        # Scoped per caller and route, so two users can't collide on the same key
+        scope = "\0".join([request.headers.get("authorization", ""), request.url.path, key])
+        store_key = hashlib.sha256(scope.encode("utf-8")).digest()
+        fingerprint = hashlib.sha256(body).digest()[:16]
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait_timeout
+        while True:
+            state, entry = await call(store.begin, store_key, fingerprint)
+            if state == "new":
+                break
+            if state == "replay":
+                return entry.response()
+            if state == "mismatch":
+                return JSONResponse(status_code=422, content={"detail": f"{IDEMPOTENCY_HEADER} was already used with a different request"})
+            # Same request still running: wait for its result, then look again
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return JSONResponse(status_code=409, content={"detail": "A request with this Idempotency-Key is still being processed"})
+            await store.wait(entry, remaining)
+
+        try:
+            response = await call_next(request)
+            if response.status_code >= 500:
+                await call(store.release, entry) # Server errors are not stored, retrying may succeed
+                return response
+            response_body = b"".join([chunk async for chunk in response.body_iterator])
+        except BaseException:
+            await call(store.release, entry)
+            raise
+
+        await call(store.complete, entry, response.status_code, response_body, response.media_type)
+        return Response(content=response_body, status_code=response.status_code, headers=dict(response.headers), media_type=response.media_type)
+
+    return middleware
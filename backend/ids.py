@@ -0,0 +1,53 @@
+"""Primary keys: native UUID columns with time-ordered (version 7) values.
+
+Ids used to be ``str(uuid4())`` in VARCHAR columns: 36+ bytes in every
+primary key, foreign key and index entry, inserted at random B-tree
+positions. ``UUIDKey`` is a native 16-byte ``uuid`` on PostgreSQL (CHAR(32)
+elsewhere) that still reads and writes the usual dashed strings in Python,
+and ``new_id`` generates version 7 UUIDs whose leading 48 bits are the
+creation time in milliseconds, so new rows land at the right-hand edge of
+the index like a serial key would.
+"""
+import os
+import time
+import uuid
+
+from sqlalchemy import Uuid
+from sqlalchemy.types import TypeDecorator
+
+NIL_ID = "00000000-0000-0000-0000-000000000000"
+
+
+def uuid7() -> uuid.UUID:
+    """RFC 9562 version 7: unix time in ms, then 74 random bits"""
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), "big")
+    value = value & ~(0xF << 76) | 0x7 << 76 # Version
+    value = value & ~(0x3 << 62) | 0x2 << 62 # Variant
+    return uuid.UUID(int=value)
+
+
+def new_id() -> str:
+    """Default for every UUIDKey primary key"""
+    return str(uuid7())
+
+
+class UUIDKey(TypeDecorator):
+    """Native UUID column holding the str ids used everywhere in the app
+
+    Malformed ids (e.g. from a URL) are bound as the nil UUID, so lookups find
+    nothing and 404 as they did with VARCHAR keys, instead of raising.
+    """
+    impl = Uuid
+    cache_ok = True
+
+    def __init__(self):
+        super().__init__(as_uuid=False)
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        try:
+            return str(uuid.UUID(str(value)))
+        except ValueError:
+            return NIL_ID
+
@@ -0,0 +1,190 @@
+"""Double-entry ledger for driver balances.
+
+Every money movement between a driver and the platform is one transaction
+with two legs that sum to zero: one on the driver's account and one on the
+platform's. ``driver_balances`` keeps the running total of the driver legs,
+so "how much do we owe driver X / does X owe us" is a primary-key lookup
+instead of summing payouts and cash collections.
+
+Sign convention for the driver account: positive means the platform owes the
+driver, negative means the driver owes the platform.
+
+Amounts are pesos at this module's interface (``Cents`` columns, see
+money.py) and integer centavos inside it, so legs, balances and
+reconciliation compare exactly.
+
+Like settlement.py, the functions take the session and models from server.py.
+"""
+import heapq
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import String, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from ids import new_id
+from money import from_cents, to_cents
+
+DRIVER_ACCOUNT = "driver"
+PLATFORM_ACCOUNT = "platform"
+
+PAYOUT_ACCRUED = "payout_accrued"  # Driver earned their share of an order
+PAYOUT_PAID = "payout_paid"  # Platform transferred a payout to the driver
+COMMISSION_OWED = "commission_owed"  # Driver collected cash and owes the commission
+COMMISSION_PAID = "commission_paid"  # Driver handed the commission over
+SETTLEMENT = "settlement"  # Net amount of a batch settlement (settlement.py)
+ADJUSTMENT = "adjustment"  # Correction posted by reconciliation
+
+# Effect of each entry type on the driver's balance
+DRIVER_SIGN = {
+    PAYOUT_ACCRUED: 1,
+    PAYOUT_PAID: -1,
+    COMMISSION_OWED: -1,
+    COMMISSION_PAID: 1,
+    SETTLEMENT: -1,
+    ADJUSTMENT: 1,
+}
+
+
+def post_entries(db, entry_model, balance_model, postings, now: datetime = None):
+    """Append ledger transactions and update materialized balances in the caller's transaction
+
+    postings: iterable of (driver_id, entry_type, amount, reference_type, reference_id)
+    """
+    now = now or datetime.utcnow()
+    rows = []
+    deltas = defaultdict(int) # Centavos
+    for driver_id, entry_type, amount, reference_type, reference_id in postings:
+        delta = DRIVER_SIGN[entry_type] * to_cents(amount)
+        if not delta:
+            continue
+        leg = {
+            "transaction_id": new_id(),
+            "driver_id": driver_id,
+            "entry_type": entry_type,
+            "reference_type": reference_type,
+            "reference_id": reference_id,
+            "created_at": now,
+        }
+        rows.append(dict(leg, account=DRIVER_ACCOUNT, amount=from_cents(delta)))
+        rows.append(dict(leg, account=PLATFORM_ACCOUNT, amount=from_cents(-delta)))
+        deltas[driver_id] += delta
+
+    if not rows:
+        return 0
+    db.execute(insert(entry_model), rows)
+    for driver_id, delta in deltas.items():
+        _add_to_balance(db, balance_model, driver_id, from_cents(delta), now)
+    return len(rows) // 2
+
+
+def post_entry(db, entry_model, balance_model, driver_id: str, entry_type: str, amount: float,
+               reference_type: str = None, reference_id: str = None):
+    """Single-transaction shortcut for post_entries"""
+    return post_entries(db, entry_model, balance_model, [(driver_id, entry_type, amount, reference_type, reference_id)])
+
+
+def _add_to_balance(db, balance_model, driver_id: str, delta: float, now: datetime):
+    """Atomic balance = balance + delta, creating the row on the driver's first entry"""
+    increment = (
+        update(balance_model)
+        .where(balance_model.driver_id == driver_id)
+        .values(balance=balance_model.balance + delta, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if db.execute(increment).rowcount:
+        return
+    try:
+        with db.begin_nested(): # Savepoint: a concurrent first insert falls back to the update
+            db.execute(insert(balance_model).values(driver_id=driver_id, balance=delta, updated_at=now))
+    except IntegrityError:
+        db.execute(increment)
+
+
+def _stream(db, statement, batch_size: int):
+    return db.execute(statement.execution_options(stream_results=True, yield_per=batch_size))
+
+
+def driver_order(db, column):
+    """ORDER BY key that sorts like Python strings, as the merge-join requires"""
+    if db.get_bind().dialect.name == "postgresql" and isinstance(column.type, String):
+        return column.collate("C")
+    return column # Native uuid sorts bytewise, the same order as its lowercase string form
+
+
+def reconcile_driver_balances(db, entry_model, balance_model, expected_statement, fix: bool = False,
+                              batch_size: int = 1000, max_reported: int = 100):
+    """Verify ledger and materialized balances against the source tables in one streaming pass
+
+    expected_statement must select (driver_id, expected_balance) ordered by driver_order(). The three
+    driver-ordered streams (sources, ledger, balances) are merge-joined, so memory does not grow
+    with the number of drivers. With fix=True, ledger drift is corrected with ADJUSTMENT entries
+    and stale balance rows are rewritten from the ledger (the caller commits).
+    """
+    ledger_statement = (
+        select(entry_model.driver_id, func.sum(entry_model.amount))
+        .where(entry_model.account == DRIVER_ACCOUNT)
+        .group_by(entry_model.driver_id)
+        .order_by(driver_order(db, entry_model.driver_id))
+    )
+    balance_statement = select(balance_model.driver_id, balance_model.balance).order_by(driver_order(db, balance_model.driver_id))
+
+    streams = [
+        ((row[0], 0, to_cents(row[1] or 0)) for row in _stream(db, expected_statement, batch_size)),
+        ((row[0], 1, to_cents(row[1] or 0)) for row in _stream(db, ledger_statement, batch_size)),
+        ((row[0], 2, to_cents(row[1] or 0)) for row in _stream(db, balance_statement, batch_size)),
+    ]
+
+    report = {"drivers_checked": 0, "ledger_mismatches": 0, "balance_mismatches": 0, "adjusted": 0, "mismatches": []}
+    adjustments = []
+    stale_balances = []
+
+    def check(driver_id, values):
+        expected, ledger_total, balance = values
+        report["drivers_checked"] += 1
+        ledger_off = expected != ledger_total
+        balance_off = ledger_total != balance
+        if not (ledger_off or balance_off):
+            return
+        report["ledger_mismatches"] += ledger_off
+        report["balance_mismatches"] += balance_off
+        if len(report["mismatches"]) < max_reported:
+            report["mismatches"].append({
+                "driver_id": driver_id,
+                "expected": from_cents(expected),
+                "ledger": from_cents(ledger_total),
+                "balance": from_cents(balance),
+            })
+        if fix and balance_off:
+            stale_balances.append((driver_id, from_cents(ledger_total)))
+        if fix and ledger_off:
+            adjustments.append((driver_id, ADJUSTMENT, from_cents(expected - ledger_total), "reconciliation", None))
+
+    current_driver, values = None, [0, 0, 0]
+    for driver_id, source, value in heapq.merge(*streams):
+        if driver_id != current_driver:
+            if current_driver is not None:
+                check(current_driver, values)
+            current_driver, values = driver_id, [0, 0, 0]
+        values[source] = value
+    if current_driver is not None:
+        check(current_driver, values)
+
+    if fix:
+        now = datetime.utcnow()
+        # Balance rows are derived data: rewrite them from the ledger first, then adjustments
+        # (which also move the balance) bring ledger and balance in line with the sources
+        for driver_id, ledger_total in stale_balances:
+            _set_balance(db, balance_model, driver_id, ledger_total, now)
+        report["adjusted"] = post_entries(db, entry_model, balance_model, adjustments, now)
+
+    return report
+
+
+def _set_balance(db, balance_model, driver_id: str, balance: float, now: datetime):
+    statement = (
+        update(balance_model).where(balance_model.driver_id == driver_id)
+        .values(balance=balance, updated_at=now).execution_options(synchronize_session=False)
+    )
+    if not db.execute(statement).rowcount:
+        db.execute(insert(balance_model).values(driver_id=driver_id, balance=balance, updated_at=now))
@@ -0,0 +1,139 @@
+"""Driver location ingest: latest positions in memory, history flushed in batches.
+
+Drivers report GPS points at a high rate. Each point only updates an
+in-process ``LocationStore`` (latest position per driver plus a coarse grid
+for "drivers near P" queries) and is queued for the append-only history
+table. A background loop drains the queue and writes it with one multi-row
+INSERT per flush, so ingest never touches ``users`` or holds a transaction.
+
+Like the other modules, the history model comes from server.py.
+"""
+import math
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import insert
+
+EARTH_RADIUS_KM = 6371.0088
+GRID_CELL_DEGREES = 0.01  # ~1.1 km of latitude per cell
+
+# recorded_at: when the device took the fix, received_at: when the server got it
+Position = namedtuple("Position", ["driver_id", "lat", "lng", "accuracy", "speed", "heading", "recorded_at", "received_at"])
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _cell(lat: float, lng: float):
+    return (math.floor(lat / GRID_CELL_DEGREES), math.floor(lng / GRID_CELL_DEGREES))
+
+
+class LocationStore:
+    """Latest position per driver, a grid index over them and the queue of points to persist
+
+    Only touched from the event loop; the flush loop drains the queue there and
+    writes it from a worker thread.
+    """
+
+    def __init__(self, max_age_seconds: float = 300, max_pending: int = 200_000):
+        self.max_age_seconds = max_age_seconds
+        self.max_pending = max_pending
+        self._latest = {} # driver_id -> Position
+        self._grid = {} # cell -> set of driver_ids
+        self._pending = []
+        self.dropped = 0 # Points not queued for history because the queue was full
+
+    def __len__(self):
+        return len(self._latest)
+
+    def ingest(self, driver_id: str, points):
+        """Record a batch of (lat, lng, accuracy, speed, heading, recorded_at) for one driver, returns how many were accepted"""
+        received_at = datetime.utcnow()
+        accepted = 0
+        for lat, lng, accuracy, speed, heading, recorded_at in points:
+            position = Position(driver_id, lat, lng, accuracy, speed, heading, recorded_at or received_at, received_at)
+            if len(self._pending) < self.max_pending:
+                self._pending.append(position)
+            else:
+                self.dropped += 1
+            accepted += 1
+
+            current = self._latest.get(driver_id)
+            if current is not None and current.recorded_at > position.recorded_at:
+                continue # Out-of-order point: history only
+            if current is not None:
+                self._grid_remove(driver_id, current)
+            self._latest[driver_id] = position
+            self._grid.setdefault(_cell(lat, lng), set()).add(driver_id)
+        return accepted
+
+    def _grid_remove(self, driver_id: str, position: Position):
+        cell = _cell(position.lat, position.lng)
+        drivers = self._grid.get(cell)
+        if drivers is not None:
+            drivers.discard(driver_id)
+            if not drivers:
+                del self._grid[cell]
+
+    def _is_fresh(self, position: Position, now: float):
+        return now - position.received_at.timestamp() <= self.max_age_seconds
+
+    def latest(self, driver_id: str):
+        """Latest fresh position of a driver, or None"""
+        position = self._latest.get(driver_id)
+        if position is None or not self._is_fresh(position, datetime.utcnow().timestamp()):
+            return None
+        return position
+
+    def near(self, lat: float, lng: float, radius_km: float, limit: int = 50):
+        """Fresh positions within radius_km of (lat, lng), closest first, as (distance_km, Position)"""
+        now = datetime.utcnow().timestamp()
+        lat_cells = math.ceil(radius_km / (111.32 * GRID_CELL_DEGREES))
+        # Longitude degrees shrink with latitude, so more cells are needed east-west
+        lng_scale = max(math.cos(math.radians(lat)), 0.01)
+        lng_cells = math.ceil(radius_km / (111.32 * GRID_CELL_DEGREES * lng_scale))
+        center_lat, center_lng = _cell(lat, lng)
+
+        found = []
+        for cell_lat in range(center_lat - lat_cells, center_lat + lat_cells + 1):
+            for cell_lng in range(center_lng - lng_cells, center_lng + lng_cells + 1):
+                for driver_id in self._grid.get((cell_lat, cell_lng), ()):
+                    position = self._latest[driver_id]
+                    if not self._is_fresh(position, now):
+                        continue
+                    distance = haversine_km(lat, lng, position.lat, position.lng)
+                    if distance <= radius_km:
+                        found.append((distance, position))
+        found.sort(key=lambda item: item[0])
+        return found[:limit]
+
+    def evict_stale(self):
+        """Forget drivers that stopped reporting, returns how many were removed"""
+        now = datetime.utcnow().timestamp()
+        stale = [driver_id for driver_id, position in self._latest.items() if not self._is_fresh(position, now)]
+        for driver_id in stale:
+            self._grid_remove(driver_id, self._latest.pop(driver_id))
+        return len(stale)
+
+    def drain(self):
+        """Take every queued point (called on the event loop before flushing)"""
+        pending, self._pending = self._pending, []
+        return pending
+
+    def requeue(self, positions):
+        """Put back points whose flush failed, ahead of newer ones, within max_pending"""
+        room = max(self.max_pending - len(self._pending), 0)
+        self.dropped += max(len(positions) - room, 0)
+        self._pending = list(positions[:room]) + self._pending
+
+
+def flush_positions(db, history_model, positions, batch_size: int = 5000):
+    """Append positions to the history table with multi-row INSERTs. The caller commits."""
+    for start in range(0, len(positions), batch_size):
+        db.execute(insert(history_model), [position._asdict() for position in positions[start:start + batch_size]])
+    return len(positions)
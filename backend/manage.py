@@ -0,0 +1,43 @@
+"""One-off operations, run once per deploy instead of in every worker at startup.
+
+    cd backend && python manage.py migrate [revision]   # alembic upgrade, default head
+    cd backend && python manage.py bootstrap-owner      # create the owner account / restore its flags
+    cd backend && python manage.py schema-version       # database revision vs the code's head
+"""
+import argparse
+import sys
+
+from server import SessionLocal, bootstrap_owner, check_schema_version, migrate_schema, settings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RapidMandados maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate = commands.add_parser("migrate", help="Upgrade the database schema")
+    migrate.add_argument("revision", nargs="?", default="head")
+    commands.add_parser("bootstrap-owner", help="Create the owner account, or restore its flags (idempotent)")
+    commands.add_parser("schema-version", help="Check the database is at the code's head revision")
+    args = parser.parse_args(argv)
+
+    if args.command == "migrate":
+        migrate_schema(args.revision)
+        print(f"🗄️ Database upgraded to {args.revision}")
+    elif args.command == "bootstrap-owner":
+        db = SessionLocal()
+        try:
+            outcome = bootstrap_owner(db)
+        finally:
+            db.close()
+        print(f"👑 Owner account {outcome}: {settings.OWNER_NAME} - {settings.OWNER_EMAIL}")
+    elif args.command == "schema-version":
+        try:
+            revision = check_schema_version()
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            return 1
+        print(f"🗄️ Database schema at {', '.join(sorted(revision))}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+"""Alembic environment: runs against the app's engine (settings.DATABASE_URL) with its models as target metadata."""
+import re
+
+from alembic import context
+
+from search import is_search_object
+from server import Base, engine
+
+target_metadata = Base.metadata
+
+# Monthly partitions (orders_2025_01, orders_default, ...) are created at runtime by partitions.py,
+# so autogenerate must not propose dropping them
+PARTITION_SUFFIX = re.compile(r"_(\d{4}_\d{2}|default)$")
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    if type_ == "table" and reflected and compare_to is None and PARTITION_SUFFIX.search(name):
+        return PARTITION_SUFFIX.sub("", name) not in target_metadata.tables
+    # Search column, indexes and FTS tables live outside the models (search_indexes migration)
+    if reflected and compare_to is None and is_search_object(type_, name):
+        return False
+    return True
+
+
+def run_migrations_online():
+    with engine.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+            transaction_per_migration=True,
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    raise SystemExit("Offline (--sql) migrations are not supported: revisions inspect and backfill the live database")
+run_migrations_online()
@@ -0,0 +1,180 @@
+"""Baseline: the schema workers built with create_all before migrations
+
+The eight tables as the app created them at startup: VARCHAR uuid4 ids,
+floating point money, and no index beyond the unique email. This revision is
+frozen. Every later change (columns, conversions, indexes, backfills) is its
+own revision. `python manage.py migrate` stamps a database created before
+migrations at this revision, so it upgrades the same way as an empty one.
+
+Enum columns take their labels from the app's enum classes. A label added to
+one of them later needs its own revision (ALTER TYPE ... ADD VALUE).
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+from server import (
+    DocumentStatus, DocumentType, OrderStatus, PaymentMethod, PaymentStatus, TransferStatus, UserStatus, UserType, VerificationStatus,
+)
+
+revision = "0001_baseline"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Created once up front: several tables share paymentmethod / paymentstatus
+ENUMS = {
+    cls: postgresql.ENUM(cls, name=cls.__name__.lower(), create_type=False)
+    for cls in (UserType, UserStatus, OrderStatus, PaymentStatus, PaymentMethod, TransferStatus, DocumentType, DocumentStatus, VerificationStatus)
+}
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        for enum in ENUMS.values():
+            enum.create(bind, checkfirst=True)
+
+    op.create_table(
+        "users",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("phone", sa.String(), nullable=False),
+        sa.Column("user_type", ENUMS[UserType], nullable=False),
+        sa.Column("password_hash", sa.String(), nullable=False),
+        sa.Column("address", sa.String(), nullable=True),
+        sa.Column("status", ENUMS[UserStatus], nullable=False),
+        sa.Column("is_phone_verified", sa.Boolean(), nullable=False),
+        sa.Column("is_email_verified", sa.Boolean(), nullable=False),
+        sa.Column("phone_verification_code", sa.String(), nullable=True),
+        sa.Column("email_verification_code", sa.String(), nullable=True),
+        sa.Column("verification_code_expires", sa.DateTime(), nullable=True),
+        sa.Column("documents_uploaded", sa.Boolean(), nullable=False),
+        sa.Column("admin_approved", sa.Boolean(), nullable=False),
+        sa.Column("admin_comments", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.Column("is_premium", sa.Boolean(), nullable=False),
+        sa.Column("premium_expires_at", sa.DateTime(), nullable=True),
+        sa.Column("commission_rate", sa.Float(), nullable=True),
+        sa.Column("is_active", sa.Boolean(), nullable=False),
+        sa.Column("total_orders", sa.Integer(), nullable=False),
+        sa.Column("total_earnings", sa.Float(), nullable=False),
+    )
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "orders",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("client_id", sa.String(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("driver_id", sa.String(), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("description", sa.Text(), nullable=False),
+        sa.Column("pickup_address", sa.String(), nullable=False),
+        sa.Column("delivery_address", sa.String(), nullable=False),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("status", ENUMS[OrderStatus], nullable=False),
+        sa.Column("payment_status", ENUMS[PaymentStatus], nullable=False),
+        sa.Column("payment_method", ENUMS[PaymentMethod], nullable=True),
+        sa.Column("financials", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("accepted_at", sa.DateTime(), nullable=True),
+        sa.Column("delivered_at", sa.DateTime(), nullable=True),
+        sa.Column("stripe_payment_intent", sa.String(), nullable=True),
+    )
+
+    op.create_table(
+        "payment_transactions",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("session_id", sa.String(), nullable=True),
+        sa.Column("user_id", sa.String(), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("order_id", sa.String(), nullable=True),
+        sa.Column("amount", sa.Float(), nullable=False),
+        sa.Column("currency", sa.String(), nullable=False),
+        sa.Column("payment_method", ENUMS[PaymentMethod], nullable=False),
+        sa.Column("payment_status", ENUMS[PaymentStatus], nullable=False),
+        sa.Column("metadata", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+    )
+
+    op.create_table(
+        "driver_payouts",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("driver_id", sa.String(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("order_id", sa.String(), sa.ForeignKey("orders.id"), nullable=False),
+        sa.Column("amount", sa.Float(), nullable=False),
+        sa.Column("currency", sa.String(), nullable=False),
+        sa.Column("payment_method", ENUMS[PaymentMethod], nullable=False),
+        sa.Column("transfer_status", ENUMS[TransferStatus], nullable=False),
+        sa.Column("stripe_transfer_id", sa.String(), nullable=True),
+        sa.Column("bank_account", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+    )
+
+    op.create_table(
+        "cash_collections",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("driver_id", sa.String(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("order_id", sa.String(), sa.ForeignKey("orders.id"), nullable=False),
+        sa.Column("amount_collected", sa.Float(), nullable=False),
+        sa.Column("commission_owed", sa.Float(), nullable=False),
+        sa.Column("currency", sa.String(), nullable=False),
+        sa.Column("collection_date", sa.DateTime(), nullable=False),
+        sa.Column("payment_status", ENUMS[PaymentStatus], nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+
+    op.create_table(
+        "documents",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("user_id", sa.String(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("document_type", ENUMS[DocumentType], nullable=False),
+        sa.Column("file_name", sa.String(), nullable=False),
+        sa.Column("file_data", sa.Text(), nullable=False),
+        sa.Column("upload_date", sa.DateTime(), nullable=False),
+        sa.Column("status", ENUMS[DocumentStatus], nullable=False),
+        sa.Column("admin_comments", sa.String(), nullable=True),
+        sa.Column("auto_verified", sa.Boolean(), nullable=False),
+        sa.Column("verification_confidence", sa.Float(), nullable=True),
+    )
+
+    op.create_table(
+        "email_verifications",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("user_id", sa.String(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("verification_code", sa.String(), nullable=False),
+        sa.Column("status", ENUMS[VerificationStatus], nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.Column("verified_at", sa.DateTime(), nullable=True),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("max_attempts", sa.Integer(), nullable=False),
+    )
+
+    op.create_table(
+        "commission_config",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("commission_rate", sa.Float(), nullable=False),
+        sa.Column("service_fee", sa.Float(), nullable=False),
+        sa.Column("premium_subscription_monthly", sa.Float(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_by", sa.String(), nullable=True),
+    )
+
+
+def downgrade():
+    for table in ("commission_config", "email_verifications", "documents", "cash_collections", "driver_payouts",
+                  "payment_transactions", "orders", "users"):
+        op.drop_table(table)
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        for enum in ENUMS.values():
+            enum.drop(bind, checkfirst=True)
@@ -0,0 +1,46 @@
+"""Money as BIGINT centavos
+
+Amount columns stored floating point pesos. They become integer centavos
+(money.py), rounded half-up like to_cents: PostgreSQL rounds the numeric
+value, so 19.99 is 1999 and not 1998.
+
+Revision ID: 0002_money_centavos
+Revises: 0001_baseline
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0002_money_centavos"
+down_revision = "0001_baseline"
+branch_labels = None
+depends_on = None
+
+MONEY_COLUMNS = {
+    "users": ["total_earnings"],
+    "orders": ["price"],
+    "payment_transactions": ["amount"],
+    "driver_payouts": ["amount"],
+    "cash_collections": ["amount_collected", "commission_owed"],
+    "commission_config": ["service_fee", "premium_subscription_monthly"],
+}
+
+
+def upgrade():
+    sqlite = op.get_bind().dialect.name == "sqlite"
+    for table, columns in MONEY_COLUMNS.items():
+        if sqlite: # No USING clause: scale in place, the table copy below casts to integers
+            op.execute(f"UPDATE {table} SET " + ", ".join(f"{column} = round({column} * 100)" for column in columns))
+        with op.batch_alter_table(table) as batch:
+            for column in columns:
+                batch.alter_column(column, type_=sa.BigInteger(), postgresql_using=f"round({column}::numeric * 100)::bigint")
+
+
+def downgrade():
+    sqlite = op.get_bind().dialect.name == "sqlite"
+    for table, columns in MONEY_COLUMNS.items():
+        with op.batch_alter_table(table) as batch:
+            for column in columns:
+                batch.alter_column(column, type_=sa.Float(), postgresql_using=f"{column} / 100.0")
+        if sqlite:
+            op.execute(f"UPDATE {table} SET " + ", ".join(f"{column} = {column} / 100.0" for column in columns))
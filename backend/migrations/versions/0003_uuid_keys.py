@@ -0,0 +1,78 @@
+"""Native uuid keys, indexed foreign keys
+
+Id and reference columns held uuid4 strings in VARCHAR. They become native
+uuid columns on PostgreSQL, with the foreign keys dropped and recreated around
+the change since both ends change type. SQLite stores 32 hex digits (CHAR(32),
+what UUIDKey binds). The foreign key columns the app filters on get an index.
+
+Revision ID: 0003_uuid_keys
+Revises: 0002_money_centavos
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0003_uuid_keys"
+down_revision = "0002_money_centavos"
+branch_labels = None
+depends_on = None
+
+UUID_COLUMNS = {
+    "users": ["id"],
+    "orders": ["id", "client_id", "driver_id"],
+    "payment_transactions": ["id", "user_id", "order_id"],
+    "driver_payouts": ["id", "driver_id", "order_id"],
+    "cash_collections": ["id", "driver_id", "order_id"],
+    "documents": ["id", "user_id"],
+    "email_verifications": ["id", "user_id"],
+    "commission_config": ["updated_by"],
+}
+INDEXED_COLUMNS = {
+    "orders": ["client_id", "driver_id"],
+    "payment_transactions": ["user_id", "order_id"],
+    "driver_payouts": ["driver_id", "order_id"],
+    "cash_collections": ["driver_id", "order_id"],
+    "documents": ["user_id"],
+    "email_verifications": ["user_id"],
+}
+
+
+def _convert(to_type, using, sqlite_before=None, sqlite_after=None):
+    bind = op.get_bind()
+    sqlite = bind.dialect.name == "sqlite"
+    foreign_keys = []
+    if bind.dialect.name == "postgresql":
+        inspector = sa.inspect(bind)
+        foreign_keys = [(table, foreign_key) for table in UUID_COLUMNS for foreign_key in inspector.get_foreign_keys(table)]
+        for table, foreign_key in foreign_keys:
+            op.drop_constraint(foreign_key["name"], table, type_="foreignkey")
+    for table, columns in UUID_COLUMNS.items():
+        if sqlite and sqlite_before:
+            op.execute(f"UPDATE {table} SET " + ", ".join(f"{column} = {sqlite_before.format(column=column)}" for column in columns))
+        with op.batch_alter_table(table) as batch:
+            for column in columns:
+                batch.alter_column(column, type_=to_type, postgresql_using=using.format(column=column))
+        if sqlite and sqlite_after:
+            op.execute(f"UPDATE {table} SET " + ", ".join(f"{column} = {sqlite_after.format(column=column)}" for column in columns))
+    for table, foreign_key in foreign_keys:
+        op.create_foreign_key(
+            foreign_key["name"], table, foreign_key["referred_table"], foreign_key["constrained_columns"], foreign_key["referred_columns"]
+        )
+
+
+def upgrade():
+    _convert(sa.Uuid(), "{column}::uuid", sqlite_before="lower(replace({column}, '-', ''))")
+    for table, columns in INDEXED_COLUMNS.items():
+        for column in columns:
+            op.create_index(f"ix_{table}_{column}", table, [column])
+
+
+def downgrade():
+    for table, columns in INDEXED_COLUMNS.items():
+        for column in columns:
+            op.drop_index(f"ix_{table}_{column}", table_name=table)
+    _convert(
+        sa.String(), "{column}::text",
+        sqlite_after="substr({column}, 1, 8) || '-' || substr({column}, 9, 4) || '-' || substr({column}, 13, 4) || '-' "
+                     "|| substr({column}, 17, 4) || '-' || substr({column}, 21)",
+    )
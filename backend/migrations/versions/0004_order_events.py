@@ -0,0 +1,93 @@
+"""Order event log and its projections
+
+order_events is the append-only log of order lifecycle events;
+projection_checkpoints records the last event each projection consumed, and
+order_daily_rollups is the delivered orders per day projection. On
+PostgreSQL each event records its inserting transaction, which projections
+read in commit-safe order (run_order_projections).
+
+Orders delivered before the log have no events: their days are rolled up
+here from the orders' financials, once.
+
+Revision ID: 0004_order_events
+Revises: 0003_uuid_keys
+Create Date: 2026-10-19
+"""
+import json
+from collections import defaultdict
+
+import sqlalchemy as sa
+from alembic import op
+
+from money import to_cents
+
+revision = "0004_order_events"
+down_revision = "0003_uuid_keys"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def upgrade():
+    connection = op.get_bind()
+    postgresql = connection.dialect.name == "postgresql"
+    op.create_table(
+        "order_events",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("order_id", sa.Uuid(), sa.ForeignKey("orders.id"), nullable=False),
+        sa.Column("event_type", sa.String(), nullable=False),
+        sa.Column("from_status", sa.String(), nullable=True),
+        sa.Column("to_status", sa.String(), nullable=True),
+        sa.Column("actor_id", sa.Uuid(), nullable=True),
+        sa.Column("client_id", sa.Uuid(), nullable=True),
+        sa.Column("driver_id", sa.Uuid(), nullable=True),
+        sa.Column("payload", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column(
+            "transaction_id", sa.BigInteger(), nullable=True,
+            server_default=sa.text("pg_current_xact_id()::text::bigint") if postgresql else None,
+        ),
+    )
+    for column in ("order_id", "client_id", "driver_id"):
+        op.create_index(f"ix_order_events_{column}", "order_events", [column])
+    op.create_index("ix_order_events_transaction_id_id", "order_events", ["transaction_id", "id"])
+
+    op.create_table(
+        "projection_checkpoints",
+        sa.Column("name", sa.String(), primary_key=True),
+        sa.Column("last_event_id", sa.Integer(), nullable=False),
+        sa.Column("last_transaction_id", sa.BigInteger(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+    )
+
+    rollups = op.create_table(
+        "order_daily_rollups",
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("delivered_orders", sa.Integer(), nullable=False),
+        sa.Column("revenue", sa.BigInteger(), nullable=False),
+        sa.Column("commission", sa.BigInteger(), nullable=False),
+        sa.Column("driver_earnings", sa.BigInteger(), nullable=False),
+    )
+
+    orders = sa.Table("orders", sa.MetaData(), autoload_with=connection)
+    days = defaultdict(lambda: {"delivered_orders": 0, "revenue": 0, "commission": 0, "driver_earnings": 0}) # Centavos
+    delivered = connection.execute(
+        sa.select(orders.c.delivered_at, orders.c.created_at, orders.c.financials).where(orders.c.status == "DELIVERED")
+        .execution_options(stream_results=True, yield_per=BATCH_SIZE)
+    )
+    for delivered_at, created_at, financials in delivered:
+        financials = json.loads(financials) if financials else {}
+        day = days[(delivered_at or created_at).date()]
+        day["delivered_orders"] += 1
+        day["revenue"] += to_cents(financials.get("total_amount", 0))
+        day["commission"] += to_cents(financials.get("owner_earnings", 0))
+        day["driver_earnings"] += to_cents(financials.get("driver_earnings", 0))
+    if days:
+        connection.execute(rollups.insert(), [{"day": day, **totals} for day, totals in sorted(days.items())])
+
+
+def downgrade():
+    op.drop_table("order_daily_rollups")
+    op.drop_table("projection_checkpoints")
+    op.drop_table("order_events")
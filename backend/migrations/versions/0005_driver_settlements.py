@@ -0,0 +1,55 @@
+"""Driver settlements
+
+One row per driver per settlement run, netting the driver's payouts against
+the commission owed on cash collections (settlement.py). Payouts and
+collections netted into a run are marked with its settlement_batch_id.
+
+Revision ID: 0005_driver_settlements
+Revises: 0004_order_events
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+from server import TransferStatus
+
+revision = "0005_driver_settlements"
+down_revision = "0004_order_events"
+branch_labels = None
+depends_on = None
+
+SETTLED_TABLES = ["driver_payouts", "cash_collections"]
+
+
+def upgrade():
+    op.create_table(
+        "driver_settlements",
+        sa.Column("id", sa.Uuid(), primary_key=True),
+        sa.Column("batch_id", sa.Uuid(), nullable=False),
+        sa.Column("driver_id", sa.Uuid(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("period_start", sa.DateTime(), nullable=False),
+        sa.Column("period_end", sa.DateTime(), nullable=False),
+        sa.Column("payouts_total", sa.BigInteger(), nullable=False),
+        sa.Column("commission_total", sa.BigInteger(), nullable=False),
+        sa.Column("net_amount", sa.BigInteger(), nullable=False),
+        sa.Column("payout_count", sa.Integer(), nullable=False),
+        sa.Column("collection_count", sa.Integer(), nullable=False),
+        # transferstatus exists since the baseline (driver_payouts)
+        sa.Column("status", postgresql.ENUM(TransferStatus, name="transferstatus", create_type=False), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("created_by", sa.Uuid(), nullable=True),
+    )
+    op.create_index("ix_driver_settlements_batch_id", "driver_settlements", ["batch_id"])
+    op.create_index("ix_driver_settlements_driver_id", "driver_settlements", ["driver_id"])
+    for table in SETTLED_TABLES:
+        op.add_column(table, sa.Column("settlement_batch_id", sa.Uuid(), nullable=True))
+        op.create_index(f"ix_{table}_settlement_batch_id", table, ["settlement_batch_id"])
+
+
+def downgrade():
+    for table in SETTLED_TABLES:
+        op.drop_index(f"ix_{table}_settlement_batch_id", table_name=table)
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column("settlement_batch_id")
+    op.drop_table("driver_settlements")
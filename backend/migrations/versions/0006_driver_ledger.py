@@ -0,0 +1,45 @@
+"""Driver ledger
+
+Append-only double-entry ledger of driver <-> platform money, and the
+materialized running balance per driver (ledger.py).
+
+Revision ID: 0006_driver_ledger
+Revises: 0005_driver_settlements
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0006_driver_ledger"
+down_revision = "0005_driver_settlements"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "ledger_entries",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("transaction_id", sa.Uuid(), nullable=False),
+        sa.Column("driver_id", sa.Uuid(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("account", sa.String(), nullable=False),
+        sa.Column("amount", sa.BigInteger(), nullable=False),
+        sa.Column("entry_type", sa.String(), nullable=False),
+        sa.Column("reference_type", sa.String(), nullable=True),
+        sa.Column("reference_id", sa.Uuid(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_ledger_entries_transaction_id", "ledger_entries", ["transaction_id"])
+    op.create_index("ix_ledger_entries_driver_id", "ledger_entries", ["driver_id"])
+
+    op.create_table(
+        "driver_balances",
+        sa.Column("driver_id", sa.Uuid(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("balance", sa.BigInteger(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("driver_balances")
+    op.drop_table("ledger_entries")
@@ -0,0 +1,29 @@
+"""Rate limit buckets
+
+Token buckets shared by every worker when the auth rate limiter uses the
+database backend (ratelimit.py).
+
+Revision ID: 0007_rate_limit_buckets
+Revises: 0006_driver_ledger
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0007_rate_limit_buckets"
+down_revision = "0006_driver_ledger"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "rate_limit_buckets",
+        sa.Column("key", sa.String(), primary_key=True),
+        sa.Column("tokens", sa.Float(), nullable=False),
+        sa.Column("updated_at", sa.Float(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("rate_limit_buckets")
@@ -0,0 +1,25 @@
+"""Verification sweeper indexes
+
+The sweeper clears expired codes on users by verification_code_expires, and
+expires email verifications by status and expires_at.
+
+Revision ID: 0008_verification_sweep_indexes
+Revises: 0007_rate_limit_buckets
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0008_verification_sweep_indexes"
+down_revision = "0007_rate_limit_buckets"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_users_verification_code_expires", "users", ["verification_code_expires"])
+    op.create_index("ix_email_verifications_status_expires_at", "email_verifications", ["status", "expires_at"])
+
+
+def downgrade():
+    op.drop_index("ix_email_verifications_status_expires_at", table_name="email_verifications")
+    op.drop_index("ix_users_verification_code_expires", table_name="users")
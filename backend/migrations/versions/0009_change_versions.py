@@ -0,0 +1,29 @@
+"""Change versions
+
+Per-resource change counters behind the ETag / Last-Modified headers of list
+and stats endpoints (conditional.py).
+
+Revision ID: 0009_change_versions
+Revises: 0008_verification_sweep_indexes
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0009_change_versions"
+down_revision = "0008_verification_sweep_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "change_versions",
+        sa.Column("resource", sa.String(), primary_key=True),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("changed_at", sa.DateTime(), nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_table("change_versions")
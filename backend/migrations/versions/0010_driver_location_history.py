@@ -0,0 +1,36 @@
+"""Driver location history
+
+Append-only GPS history written in batches by the location flush loop. No
+foreign key on driver_id, which keeps the high-rate inserts cheap.
+
+Revision ID: 0010_driver_location_history
+Revises: 0009_change_versions
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0010_driver_location_history"
+down_revision = "0009_change_versions"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "driver_location_history",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("driver_id", sa.Uuid(), nullable=False),
+        sa.Column("lat", sa.Float(), nullable=False),
+        sa.Column("lng", sa.Float(), nullable=False),
+        sa.Column("accuracy", sa.Float(), nullable=True),
+        sa.Column("speed", sa.Float(), nullable=True),
+        sa.Column("heading", sa.Float(), nullable=True),
+        sa.Column("recorded_at", sa.DateTime(), nullable=False),
+        sa.Column("received_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_driver_location_history_driver_recorded", "driver_location_history", ["driver_id", "recorded_at"])
+
+
+def downgrade():
+    op.drop_table("driver_location_history")
@@ -0,0 +1,43 @@
+"""Geocode and route caches
+
+Geocoded addresses and pickup -> delivery distances / ETAs reused by route
+quotes (routing.py).
+
+Revision ID: 0011_route_caches
+Revises: 0010_driver_location_history
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0011_route_caches"
+down_revision = "0010_driver_location_history"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "geocode_cache",
+        sa.Column("key", sa.String(), primary_key=True),
+        sa.Column("address", sa.String(), nullable=False),
+        sa.Column("lat", sa.Float(), nullable=False),
+        sa.Column("lng", sa.Float(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+    op.create_table(
+        "route_cache",
+        sa.Column("key", sa.String(), primary_key=True),
+        sa.Column("distance_km", sa.Float(), nullable=False),
+        sa.Column("duration_minutes", sa.Float(), nullable=False),
+        sa.Column("pickup_lat", sa.Float(), nullable=False),
+        sa.Column("pickup_lng", sa.Float(), nullable=False),
+        sa.Column("delivery_lat", sa.Float(), nullable=False),
+        sa.Column("delivery_lng", sa.Float(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("route_cache")
+    op.drop_table("geocode_cache")
@@ -0,0 +1,53 @@
+"""Order deadlines
+
+The next expiry / rebroadcast deadline of each unaccepted order
+(scheduler.py). Orders already open get one, spaced as if the scheduler had
+been running since they were created: the rebroadcasts they would have had
+count as done, and a deadline already past is due now.
+
+Revision ID: 0012_order_deadlines
+Revises: 0011_route_caches
+Create Date: 2026-10-19
+"""
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0012_order_deadlines"
+down_revision = "0011_route_caches"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def upgrade():
+    from server import settings
+
+    op.create_table(
+        "order_deadlines",
+        sa.Column("order_id", sa.Uuid(), sa.ForeignKey("orders.id"), primary_key=True),
+        sa.Column("due_at", sa.DateTime(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+    )
+    op.create_index("ix_order_deadlines_due_at", "order_deadlines", ["due_at"])
+
+    connection = op.get_bind()
+    metadata = sa.MetaData()
+    orders = sa.Table("orders", metadata, autoload_with=connection)
+    deadlines = sa.Table("order_deadlines", metadata, autoload_with=connection)
+    now = datetime.utcnow()
+    timeout = timedelta(seconds=settings.ORDER_PENDING_TIMEOUT_SECONDS)
+    rows = []
+    for order_id, created_at in connection.execute(
+        sa.select(orders.c.id, orders.c.created_at).where(orders.c.status == "PENDING", orders.c.driver_id.is_(None))
+    ):
+        attempts = min(int((now - created_at) / timeout), settings.ORDER_PENDING_REBROADCASTS)
+        rows.append({"order_id": order_id, "due_at": max(created_at + timeout * (attempts + 1), now), "attempts": attempts})
+    for start in range(0, len(rows), BATCH_SIZE):
+        connection.execute(deadlines.insert(), rows[start:start + BATCH_SIZE])
+
+
+def downgrade():
+    op.drop_table("order_deadlines")
@@ -0,0 +1,34 @@
+"""Scheduled orders
+
+orders.scheduled_for is the requested pickup time; release_at holds a
+scheduled order out of the open pool until shortly before it, and is cleared
+on release. The partial index only covers held orders, so the release query
+never scans open ones.
+
+Revision ID: 0013_scheduled_orders
+Revises: 0012_order_deadlines
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0013_scheduled_orders"
+down_revision = "0012_order_deadlines"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("orders", sa.Column("scheduled_for", sa.DateTime(), nullable=True))
+    op.add_column("orders", sa.Column("release_at", sa.DateTime(), nullable=True))
+    op.create_index(
+        "ix_orders_release_at", "orders", ["release_at"],
+        postgresql_where=sa.text("release_at IS NOT NULL"), sqlite_where=sa.text("release_at IS NOT NULL"),
+    )
+
+
+def downgrade():
+    op.drop_index("ix_orders_release_at", table_name="orders")
+    with op.batch_alter_table("orders") as batch:
+        batch.drop_column("release_at")
+        batch.drop_column("scheduled_for")
@@ -0,0 +1,57 @@
+"""Order amount columns
+
+orders.total_amount and owner_earnings, in centavos, so revenue is summed by
+the database instead of parsing every order's financials JSON. Existing
+orders are filled from that JSON (pesos) in batches.
+
+Revision ID: 0014_order_amounts
+Revises: 0013_scheduled_orders
+Create Date: 2026-10-19
+"""
+import json
+
+import sqlalchemy as sa
+from alembic import op
+
+from money import to_cents
+
+revision = "0014_order_amounts"
+down_revision = "0013_scheduled_orders"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def upgrade():
+    op.add_column("orders", sa.Column("total_amount", sa.BigInteger(), nullable=True))
+    op.add_column("orders", sa.Column("owner_earnings", sa.BigInteger(), nullable=True))
+
+    connection = op.get_bind()
+    orders = sa.Table("orders", sa.MetaData(), autoload_with=connection)
+    update_statement = orders.update().where(orders.c.id == sa.bindparam("order_id")).values(
+        total_amount=sa.bindparam("new_total_amount"), owner_earnings=sa.bindparam("new_owner_earnings")
+    )
+    while True:
+        rows = connection.execute(
+            sa.select(orders.c.id, orders.c.financials)
+            .where(orders.c.total_amount.is_(None), orders.c.financials.isnot(None))
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        params = []
+        for order_id, financials in rows:
+            financials = json.loads(financials)
+            params.append({
+                "order_id": order_id,
+                "new_total_amount": to_cents(financials.get("total_amount", 0)),
+                "new_owner_earnings": to_cents(financials.get("owner_earnings", 0)),
+            })
+        connection.execute(update_statement, params)
+
+
+def downgrade():
+    with op.batch_alter_table("orders") as batch:
+        batch.drop_column("owner_earnings")
+        batch.drop_column("total_amount")
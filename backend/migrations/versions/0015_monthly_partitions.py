@@ -0,0 +1,71 @@
+"""Monthly partitions and the archive
+
+orders, payment_transactions and cash_collections get a created_at index and,
+on PostgreSQL, become tables partitioned by month of created_at
+(partitions.py). archived_months records the settled months moved to the
+cold archive (archive.py). Other dialects keep plain tables.
+
+Partitions are created PARTITION_MONTHS_AHEAD months in advance, overridden
+with `alembic -x partition_months_ahead=N upgrade ...`; the app's
+maintenance loop keeps settings.PARTITION_MONTHS_AHEAD ahead from then on.
+The downgrade copies the rows back into plain tables and restores the foreign
+keys to orders that partitioning dropped.
+
+Revision ID: 0015_monthly_partitions
+Revises: 0014_order_amounts
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import context, op
+
+from partitions import partition_tables, unpartition_tables
+
+revision = "0015_monthly_partitions"
+down_revision = "0014_order_amounts"
+branch_labels = None
+depends_on = None
+
+PARTITIONED_TABLES = ["orders", "payment_transactions", "cash_collections"]
+PARTITION_MONTHS_AHEAD = 3
+# Foreign keys partitioning drops: nothing can reference a partitioned table
+ORDER_REFERENCES = [
+    ("driver_payouts", "order_id", "orders"),
+    ("order_events", "order_id", "orders"),
+    ("order_deadlines", "order_id", "orders"),
+    ("cash_collections", "order_id", "orders"),
+]
+
+
+def upgrade():
+    months_ahead = int(context.get_x_argument(as_dictionary=True).get("partition_months_ahead", PARTITION_MONTHS_AHEAD))
+    for table in PARTITIONED_TABLES:
+        op.create_index(f"ix_{table}_created_at", table, ["created_at"])
+    op.create_table(
+        "archived_months",
+        sa.Column("table_name", sa.String(), primary_key=True),
+        sa.Column("month", sa.DateTime(), primary_key=True),
+        sa.Column("path", sa.String(), nullable=False),
+        sa.Column("row_count", sa.Integer(), nullable=False),
+        sa.Column("file_bytes", sa.BigInteger(), nullable=False),
+        sa.Column("delivered_orders", sa.Integer(), nullable=True),
+        sa.Column("revenue", sa.BigInteger(), nullable=True),
+        sa.Column("commission", sa.BigInteger(), nullable=True),
+        sa.Column("archived_at", sa.DateTime(), nullable=False),
+    )
+
+    connection = op.get_bind()
+    if connection.dialect.name == "postgresql":
+        metadata = sa.MetaData()
+        tables = [sa.Table(name, metadata, autoload_with=connection) for name in PARTITIONED_TABLES]
+        partition_tables(connection, tables, months_ahead)
+
+
+def downgrade():
+    connection = op.get_bind()
+    if connection.dialect.name == "postgresql":
+        metadata = sa.MetaData()
+        tables = [sa.Table(name, metadata, autoload_with=connection) for name in PARTITIONED_TABLES]
+        unpartition_tables(connection, tables, ORDER_REFERENCES)
+    op.drop_table("archived_months")
+    for table in PARTITIONED_TABLES:
+        op.drop_index(f"ix_{table}_created_at", table_name=table)
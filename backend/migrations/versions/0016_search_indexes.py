@@ -0,0 +1,26 @@
+"""Admin search indexes
+
+PostgreSQL: orders.search_vector (generated tsvector) with a GIN index, and
+pg_trgm GIN indexes on users name, email and phone. SQLite: FTS5 tables kept
+in sync by triggers. See search.py.
+
+Revision ID: 0016_search_indexes
+Revises: 0015_monthly_partitions
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+from search import create_search_indexes, drop_search_indexes
+
+revision = "0016_search_indexes"
+down_revision = "0015_monthly_partitions"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    create_search_indexes(op.get_bind())
+
+
+def downgrade():
+    drop_search_indexes(op.get_bind())
@@ -0,0 +1,41 @@
+"""Document image pipeline columns
+
+Adds the columns the image pipeline fills in (documents.py). Documents
+uploaded before it are marked processed as they are, so the pipeline does not
+revisit decisions already taken on them.
+
+Revision ID: 0017_document_processing
+Revises: 0016_search_indexes
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0017_document_processing"
+down_revision = "0016_search_indexes"
+branch_labels = None
+depends_on = None
+
+COLUMNS = {
+    "processing_started_at": sa.DateTime,
+    "processed_at": sa.DateTime,
+    "image_width": sa.Integer,
+    "image_height": sa.Integer,
+    "thumbnails": sa.Text,
+    "phash": sa.BigInteger,
+    "duplicate_of": sa.Uuid,
+    "processing_timings": sa.Text,
+}
+
+
+def upgrade():
+    for name, type_ in COLUMNS.items():
+        op.add_column("documents", sa.Column(name, type_(), nullable=True))
+    documents = sa.table("documents", sa.column("processed_at", sa.DateTime()), sa.column("upload_date", sa.DateTime()))
+    op.execute(documents.update().where(documents.c.processed_at.is_(None)).values(processed_at=documents.c.upload_date))
+
+
+def downgrade():
+    with op.batch_alter_table("documents") as batch:
+        for name in reversed(COLUMNS):
+            batch.drop_column(name)
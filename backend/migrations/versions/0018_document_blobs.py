@@ -0,0 +1,104 @@
+"""Content-addressed document storage
+
+Document files move from documents.file_data to document_blobs, one row per
+SHA-256 of the decoded bytes with a reference count, along with the image
+pipeline's per-content results. Existing documents are hashed in batches;
+identical files collapse into one blob.
+
+Revision ID: 0018_document_blobs
+Revises: 0017_document_processing
+Create Date: 2026-10-19
+"""
+import base64
+import hashlib
+import json
+from datetime import datetime
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0018_document_blobs"
+down_revision = "0017_document_processing"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 200
+MOVED_COLUMNS = ["file_data", "image_width", "image_height", "thumbnails", "phash"]
+
+
+def _digest(file_data: str):
+    data = file_data.partition(",")[2] if file_data.startswith("data:") else file_data
+    try:
+        raw = base64.b64decode(data, validate=True)
+    except ValueError:
+        raw = data.encode("utf-8") # Not base64: stored as is, hashed as text
+    return hashlib.sha256(raw).hexdigest(), len(raw), data
+
+
+def upgrade():
+    blobs = op.create_table(
+        "document_blobs",
+        sa.Column("sha256", sa.String(64), primary_key=True),
+        sa.Column("data", sa.Text(), nullable=False),
+        sa.Column("upload_bytes", sa.BigInteger(), nullable=False),
+        sa.Column("stored_bytes", sa.BigInteger(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), nullable=False),
+        sa.Column("upload_count", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("processed_at", sa.DateTime(), nullable=True),
+        sa.Column("image_width", sa.Integer(), nullable=True),
+        sa.Column("image_height", sa.Integer(), nullable=True),
+        sa.Column("thumbnails", sa.Text(), nullable=True),
+        sa.Column("phash", sa.BigInteger(), nullable=True),
+        sa.Column("issues", sa.Text(), nullable=True),
+    )
+    op.add_column("documents", sa.Column("content_sha256", sa.String(64), nullable=True))
+    op.create_index("ix_documents_content_sha256", "documents", ["content_sha256"])
+
+    connection = op.get_bind()
+    documents = sa.Table("documents", sa.MetaData(), autoload_with=connection)
+    while True:
+        rows = connection.execute(
+            sa.select(documents).where(documents.c.content_sha256.is_(None)).limit(BATCH_SIZE)
+        ).mappings().all()
+        if not rows:
+            break
+        for row in rows:
+            digest, size, data = _digest(row["file_data"])
+            counters = {"ref_count": blobs.c.ref_count + 1, "upload_count": blobs.c.upload_count + 1}
+            if not connection.execute(blobs.update().where(blobs.c.sha256 == digest).values(counters)).rowcount:
+                processed = row["thumbnails"] is not None
+                connection.execute(blobs.insert().values(
+                    sha256=digest, data=data, upload_bytes=size,
+                    stored_bytes=len(base64.b64decode(data)) if processed else size,
+                    ref_count=1, upload_count=1, created_at=row["upload_date"] or datetime.utcnow(),
+                    processed_at=row["processed_at"], issues=json.dumps([]),
+                    image_width=row["image_width"], image_height=row["image_height"], thumbnails=row["thumbnails"], phash=row["phash"],
+                ))
+            connection.execute(documents.update().where(documents.c.id == row["id"]).values(content_sha256=digest))
+
+    with op.batch_alter_table("documents") as batch:
+        for name in MOVED_COLUMNS:
+            batch.drop_column(name)
+
+
+def downgrade():
+    with op.batch_alter_table("documents") as batch:
+        batch.add_column(sa.Column("file_data", sa.Text(), nullable=True))
+        batch.add_column(sa.Column("image_width", sa.Integer(), nullable=True))
+        batch.add_column(sa.Column("image_height", sa.Integer(), nullable=True))
+        batch.add_column(sa.Column("thumbnails", sa.Text(), nullable=True))
+        batch.add_column(sa.Column("phash", sa.BigInteger(), nullable=True))
+    connection = op.get_bind()
+    metadata = sa.MetaData()
+    documents = sa.Table("documents", metadata, autoload_with=connection)
+    blobs = sa.Table("document_blobs", metadata, autoload_with=connection)
+    for name, column in (("file_data", blobs.c.data), ("image_width", blobs.c.image_width), ("image_height", blobs.c.image_height),
+                         ("thumbnails", blobs.c.thumbnails), ("phash", blobs.c.phash)):
+        connection.execute(documents.update().values({
+            name: sa.select(column).where(blobs.c.sha256 == documents.c.content_sha256).scalar_subquery()
+        }))
+    op.drop_index("ix_documents_content_sha256", table_name="documents")
+    with op.batch_alter_table("documents") as batch:
+        batch.drop_column("content_sha256")
+    op.drop_table("document_blobs")
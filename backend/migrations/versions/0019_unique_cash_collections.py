@@ -0,0 +1,67 @@
+"""One cash collection per order
+
+cash_collections.order_id becomes unique, so a cash payment completed twice
+(two requests racing past the PAID check) fails instead of charging the
+driver's commission twice. Partitioned on PostgreSQL (0015_monthly_partitions),
+the table cannot have a unique index without created_at in it; a trigger
+enforces the rule there instead, serialized on the order row.
+
+Revision ID: 0019_unique_cash_collections
+Revises: 0018_document_blobs
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+from partitions import is_partitioned
+
+revision = "0019_unique_cash_collections"
+down_revision = "0018_document_blobs"
+branch_labels = None
+depends_on = None
+
+ONE_PER_ORDER_FUNCTION = """
+CREATE FUNCTION cash_collections_one_per_order() RETURNS trigger AS $$
+BEGIN
+    -- Concurrent inserts for one order wait on the order row, then see the committed collection
+    PERFORM 1 FROM orders WHERE id = NEW.order_id FOR UPDATE;
+    IF EXISTS (SELECT 1 FROM cash_collections WHERE order_id = NEW.order_id AND id <> NEW.id) THEN
+        RAISE EXCEPTION 'order % already has a cash collection', NEW.order_id USING ERRCODE = 'unique_violation';
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+def _partitioned(connection) -> bool:
+    return connection.dialect.name == "postgresql" and is_partitioned(connection, "cash_collections")
+
+
+def upgrade():
+    connection = op.get_bind()
+    collections = sa.table("cash_collections", sa.column("order_id"))
+    duplicated = connection.execute(
+        sa.select(collections.c.order_id).group_by(collections.c.order_id).having(sa.func.count() > 1)
+    ).scalars().all()
+    if duplicated:
+        raise RuntimeError(f"Orders with more than one cash collection, resolve them first: {', '.join(map(str, duplicated))}")
+
+    if _partitioned(connection):
+        op.execute(ONE_PER_ORDER_FUNCTION)
+        op.execute(
+            "CREATE TRIGGER cash_collections_one_per_order BEFORE INSERT OR UPDATE OF order_id ON cash_collections "
+            "FOR EACH ROW EXECUTE FUNCTION cash_collections_one_per_order()"
+        )
+    else:
+        op.drop_index("ix_cash_collections_order_id", table_name="cash_collections")
+        op.create_index("ix_cash_collections_order_id", "cash_collections", ["order_id"], unique=True)
+
+
+def downgrade():
+    if _partitioned(op.get_bind()):
+        op.execute("DROP TRIGGER cash_collections_one_per_order ON cash_collections")
+        op.execute("DROP FUNCTION cash_collections_one_per_order()")
+    else:
+        op.drop_index("ix_cash_collections_order_id", table_name="cash_collections")
+        op.create_index("ix_cash_collections_order_id", "cash_collections", ["order_id"])
@@ -0,0 +1,35 @@
+"""Idempotency keys
+
+Stored responses per Idempotency-Key, shared by every worker when the
+idempotency store uses the database backend (idempotency.py). A row without
+status_code is the placeholder of the request in flight.
+
+Revision ID: 0020_idempotency_keys
+Revises: 0019_unique_cash_collections
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0020_idempotency_keys"
+down_revision = "0019_unique_cash_collections"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "idempotency_keys",
+        sa.Column("key", sa.String(64), primary_key=True),
+        sa.Column("fingerprint", sa.String(32), nullable=False),
+        sa.Column("status_code", sa.Integer(), nullable=True),
+        sa.Column("media_type", sa.String(), nullable=True),
+        sa.Column("body", sa.LargeBinary(), nullable=True),
+        sa.Column("compressed", sa.Boolean(), nullable=False),
+        sa.Column("expires_at", sa.Float(), nullable=False),
+    )
+    op.create_index("ix_idempotency_keys_expires_at", "idempotency_keys", ["expires_at"])
+
+
+def downgrade():
+    op.drop_table("idempotency_keys")
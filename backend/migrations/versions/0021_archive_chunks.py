@@ -0,0 +1,105 @@
+"""Archive chunks in the database
+
+The cold archive moves from gzip files on local disk, which a web service
+loses on every deploy, to archive_chunks: gzip-compressed JSON lines of up to
+CHUNK_SIZE rows per row (archive.py). archived_months loses its file path,
+file_bytes becomes stored_bytes, and deleted_at records when the rows left
+the hot tables (NULL while only the copy exists). Months already archived to
+files that are still on disk are loaded into chunks; the downgrade writes the
+chunks back out as files under ARCHIVE_DIR.
+
+Revision ID: 0021_archive_chunks
+Revises: 0020_idempotency_keys
+Create Date: 2026-10-19
+"""
+import gzip
+import logging
+import os
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0021_archive_chunks"
+down_revision = "0020_idempotency_keys"
+branch_labels = None
+depends_on = None
+
+CHUNK_SIZE = 5000
+# Where the file archive was written (the former ARCHIVE_DIR default)
+ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "archive")
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+
+def _file_chunks(path: str):
+    with gzip.open(path, "rt", encoding="utf-8") as archive:
+        lines = []
+        for line in archive:
+            lines.append(line)
+            if len(lines) >= CHUNK_SIZE:
+                yield lines
+                lines = []
+        if lines:
+            yield lines
+
+
+def upgrade():
+    chunks = op.create_table(
+        "archive_chunks",
+        sa.Column("table_name", sa.String(), primary_key=True),
+        sa.Column("month", sa.DateTime(), primary_key=True),
+        sa.Column("seq", sa.Integer(), primary_key=True),
+        sa.Column("row_count", sa.Integer(), nullable=False),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+    )
+
+    connection = op.get_bind()
+    months = sa.Table("archived_months", sa.MetaData(), autoload_with=connection)
+    for table_name, month, path in connection.execute(sa.select(months.c.table_name, months.c.month, months.c.path)).all():
+        if not os.path.exists(path):
+            logger.warning(f"Archive file of {table_name} {month:%Y-%m} is gone ({path}), its rows are lost")
+            continue
+        for seq, lines in enumerate(_file_chunks(path)):
+            connection.execute(chunks.insert().values(
+                table_name=table_name, month=month, seq=seq, row_count=len(lines), data=gzip.compress("".join(lines).encode("utf-8"))
+            ))
+
+    with op.batch_alter_table("archived_months") as batch:
+        batch.drop_column("path")
+        batch.alter_column("file_bytes", new_column_name="stored_bytes", existing_type=sa.BigInteger(), existing_nullable=False)
+        batch.add_column(sa.Column("deleted_at", sa.DateTime(), nullable=True))
+    # The file archive deleted the rows in the same transaction it wrote them
+    op.execute("UPDATE archived_months SET deleted_at = archived_at")
+
+
+def downgrade():
+    connection = op.get_bind()
+    metadata = sa.MetaData()
+    months = sa.Table("archived_months", metadata, autoload_with=connection)
+    chunks = sa.Table("archive_chunks", metadata, autoload_with=connection)
+    if connection.execute(sa.select(months.c.table_name).where(months.c.deleted_at.is_(None)).limit(1)).first():
+        raise RuntimeError("A month is half archived (copied, not yet deleted): finish or clear it before downgrading")
+
+    paths = {}
+    for table_name, month in connection.execute(sa.select(months.c.table_name, months.c.month)).all():
+        path = os.path.join(ARCHIVE_DIR, table_name, f"{month:%Y-%m}.jsonl.gz")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as archive:
+            for (data,) in connection.execute(sa.select(chunks.c.data).where(
+                chunks.c.table_name == table_name, chunks.c.month == month
+            ).order_by(chunks.c.seq)):
+                archive.write(data) # Concatenated gzip members read back as one stream
+        paths[(table_name, month)] = path
+
+    with op.batch_alter_table("archived_months") as batch:
+        batch.add_column(sa.Column("path", sa.String(), nullable=True))
+        batch.alter_column("stored_bytes", new_column_name="file_bytes", existing_type=sa.BigInteger(), existing_nullable=False)
+        batch.drop_column("deleted_at")
+    months = sa.Table("archived_months", sa.MetaData(), autoload_with=connection)
+    for (table_name, month), path in paths.items():
+        connection.execute(months.update().where(months.c.table_name == table_name, months.c.month == month).values(
+            path=path, file_bytes=os.path.getsize(path)
+        ))
+    with op.batch_alter_table("archived_months") as batch:
+        batch.alter_column("path", existing_type=sa.String(), nullable=False)
+    op.drop_table("archive_chunks")
@@ -0,0 +1,55 @@
+"""Order references without foreign keys, archived with their order
+
+driver_payouts, order_events, order_deadlines and cash_collections point at
+orders, which on PostgreSQL lost those foreign keys when it was partitioned
+(0015_monthly_partitions). They are dropped on the other dialects too, so the
+schema matches the models everywhere; a month's archive now takes the rows of
+its orders along instead. archived_months.newest_at records the latest
+created_at archived, which can fall after the month for rows of its orders.
+
+Revision ID: 0022_order_references
+Revises: 0021_archive_chunks
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+from partitions import add_months, is_partitioned
+
+revision = "0022_order_references"
+down_revision = "0021_archive_chunks"
+branch_labels = None
+depends_on = None
+
+ORDER_REFERENCES = ["driver_payouts", "order_events", "order_deadlines", "cash_collections"]
+# Names unnamed (SQLite) foreign keys so batch mode can drop them
+NAMING_CONVENTION = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+
+
+def upgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    for table in ORDER_REFERENCES:
+        names = [fk["name"] or f"fk_{table}_order_id_orders" for fk in inspector.get_foreign_keys(table) if fk["referred_table"] == "orders"]
+        if not names:
+            continue
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch:
+            for name in names:
+                batch.drop_constraint(name, type_="foreignkey")
+
+    op.add_column("archived_months", sa.Column("newest_at", sa.DateTime(), nullable=True))
+    # Archived so far by created_at only: nothing later than the month
+    months = sa.table("archived_months", sa.column("month", sa.DateTime()), sa.column("newest_at", sa.DateTime()))
+    for (month,) in connection.execute(sa.select(months.c.month).distinct()).all():
+        connection.execute(months.update().where(months.c.month == month).values(newest_at=add_months(month, 1)))
+
+
+def downgrade():
+    with op.batch_alter_table("archived_months") as batch:
+        batch.drop_column("newest_at")
+    connection = op.get_bind()
+    if connection.dialect.name == "postgresql" and is_partitioned(connection, "orders"):
+        return # Partitioned orders take no foreign keys, 0015_monthly_partitions' downgrade restores them
+    for table in ORDER_REFERENCES:
+        with op.batch_alter_table(table) as batch:
+            batch.create_foreign_key(f"fk_{table}_order_id_orders", "orders", ["order_id"], ["id"])
@@ -0,0 +1,57 @@
+"""Money as integer centavos.
+
+Every amount column is a ``Cents`` column: BIGINT centavos in the database,
+pesos (float) in Python. The conversion happens once, when values are bound
+or read, so the API models and endpoints keep speaking pesos while the
+database stores, sums, compares and indexes exact integers. SUM() over a
+``Cents`` column is also converted back, once, on the aggregated total.
+
+Code that does its own arithmetic on amounts (financials, ledger, settlement,
+projections) converts with ``to_cents`` first and works on integers.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+from sqlalchemy import BigInteger
+from sqlalchemy.types import TypeDecorator
+
+CENTS_PER_PESO = 100
+
+
+def to_cents(amount) -> int:
+    """Pesos (float, str, Decimal or int) -> integer centavos, half-up like a cashier"""
+    if amount is None:
+        return None
+    # str() gives the shortest repr, so 19.99 is exactly 1999 and not 1998.999...
+    return int((Decimal(str(amount)) * CENTS_PER_PESO).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents) -> float:
+    """Integer centavos -> pesos"""
+    if cents is None:
+        return None
+    return float(cents) / CENTS_PER_PESO
+
+
+def cents_array(amounts):
+    """Array of pesos -> int64 array of centavos, half-up like to_cents"""
+    # Rounded to 6 decimals first so float noise (1.005 * 100 is 100.4999...) can't flip a half centavo
+    scaled = np.round(np.asarray(amounts, dtype=np.float64) * CENTS_PER_PESO, 6)
+    return np.floor(scaled + 0.5).astype(np.int64)
+
+
+def pesos_array(cents):
+    return np.asarray(cents, dtype=np.int64) / CENTS_PER_PESO
+
+
+class Cents(TypeDecorator):
+    """BIGINT centavos column exposed to Python as pesos"""
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return to_cents(value)
+
+    def process_result_value(self, value, dialect):
+        return from_cents(value)
+
@@ -0,0 +1,108 @@
+"""In-process index of open orders (pending, no driver) for polling drivers.
+
+Drivers poll ``GET /orders`` constantly and all of them see the same list,
+so each worker keeps that list in memory, with its JSON body pre-encoded.
+Writes that can open or close an order send ``NOTIFY open_orders, '<ids>'``
+inside their transaction. Postgres delivers it to every worker only once the
+transaction commits, and each worker re-reads just those orders. A periodic
+full reload bounds staleness if a notification is ever missed (listener
+reconnect, or databases without LISTEN/NOTIFY such as SQLite).
+"""
+import logging
+import select
+import threading
+import time
+
+from sqlalchemy import func, select as sql_select
+
+from serialization import rows_to_json
+
+logger = logging.getLogger(__name__)
+
+OPEN_ORDERS_CHANNEL = "open_orders"
+NOTIFY_IDS_PER_MESSAGE = 200 # NOTIFY payloads are limited to 8000 bytes
+
+
+class OpenOrderIndex:
+    """order_id -> response row for every open order, plus the encoded list"""
+
+    def __init__(self):
+        self._orders = {}
+        self._body = None
+        self.loaded = False
+        self.version = 0
+        self.loaded_at = None # monotonic time of the last full reload
+
+    def __len__(self):
+        return len(self._orders)
+
+    def load(self, rows):
+        """Replace the whole index (startup and periodic reloads)"""
+        self._orders = {row["id"]: row for row in rows}
+        self._changed()
+        self.loaded = True
+        self.loaded_at = time.monotonic()
+
+    def apply(self, order_ids, rows):
+        """Refresh some orders: rows are the ones still open, the other ids are removed"""
+        fresh = {row["id"]: row for row in rows}
+        for order_id in order_ids:
+            if order_id in fresh:
+                self._orders[order_id] = fresh[order_id]
+            else:
+                self._orders.pop(order_id, None)
+        self._changed()
+
+    def _changed(self):
+        self._body = None
+        self.version += 1
+
+    def body(self) -> bytes:
+        """JSON list of open orders, newest first, encoded once per change"""
+        if self._body is None:
+            rows = sorted(self._orders.values(), key=lambda row: row["created_at"], reverse=True)
+            self._body = rows_to_json(rows)
+        return self._body
+
+
+def notify_statements(order_ids):
+    """pg_notify selects announcing the given orders, to run inside the writing transaction"""
+    order_ids = list(order_ids)
+    for start in range(0, len(order_ids), NOTIFY_IDS_PER_MESSAGE):
+        payload = ",".join(order_ids[start:start + NOTIFY_IDS_PER_MESSAGE])
+        yield sql_select(func.pg_notify(OPEN_ORDERS_CHANNEL, payload))
+
+
+def start_listener(engine, on_ids, on_reconnect, stop_event: threading.Event, poll_timeout: float = 5.0, retry_seconds: float = 5.0):
+    """LISTEN on a dedicated connection in a daemon thread, calling on_ids(list_of_ids) per notification
+
+    on_reconnect() is called after every (re)connect, so the caller can reload everything it may have missed.
+    """
+    def run():
+        while not stop_event.is_set():
+            raw = None
+            try:
+                raw = engine.raw_connection()
+                raw.detach() # Never hand this connection back to the pool
+                connection = raw.driver_connection
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {OPEN_ORDERS_CHANNEL}")
+                on_reconnect()
+                while not stop_event.is_set():
+                    if select.select([connection], [], [], poll_timeout) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        payload = connection.notifies.pop(0).payload
+                        on_ids([order_id for order_id in payload.split(",") if order_id])
+            except Exception as e:
+                logger.error(f"❌ Open order listener error: {e}")
+                stop_event.wait(retry_seconds)
+            finally:
+                if raw is not None:
+                    raw.close()
+
+    thread = threading.Thread(target=run, name="open-orders-listener", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,89 @@
+"""Order state machine.
+
+Single place that decides which status changes an order may go through, who
+may make them and what each one does to the order row. Every successful
+transition returns an event dict that server.py appends to ``order_events``;
+projections (driver earnings, rollups, the real-time feed) read those events
+instead of rescanning orders.
+
+Statuses and roles are compared by value, so the ``str`` enums from server.py
+(``OrderStatus``, ``UserType``) can be passed in directly.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+PENDING = "pending"
+ACCEPTED = "accepted"
+IN_PROGRESS = "in_progress"
+DELIVERED = "delivered"
+CANCELLED = "cancelled"
+
+ADMIN = "admin"
+DRIVER = "driver"
+CLIENT = "client"
+
+# Event types stored in order_events.event_type
+EVENT_CREATED = "created"
+EVENT_STATUS_CHANGED = "status_changed"
+EVENT_PAYMENT_COMPLETED = "payment_completed"
+EVENT_REBROADCAST = "rebroadcast" # Unaccepted order offered to drivers again by the scheduler
+EVENT_SCHEDULED = "scheduled" # Created with a future pickup, held out of the open pool
+EVENT_RELEASED = "released" # Scheduled order opened to drivers ahead of pickup
+
+# roles: who may trigger it, guard: extra check on the order, timestamp: column stamped on success
+Transition = namedtuple("Transition", ["roles", "guard", "timestamp"])
+
+
+def _has_driver(order):
+    return order.driver_id is not None
+
+
+TRANSITIONS = {
+    (PENDING, ACCEPTED): Transition({DRIVER, ADMIN}, _has_driver, "accepted_at"),
+    (PENDING, CANCELLED): Transition({ADMIN}, None, None),
+    (ACCEPTED, IN_PROGRESS): Transition({DRIVER, ADMIN}, _has_driver, None),
+    (ACCEPTED, CANCELLED): Transition({ADMIN}, None, None),
+    (IN_PROGRESS, DELIVERED): Transition({DRIVER, ADMIN}, _has_driver, "delivered_at"),
+    (IN_PROGRESS, CANCELLED): Transition({ADMIN}, None, None),
+}
+
+
+class InvalidTransition(Exception):
+    """Raised when a status change is not allowed by the transition table"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def allowed_transitions(from_status):
+    """Statuses reachable from the given status"""
+    return [to_status for (source, to_status) in TRANSITIONS if source == from_status]
+
+
+def apply_transition(order, to_status, role, now: datetime = None):
+    """Validate and apply a status change to an order row, returns the event to record"""
+    from_status = order.status
+    transition = TRANSITIONS.get((_value(from_status), _value(to_status)))
+    if transition is None:
+        raise InvalidTransition(f"Cannot change order from '{_value(from_status)}' to '{_value(to_status)}'")
+    if _value(role) not in transition.roles:
+        raise InvalidTransition(f"Role '{_value(role)}' cannot change order to '{_value(to_status)}'", status_code=403)
+    if transition.guard and not transition.guard(order):
+        raise InvalidTransition(f"Order does not meet the conditions to change to '{_value(to_status)}'")
+
+    now = now or datetime.utcnow()
+    order.status = to_status
+    if transition.timestamp:
+        setattr(order, transition.timestamp, now)
+
+    return {
+        "event_type": EVENT_STATUS_CHANGED,
+        "from_status": _value(from_status),
+        "to_status": _value(to_status),
+        "created_at": now,
+    }
+
+
+def _value(status):
+    return getattr(status, "value", status)
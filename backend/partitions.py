@@ -0,0 +1,201 @@
+"""Monthly range partitions on created_at (PostgreSQL).
+
+``orders``, ``payment_transactions`` and ``cash_collections`` only grow, and
+every listing, stat and export scans them. Partitioned by month of
+``created_at``, queries with a created_at range only touch the months in the
+range (partition pruning), "newest N" listings read the newest partition
+first, and a settled month leaves the table with a single ``DROP TABLE`` of
+its partition instead of a DELETE (see archive.py).
+
+PostgreSQL requires the partition key in every unique constraint, so the
+primary key of a partitioned table becomes ``(id, created_at)`` and foreign
+keys *referencing* it (e.g. driver_payouts.order_id -> orders.id) are
+dropped; the models declare none, the application keeps enforcing them, and
+a month's archive takes the rows of its orders along (see archive.py).
+Foreign keys *from* the table to users are kept.
+
+Other dialects keep plain tables: ``partition_tables`` only logs a warning.
+``unpartition_tables`` converts back (the 0015_monthly_partitions downgrade).
+"""
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import AddConstraint, CreateIndex
+
+PARTITION_KEY = "created_at"
+
+
+def month_start(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, 1)
+
+
+def add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def months_between(first: datetime, last: datetime):
+    """Month starts from first's month to last's month, inclusive"""
+    month, last = month_start(first), month_start(last)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def partition_name(table_name: str, month: datetime) -> str:
+    return f"{table_name}_{month:%Y_%m}"
+
+
+def is_partitioned(connection, table_name: str) -> bool:
+    return connection.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :name AND pg_table_is_visible(c.oid))"
+    ), {"name": table_name}).scalar()
+
+
+def list_partitions(connection, table_name: str):
+    """Names of the partitions attached to table_name"""
+    return connection.execute(text(
+        "SELECT child.relname FROM pg_inherits i "
+        "JOIN pg_class parent ON parent.oid = i.inhparent JOIN pg_class child ON child.oid = i.inhrelid "
+        "WHERE parent.relname = :name AND pg_table_is_visible(parent.oid) ORDER BY child.relname"
+    ), {"name": table_name}).scalars().all()
+
+
+def ensure_partitions(connection, table_name: str, first: datetime, last: datetime):
+    """Create the monthly partitions covering [first, last] that do not exist yet, returns the ones created"""
+    existing = set(list_partitions(connection, table_name))
+    created = []
+    for month in months_between(first, last):
+        name = partition_name(table_name, month)
+        if name in existing:
+            continue
+        connection.execute(text(
+            f"CREATE TABLE {name} PARTITION OF {table_name} "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+        ))
+        created.append(name)
+    return created
+
+
+def _partition_table(connection, table, partitioned_names, months_ahead: int, now: datetime):
+    name, staging = table.name, f"{table.name}_partitioned"
+    first = connection.execute(text(f"SELECT min({PARTITION_KEY}) FROM {name}")).scalar() or now
+
+    connection.execute(text(
+        f"CREATE TABLE {staging} (LIKE {name} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY RANGE ({PARTITION_KEY})"
+    ))
+    connection.execute(text(f"ALTER TABLE {staging} ADD CONSTRAINT {name}_pk PRIMARY KEY (id, {PARTITION_KEY})"))
+    ensure_partitions(connection, staging, first, add_months(month_start(now), months_ahead))
+    # Catches rows outside the managed months instead of failing the insert
+    connection.execute(text(f"CREATE TABLE {name}_default PARTITION OF {staging} DEFAULT"))
+    rows = connection.execute(text(f"INSERT INTO {staging} SELECT * FROM {name}")).rowcount
+    connection.execute(text(f"DROP TABLE {name} CASCADE"))
+    connection.execute(text(f"ALTER TABLE {staging} RENAME TO {name}"))
+    for partition in list_partitions(connection, name):
+        if partition.startswith(staging):
+            connection.execute(text(f"ALTER TABLE {partition} RENAME TO {name}{partition[len(staging):]}"))
+    for constraint in table.foreign_key_constraints:
+        if constraint.referred_table.name not in partitioned_names:
+            connection.execute(AddConstraint(constraint))
+    # Dropped with the old table; created on the parent, PostgreSQL cascades them to every partition
+    for index in table.indexes:
+        connection.execute(CreateIndex(index))
+    return rows
+
+
+def partition_tables(connection, tables, months_ahead: int = 3, logger=None):
+    """Convert plain tables to monthly partitioned tables, once; returns {table: rows moved}
+
+    Runs in the caller's transaction. tables are the tables as they are in
+    the database (reflected): their foreign keys and indexes are recreated on
+    the partitioned table, their primary key becomes (id, created_at).
+    """
+    if connection.dialect.name != "postgresql":
+        if logger:
+            logger.warning(f"⚠️ Monthly partitioning needs PostgreSQL, {', '.join(t.name for t in tables)} stay plain {connection.dialect.name} tables")
+        return {}
+    pending = [table for table in tables if not is_partitioned(connection, table.name)]
+    if not pending:
+        return {}
+
+    now = datetime.utcnow()
+    partitioned_names = {table.name for table in tables}
+    moved = {}
+    inspector = inspect(connection)
+    # Foreign keys pointing at a partitioned table cannot be kept (its only unique key includes created_at)
+    for table_name in inspector.get_table_names():
+        for foreign_key in inspector.get_foreign_keys(table_name):
+            if foreign_key["referred_table"] in partitioned_names and foreign_key["name"]:
+                connection.execute(text(f'ALTER TABLE {table_name} DROP CONSTRAINT "{foreign_key["name"]}"'))
+    for table in pending:
+        moved[table.name] = _partition_table(connection, table, partitioned_names, months_ahead, now)
+    if logger:
+        logger.info(f"🗂️ Partitioned by month: {', '.join(f'{name} ({rows} rows)' for name, rows in moved.items())}")
+    return moved
+
+
+def _unpartition_table(connection, table):
+    name, staging = table.name, f"{table.name}_plain"
+    connection.execute(text(f"CREATE TABLE {staging} (LIKE {name} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    connection.execute(text(f"ALTER TABLE {staging} ADD CONSTRAINT {name}_pkey PRIMARY KEY (id)"))
+    rows = connection.execute(text(f"INSERT INTO {staging} SELECT * FROM {name}")).rowcount
+    connection.execute(text(f"DROP TABLE {name} CASCADE")) # Every partition, the default one included
+    connection.execute(text(f"ALTER TABLE {staging} RENAME TO {name}"))
+    for constraint in table.foreign_key_constraints:
+        connection.execute(AddConstraint(constraint))
+    for index in table.indexes:
+        connection.execute(CreateIndex(index))
+    return rows
+
+
+def unpartition_tables(connection, tables, foreign_keys=(), logger=None):
+    """Convert monthly partitioned tables back to plain tables, the reverse of partition_tables; returns {table: rows moved}
+
+    Runs in the caller's transaction. tables are the partitioned tables as
+    they are in the database (reflected): their foreign keys and indexes are
+    recreated, their primary key becomes (id) again. foreign_keys are the
+    (table, column, referred table) foreign keys partition_tables dropped;
+    those referring to a converted table are added back, refused while a row
+    points at a missing one.
+    """
+    if connection.dialect.name != "postgresql":
+        return {}
+    pending = [table for table in tables if is_partitioned(connection, table.name)]
+    moved = {table.name: _unpartition_table(connection, table) for table in pending}
+    for table_name, column, referred in foreign_keys:
+        if referred not in moved:
+            continue
+        missing = connection.execute(text(
+            f"SELECT count(*) FROM {table_name} t WHERE NOT EXISTS (SELECT 1 FROM {referred} r WHERE r.id = t.{column})"
+        )).scalar()
+        if missing:
+            raise RuntimeError(f"{missing} {table_name} rows point at {referred} rows that are gone, remove them first")
+        connection.execute(text(
+            f"ALTER TABLE {table_name} ADD CONSTRAINT {table_name}_{column}_fkey FOREIGN KEY ({column}) REFERENCES {referred} (id)"
+        ))
+    if logger and moved:
+        logger.info(f"🗂️ Back to plain tables: {', '.join(f'{name} ({rows} rows)' for name, rows in moved.items())}")
+    return moved
+
+
+def maintain_partitions(bind, tables, months_ahead: int = 3):
+    """Keep partitions created months_ahead in advance, so new rows never land in the default partition"""
+    if bind.dialect.name != "postgresql":
+        return []
+    now = datetime.utcnow()
+    created = []
+    with bind.begin() as connection:
+        for table in tables:
+            if is_partitioned(connection, table.name):
+                created += ensure_partitions(connection, table.name, now, add_months(month_start(now), months_ahead))
+    return created
+
+
+def drop_partition(connection, table_name: str, month: datetime) -> bool:
+    """Drop one month's partition (PostgreSQL); False if the table is not partitioned or the partition is gone"""
+    name = partition_name(table_name, month)
+    if name not in list_partitions(connection, table_name):
+        return False
+    connection.execute(text(f"DROP TABLE {name}"))
+    return True
@@ -0,0 +1,170 @@
+"""Token-bucket rate limiting for auth and verification endpoints.
+
+Runs as HTTP middleware, so a throttled request is answered with 429 before
+the endpoint does any password hashing or database lookup. Each route has a
+bucket per client IP and one per user (email / user id from the body, or the
+bearer token), and a request must get a token from every bucket that applies.
+
+Two backends:
+- ``InMemoryBuckets``: per process, no I/O.
+- ``DatabaseBuckets``: one atomic upsert per bucket on a shared table, so all
+  workers see the same counts. The table model comes from server.py.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import re
+import time
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import case
+from starlette.responses import JSONResponse
+
+# capacity: burst size, refill_per_second: sustained rate
+Limit = namedtuple("Limit", ["capacity", "refill_per_second"])
+
+# path: regex matched against the request path
+# per_ip / per_user: Limit or None, user_field: JSON body field identifying the user (else the bearer token)
+RateLimitRule = namedtuple("RateLimitRule", ["path", "per_ip", "per_user", "user_field"])
+
+
+class InMemoryBuckets:
+    """Buckets held in this process, idle ones are pruned as new keys come in"""
+
+    def __init__(self, max_keys: int = 100_000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict() # key -> (tokens, updated_at, full_at), least recently used first
+
+    def take(self, key: str, limit: Limit):
+        """Try to take one token, returns seconds to wait (0 when allowed)"""
+        now = self.clock()
+        tokens, updated_at, _ = self._buckets.pop(key, (limit.capacity, now, now))
+        tokens = min(limit.capacity, tokens + (now - updated_at) * limit.refill_per_second)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        # Each bucket keeps its own refill horizon: rules with different limits share this store
+        self._buckets[key] = (tokens, now, now + (limit.capacity - tokens) / limit.refill_per_second)
+        self._prune(now)
+        return 0 if allowed else (1 - tokens) / limit.refill_per_second
+
+    def _prune(self, now: float):
+        # A bucket untouched long enough to be full again is the same as no bucket
+        while self._buckets:
+            key, (_, _, full_at) = next(iter(self._buckets.items()))
+            if len(self._buckets) <= self.max_keys and now < full_at:
+                break
+            del self._buckets[key]
+
+
+class DatabaseBuckets:
+    """Buckets in a shared table (key, tokens, updated_at), updated with one upsert per take"""
+
+    def __init__(self, session_factory, bucket_model, clock=time.time):
+        self.session_factory = session_factory
+        self.model = bucket_model
+        self.clock = clock
+
+    def _insert(self, dialect: str):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        return insert
+
+    def take(self, key: str, limit: Limit):
+        """Try to take one token, returns seconds to wait (0 when allowed)"""
+        now = self.clock()
+        model = self.model
+        db = self.session_factory()
+        try:
+            insert = self._insert(db.get_bind().dialect.name)
+            refilled = model.tokens + (now - model.updated_at) * limit.refill_per_second
+            refilled = case((refilled > limit.capacity, limit.capacity), else_=refilled)
+            # Refill and take in the same statement, the WHERE keeps an empty bucket untouched
+            statement = insert(model).values(key=key, tokens=limit.capacity - 1, updated_at=now)
+            statement = statement.on_conflict_do_update(
+                index_elements=[model.key],
+                set_={"tokens": refilled - 1, "updated_at": now},
+                where=refilled >= 1,
+            ).returning(model.tokens)
+            allowed = db.execute(statement).first() is not None
+            db.commit()
+            if allowed:
+                return 0
+            tokens, updated_at = db.query(model.tokens, model.updated_at).filter(model.key == key).one()
+            tokens = min(limit.capacity, tokens + (now - updated_at) * limit.refill_per_second)
+            return max(0.0, (1 - tokens) / limit.refill_per_second)
+        finally:
+            db.close()
+
+
+def _client_ip(request, trusted_proxies: int = 1):
+    """Address the nearest untrusted hop connected from
+
+    Each proxy appends the address it was connected from to X-Forwarded-For,
+    so only the last ``trusted_proxies`` hops were written by our proxies;
+    anything before them is whatever the client sent.
+    """
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded and trusted_proxies > 0:
+        hops = [hop.strip() for hop in forwarded.split(",")]
+        if len(hops) >= trusted_proxies and hops[-trusted_proxies]:
+            return hops[-trusted_proxies]
+    return request.client.host if request.client else "unknown"
+
+
+async def _user_identity(request, rule: RateLimitRule):
+    if rule.user_field:
+        try:
+            value = json.loads(await request.body() or b"{}").get(rule.user_field)
+        except (ValueError, AttributeError):
+            value = None
+        return str(value).strip().lower() if value else None
+    authorization = request.headers.get("authorization")
+    return hashlib.sha256(authorization.encode("utf-8")).hexdigest()[:32] if authorization else None
+
+
+def rate_limit_middleware(backend, rules, blocking: bool = False, trusted_proxies: int = 1):
+    """HTTP middleware applying the first matching rule to POST requests
+
+    blocking=True runs backend.take in a worker thread (for DatabaseBuckets).
+    trusted_proxies: proxies in front of the app that append to
+    X-Forwarded-For (0 when the app is reached directly).
+    """
+    compiled = [(re.compile(rule.path), rule) for rule in rules]
+
+    async def take(key, limit):
+        if blocking:
+            return await asyncio.to_thread(backend.take, key, limit)
+        return backend.take(key, limit)
+
+    async def middleware(request, call_next):
+        if request.method != "POST":
+            return await call_next(request)
+        path = request.url.path
+        rule = next((rule for pattern, rule in compiled if pattern.fullmatch(path)), None)
+        if rule is None:
+            return await call_next(request)
+
+        checks = []
+        if rule.per_ip:
+            checks.append((f"ip:{_client_ip(request, trusted_proxies)}:{path}", rule.per_ip))
+        if rule.per_user:
+            user = await _user_identity(request, rule)
+            if user:
+                checks.append((f"user:{user}:{path}", rule.per_user))
+
+        for key, limit in checks:
+            wait = await take(key, limit)
+            if wait > 0:
+                return JSONResponse(
+                    status_code=429,
+                    content={"detail": "Too many attempts, please try again later"},
+                    headers={"Retry-After": str(math.ceil(wait))},
+                )
+        return await call_next(request)
+
+    return middleware
@@ -0,0 +1,176 @@
+"""Distance / ETA service for distance-based order quotes.
+
+``RouteService`` resolves a (pickup, delivery) address pair to a route
+distance and duration. Results are cached at two levels:
+
+- an in-process LRU with TTL keyed by the normalized address pair, and
+- two small tables (geocodes, routes) so a restart or another worker reuses
+  earlier work instead of geocoding again.
+
+The geocoder is pluggable. ``LocalGeocoder`` is a deterministic stand-in
+(same address -> same point inside the service area) that needs no network,
+so quotes can be exercised locally and in benchmarks. Route distance is
+estimated from the great-circle distance with a road factor until a routing
+provider is configured.
+
+Like the other modules, the cache models come from server.py.
+"""
+import hashlib
+import re
+import time
+import unicodedata
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from locations import haversine_km
+
+Route = namedtuple("Route", ["distance_km", "duration_minutes", "pickup", "delivery", "cached"])
+
+# Greater Mexico City, where LocalGeocoder places every address
+SERVICE_AREA = (19.20, 19.60, -99.35, -98.95)  # lat_min, lat_max, lng_min, lng_max
+
+
+def normalize_address(address: str) -> str:
+    """Case, accent and whitespace insensitive form used as the cache key"""
+    text = unicodedata.normalize("NFKD", address).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9#]+", " ", text.lower()).strip()
+
+
+def _key(*parts: str) -> str:
+    return hashlib.sha1("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+class LocalGeocoder:
+    """Deterministic geocoder stand-in: hashes the normalized address to a point in the service area"""
+
+    def __init__(self, area=SERVICE_AREA):
+        self.area = area
+
+    def geocode(self, address: str):
+        digest = hashlib.sha256(normalize_address(address).encode("utf-8")).digest()
+        lat_min, lat_max, lng_min, lng_max = self.area
+        lat = lat_min + (int.from_bytes(digest[:8], "big") / 2 ** 64) * (lat_max - lat_min)
+        lng = lng_min + (int.from_bytes(digest[8:16], "big") / 2 ** 64) * (lng_max - lng_min)
+        return round(lat, 6), round(lng, 6)
+
+
+class TTLCache:
+    """LRU cache whose entries also expire after ttl_seconds"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= self.clock():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, value):
+        self._entries[key] = (self.clock() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class RouteService:
+    """Address pair -> Route, through memory, then the DB tables, then the geocoder"""
+
+    def __init__(self, geocoder, geocode_model, route_model, ttl_seconds: float = 7 * 86400,
+                 max_entries: int = 50_000, road_factor: float = 1.35, average_speed_kmh: float = 22.0):
+        self.geocoder = geocoder
+        self.geocode_model = geocode_model
+        self.route_model = route_model
+        self.ttl_seconds = ttl_seconds
+        self.road_factor = road_factor
+        self.average_speed_kmh = average_speed_kmh
+        self.routes = TTLCache(max_entries, ttl_seconds)
+        self.points = TTLCache(max_entries, ttl_seconds)
+
+    def route(self, db, pickup_address: str, delivery_address: str) -> Route:
+        """Distance and ETA between two addresses; new results are added to the caller's transaction"""
+        pickup_key, delivery_key = normalize_address(pickup_address), normalize_address(delivery_address)
+        route_key = _key(pickup_key, delivery_key)
+
+        cached = self.routes.get(route_key)
+        if cached is not None:
+            return cached._replace(cached=True)
+
+        fresh_after = datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+        row = db.query(self.route_model).filter(
+            self.route_model.key == route_key, self.route_model.created_at >= fresh_after
+        ).first()
+        if row is not None:
+            route = Route(row.distance_km, row.duration_minutes, (row.pickup_lat, row.pickup_lng), (row.delivery_lat, row.delivery_lng), True)
+            self.routes.put(route_key, route)
+            return route
+
+        pickup = self._point(db, pickup_key, pickup_address)
+        delivery = self._point(db, delivery_key, delivery_address)
+        distance_km = round(haversine_km(*pickup, *delivery) * self.road_factor, 2)
+        duration_minutes = round(distance_km / self.average_speed_kmh * 60, 1)
+        route = Route(distance_km, duration_minutes, pickup, delivery, False)
+
+        self._save(db, self.route_model, {
+            "key": route_key,
+            "distance_km": distance_km,
+            "duration_minutes": duration_minutes,
+            "pickup_lat": pickup[0],
+            "pickup_lng": pickup[1],
+            "delivery_lat": delivery[0],
+            "delivery_lng": delivery[1],
+            "created_at": datetime.utcnow(),
+        })
+        self.routes.put(route_key, route)
+        return route
+
+    def _point(self, db, address_key: str, address: str):
+        point = self.points.get(address_key)
+        if point is not None:
+            return point
+        row = db.query(self.geocode_model).filter(self.geocode_model.key == _key(address_key)).first()
+        if row is not None:
+            point = (row.lat, row.lng)
+        else:
+            point = self.geocoder.geocode(address)
+            self._save(db, self.geocode_model, {
+                "key": _key(address_key),
+                "address": address_key,
+                "lat": point[0],
+                "lng": point[1],
+                "created_at": datetime.utcnow(),
+            })
+        self.points.put(address_key, point)
+        return point
+
+    def _save(self, db, model, values):
+        # Savepoint: a concurrent quote may have stored the same key first
+        try:
+            with db.begin_nested():
+                db.execute(insert(model).values(**values))
+        except IntegrityError:
+            if model is self.route_model:
+                # Stale route row past its TTL: replace it
+                db.query(model).filter(model.key == values["key"]).update(values, synchronize_session=False)
+
+
+def quote_price(route: Route, base_fare: float, per_km: float, per_minute: float, minimum: float, maximum: float) -> float:
+    """Distance/time based price, clamped to the allowed order value range"""
+    price = base_fare + per_km * route.distance_km + per_minute * route.duration_minutes
+    return round(min(max(price, minimum), maximum), 2)
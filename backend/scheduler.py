@@ -0,0 +1,168 @@
+"""Deadline scheduler: a hierarchical timer wheel over a persisted due-time index.
+
+``TimerWheel`` keeps timers in ``levels`` wheels of ``slots`` buckets each
+(1 s, 64 s, ~68 min, ~3 days per bucket with the defaults). Scheduling and
+cancelling are dict operations, and each tick only looks at one bucket per
+level, so the cost per tick does not grow with the number of timers; a timer
+is moved down a level at most ``levels - 1`` times before it fires.
+
+``DeadlineIndex`` makes the deadlines durable. A table (key, due_at,
+attempts) with an index on due_at is the source of truth; each worker reads
+it in windows of ``horizon_seconds`` and mirrors only the near deadlines in
+its wheel, so a restart just reloads them. A fired deadline is claimed by
+deleting its row, so with several workers each one is handled once.
+
+Like the other modules, the deadline model comes from server.py.
+"""
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, insert, or_, select
+
+
+def _timestamp(moment: datetime) -> float:
+    # Deadlines are stored as naive UTC datetimes, like every other column
+    return moment.replace(tzinfo=timezone.utc).timestamp()
+
+
+class TimerWheel:
+    """Hierarchical timing wheel keyed by an id; a timer fires once, at or up to one tick after its due time"""
+
+    def __init__(self, tick_seconds: float = 1.0, slots: int = 64, levels: int = 4, now: float = None):
+        self.tick_seconds = tick_seconds
+        self.slots = slots
+        self.levels = levels
+        self._wheels = [[{} for _ in range(slots)] for _ in range(levels)] # key -> (due_tick, payload)
+        self._where = {} # key -> (level, slot)
+        self.current = math.floor((time.time() if now is None else now) / tick_seconds)
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, key):
+        return key in self._where
+
+    def schedule(self, key, due: float, payload=None):
+        """Add or move the timer for key (due is a unix timestamp)"""
+        self.cancel(key)
+        self._place(key, max(math.ceil(due / self.tick_seconds), self.current + 1), payload)
+
+    def cancel(self, key) -> bool:
+        where = self._where.pop(key, None)
+        if where is None:
+            return False
+        level, slot = where
+        del self._wheels[level][slot][key]
+        return True
+
+    def _place(self, key, due_tick: int, payload):
+        delta = due_tick - self.current
+        level = 0
+        while level < self.levels - 1 and delta >= self.slots ** (level + 1):
+            level += 1
+        slot = (due_tick // self.slots ** level) % self.slots
+        self._wheels[level][slot][key] = (due_tick, payload)
+        self._where[key] = (level, slot)
+
+    def advance(self, now: float):
+        """Move the wheel up to now, returns [(key, payload)] of the timers that became due"""
+        target = math.floor(now / self.tick_seconds)
+        fired = []
+        while self.current < target:
+            self.current += 1
+            tick = self.current
+            # Bring down the buckets that start at this tick, highest level first
+            for level in range(self.levels - 1, 0, -1):
+                span = self.slots ** level
+                if tick % span == 0:
+                    self._cascade(level, (tick // span) % self.slots)
+            slot = tick % self.slots
+            entries = self._wheels[0][slot]
+            if entries:
+                self._wheels[0][slot] = {}
+                for key, (_, payload) in entries.items():
+                    del self._where[key]
+                    fired.append((key, payload))
+        return fired
+
+    def _cascade(self, level: int, slot: int):
+        entries = self._wheels[level][slot]
+        if entries:
+            self._wheels[level][slot] = {}
+            for key, (due_tick, payload) in entries.items():
+                self._place(key, due_tick, payload)
+
+
+class DeadlineIndex:
+    """Deadlines persisted in a table, with the ones due within horizon_seconds mirrored in a TimerWheel
+
+    The model needs a unique key column plus due_at (indexed) and attempts.
+    add/remove run in the caller's transaction; refill/claim take their own session.
+    """
+
+    def __init__(self, model, key: str, horizon_seconds: float = 300.0, tick_seconds: float = 1.0, overdue_seconds: float = 60.0):
+        self.model = model
+        self.key_column = getattr(model, key)
+        self.horizon_seconds = horizon_seconds
+        self.overdue_seconds = overdue_seconds # Rows this late were missed (failed or crashed run) and are reloaded
+        self.wheel = TimerWheel(tick_seconds)
+        self.loaded_until = None # Every deadline before this is in the wheel (or already handled)
+        self._lock = threading.Lock() # The wheel is shared between the event loop and worker threads
+
+    def __len__(self):
+        return len(self.wheel)
+
+    def add(self, db, rows):
+        """Insert deadline rows ({key, due_at, attempts}) and track the near ones"""
+        if not rows:
+            return
+        db.execute(insert(self.model), rows)
+        with self._lock:
+            if self.loaded_until is None:
+                return
+            for row in rows:
+                if row["due_at"] < self.loaded_until:
+                    self.wheel.schedule(row[self.key_column.key], _timestamp(row["due_at"]))
+
+    def remove(self, db, keys):
+        """Drop the deadlines of keys (e.g. the order was accepted)"""
+        keys = list(keys)
+        db.execute(delete(self.model).where(self.key_column.in_(keys)))
+        with self._lock:
+            for key in keys:
+                self.wheel.cancel(key)
+
+    def refill(self, db, now: datetime = None):
+        """Load the next window of deadlines (plus overdue leftovers) into the wheel, returns how many were loaded"""
+        now = now or datetime.utcnow()
+        until = now + timedelta(seconds=self.horizon_seconds)
+        with self._lock:
+            start, self.loaded_until = self.loaded_until, until # Set first: rows added meanwhile track themselves
+        statement = select(self.key_column, self.model.due_at).where(self.model.due_at < until)
+        if start is not None:
+            statement = statement.where(or_(
+                self.model.due_at >= start,
+                self.model.due_at < now - timedelta(seconds=self.overdue_seconds),
+            ))
+        rows = db.execute(statement).all()
+        with self._lock:
+            for key, due_at in rows:
+                self.wheel.schedule(key, _timestamp(due_at))
+        return len(rows)
+
+    def due(self, now: float = None):
+        """Keys whose timers fired since the last call"""
+        with self._lock:
+            return [key for key, _ in self.wheel.advance(time.time() if now is None else now)]
+
+    def claim(self, db, keys, now: datetime = None):
+        """Delete the rows of keys that are really due, returns {key: attempts} for the ones this caller won"""
+        now = now or datetime.utcnow()
+        result = db.execute(
+            delete(self.model)
+            .where(self.key_column.in_(list(keys)), self.model.due_at <= now)
+            .returning(self.key_column, self.model.attempts)
+        )
+        return {key: attempts for key, attempts in result}
@@ -0,0 +1,176 @@
+"""Ranked admin search over orders and users.
+
+PostgreSQL: orders get ``search_vector``, a stored generated tsvector of the
+title (weight A), description (B) and both addresses (C) with Spanish
+stemming, under a GIN index. Users get pg_trgm GIN indexes on name, email
+and phone, so substring matches (part of an email, a phone fragment) use an
+index too.
+
+SQLite (local testing): FTS5 tables kept in sync by triggers, ``orders_fts``
+ranked with bm25 using the same column weights, and ``users_fts`` with the
+trigram tokenizer.
+
+Both are created by the search_indexes migration. Every search term must
+match, each as a prefix for orders, so results show up while the admin is
+still typing.
+"""
+import re
+import uuid
+
+from sqlalchemy import and_, column, func, literal, literal_column, or_, select, table, text
+
+SEARCH_CONFIG = "spanish"
+MAX_TERMS = 8
+ORDER_WEIGHTS = (10.0, 4.0, 2.0, 2.0) # bm25 weights on SQLite: title, description, pickup, delivery address
+USER_TRIGRAM_COLUMNS = ("name", "email", "phone")
+
+ORDER_VECTOR = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(pickup_address, '') || ' ' || coalesce(delivery_address, '')), 'C')"
+)
+
+
+def search_terms(query: str):
+    """Lowercased words and numbers of the query, at most MAX_TERMS"""
+    return re.findall(r"\w+", query.lower())[:MAX_TERMS]
+
+
+def _as_uuid(query: str):
+    try:
+        return str(uuid.UUID(query.strip()))
+    except ValueError:
+        return None
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("/", "//").replace("%", "/%").replace("_", "/_")
+
+
+def order_search(statement, orders, query: str, dialect: str, max_candidates: int = 2000):
+    """Restrict an orders select to the search matches; returns (statement, rank), higher rank is better
+
+    A query that is an order id matches that order only. Ranking is limited to
+    the newest max_candidates matches, so a term matching half the table costs a
+    short index scan instead of ranking every row.
+    """
+    order_id = _as_uuid(query)
+    if order_id:
+        return statement.where(orders.c.id == order_id), literal(1.0)
+    terms = search_terms(query)
+
+    if dialect == "postgresql":
+        tsquery = func.to_tsquery(SEARCH_CONFIG, " & ".join(f"{term}:*" for term in terms))
+        vector = literal_column(f"{orders.name}.search_vector")
+        candidates = (
+            select(orders.c.id).where(vector.op("@@")(tsquery))
+            .order_by(orders.c.created_at.desc()).limit(max_candidates)
+            .correlate(None) # Its own scan of orders, not the outer query's row
+        )
+        return statement.where(orders.c.id.in_(candidates)), func.ts_rank_cd(vector, tsquery)
+
+    fts = table(f"{orders.name}_fts", column("rowid"))
+    match = " ".join(f'"{term}"*' for term in terms)
+    # Rowids follow insertion order: the max_candidates-th newest match bounds a rowid range FTS5 scans alone
+    cutoff = (
+        select(fts.c.rowid).where(literal_column(fts.name).match(match))
+        .order_by(fts.c.rowid.desc()).offset(max_candidates - 1).limit(1)
+        .correlate(None).scalar_subquery()
+    )
+    statement = statement.join_from(orders, fts, fts.c.rowid == literal_column(f"{orders.name}.rowid")).where(
+        literal_column(fts.name).match(match), fts.c.rowid >= func.coalesce(cutoff, 0)
+    )
+    return statement, -func.bm25(literal_column(fts.name), *ORDER_WEIGHTS)
+
+
+def user_search(statement, users, query: str, dialect: str):
+    """Restrict a users select to the search matches; returns (statement, rank), higher rank is better
+
+    Every term must appear somewhere in the name, email or phone, anywhere in the word.
+    """
+    terms = search_terms(query)
+    fields = [users.c[name] for name in USER_TRIGRAM_COLUMNS]
+
+    if dialect == "postgresql":
+        conditions = [
+            or_(*[field.ilike(f"%{_escape_like(term)}%", escape="/") for field in fields]) for term in terms
+        ]
+        rank = func.greatest(*[func.similarity(field, query) for field in fields])
+        return statement.where(and_(*conditions)), rank
+
+    # The trigram tokenizer needs 3+ characters; shorter terms are checked with LIKE
+    long_terms = [term for term in terms if len(term) >= 3]
+    conditions = [
+        or_(*[field.like(f"%{_escape_like(term)}%", escape="/") for field in fields]) for term in terms if len(term) < 3
+    ]
+    if not long_terms:
+        return statement.where(and_(*conditions)), literal(0.0)
+    fts = table(f"{users.name}_fts", column("rowid"))
+    match = " AND ".join(f'"{term}"' for term in long_terms)
+    statement = statement.join(fts, fts.c.rowid == literal_column(f"{users.name}.rowid")).where(
+        literal_column(fts.name).match(match), *conditions
+    )
+    return statement, -func.bm25(literal_column(fts.name))
+
+
+def _fts_table_sql(table_name: str, columns, tokenize: str):
+    names = ", ".join(columns)
+    new = ", ".join(f"new.{name}" for name in columns)
+    old = ", ".join(f"old.{name}" for name in columns)
+    fts = f"{table_name}_fts"
+    delete = f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.rowid, {old});"
+    insert = f"INSERT INTO {fts}(rowid, {names}) VALUES (new.rowid, {new});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, content='{table_name}', content_rowid='rowid', tokenize='{tokenize}')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table_name} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table_name} BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {names} ON {table_name} BEGIN {delete} {insert} END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def create_search_indexes(connection, orders_table: str = "orders", users_table: str = "users"):
+    """Search column, indexes / FTS tables for the connection's dialect (search_indexes migration)"""
+    if connection.dialect.name == "postgresql":
+        statements = [
+            f"ALTER TABLE {orders_table} ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ({ORDER_VECTOR}) STORED",
+            f"CREATE INDEX IF NOT EXISTS ix_{orders_table}_search_vector ON {orders_table} USING gin (search_vector)",
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        ] + [
+            f"CREATE INDEX IF NOT EXISTS ix_{users_table}_{name}_trgm ON {users_table} USING gin ({name} gin_trgm_ops)"
+            for name in USER_TRIGRAM_COLUMNS
+        ]
+    elif connection.dialect.name == "sqlite":
+        statements = (
+            _fts_table_sql(orders_table, ["title", "description", "pickup_address", "delivery_address"], "unicode61 remove_diacritics 2")
+            + _fts_table_sql(users_table, list(USER_TRIGRAM_COLUMNS), "trigram")
+        )
+    else:
+        raise NotImplementedError(f"Admin search supports PostgreSQL and SQLite, not {connection.dialect.name}")
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+def drop_search_indexes(connection, orders_table: str = "orders", users_table: str = "users"):
+    if connection.dialect.name == "postgresql":
+        statements = [f"DROP INDEX IF EXISTS ix_{users_table}_{name}_trgm" for name in USER_TRIGRAM_COLUMNS] + [
+            f"DROP INDEX IF EXISTS ix_{orders_table}_search_vector",
+            f"ALTER TABLE {orders_table} DROP COLUMN IF EXISTS search_vector",
+        ]
+    else:
+        statements = [
+            f"DROP TRIGGER IF EXISTS {name}_fts_{event}" for name in (orders_table, users_table) for event in ("insert", "delete", "update")
+        ] + [f"DROP TABLE IF EXISTS {name}_fts" for name in (orders_table, users_table)]
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+def is_search_object(type_: str, name: str) -> bool:
+    """Objects created by create_search_indexes, outside the models (for Alembic autogenerate)"""
+    if type_ == "column":
+        return name == "search_vector"
+    if type_ == "index":
+        return name.endswith("_trgm") or name.endswith("_search_vector")
+    if type_ == "table":
+        return re.match(r"^(orders|users)_fts(_\w+)?$", name) is not None
+    return False
@@ -0,0 +1,65 @@
+"""Fast JSON path for list endpoints: SQL rows straight to JSON bytes.
+
+List endpoints used to build two Pydantic models per row
+(``Order.model_validate(...).model_dump()`` then ``OrderResponse(...)``) and
+let FastAPI validate the response_model a third time. Here the query selects
+exactly the response fields, and the row mappings are encoded in one call by
+orjson when installed, or by a pre-built Pydantic TypeAdapter (Rust encoder)
+otherwise. Both write enums as their value and datetimes as ISO 8601, the
+same as the Pydantic response models.
+"""
+import json
+from typing import Any, Dict, List
+
+from pydantic import TypeAdapter
+from starlette.responses import Response
+
+try: # Optional: fastest encoder, the TypeAdapter path works without it
+    import orjson
+except ImportError:
+    orjson = None
+
+ROWS_ADAPTER = TypeAdapter(List[Dict[str, Any]])
+PAYLOAD_ADAPTER = TypeAdapter(Any) # Nested payloads such as the admin dashboard
+
+
+def response_columns(response_model, db_model, **extra):
+    """Select list for response_model's fields: table columns by name plus labelled extra expressions"""
+    table_columns = db_model.__table__.c
+    columns = []
+    for name in response_model.model_fields:
+        if name in extra:
+            columns.append(extra[name].label(name))
+        elif name in table_columns:
+            columns.append(table_columns[name])
+    return columns
+
+
+def rows_to_json(payload) -> bytes:
+    """Encode a list of row dicts (or a dict of them) as JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return (ROWS_ADAPTER if isinstance(payload, list) else PAYLOAD_ADAPTER).dump_json(payload)
+
+
+class JSONBytesResponse(Response):
+    """Response whose content is already encoded JSON"""
+    media_type = "application/json"
+
+
+def json_rows(result, json_fields=()):
+    """Plain dicts from a SQLAlchemy result, ready for rows_to_json
+
+    json_fields: columns stored as JSON text, decoded so they are nested objects in the output.
+    """
+    rows = [dict(row) for row in result.mappings()]
+    for field in json_fields:
+        for row in rows:
+            if isinstance(row.get(field), str):
+                row[field] = json.loads(row[field])
+    return rows
+
+
+def json_rows_response(result, json_fields=()):
+    """Encode a SQLAlchemy result as a JSON list of objects"""
+    return JSONBytesResponse(rows_to_json(json_rows(result, json_fields)))
@@ -0,0 +1,107 @@
+"""Batch settlement of driver balances.
+
+Nets every driver's pending payouts (owner owes driver) against the commission
+they owe from cash collections (driver owes owner) over a period. The result is
+one settlement row per driver, and every included row is marked with a single
+UPDATE per source table instead of one HTTP call / commit per row.
+
+The engine only needs a SQLAlchemy session and the models, which server.py
+passes in through ``SettlementSource``.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import func, insert, select, update
+
+from ids import new_id
+from money import from_cents, to_cents
+
+# model: ORM class with driver_id and settlement_batch_id columns
+# amount/status/date: columns on that model, pending/settled: status values before and after settling
+SettlementSource = namedtuple("SettlementSource", ["model", "amount", "status", "date", "pending", "settled"])
+
+
+def _pending_conditions(source: SettlementSource, period_start: datetime, period_end: datetime):
+    return [
+        source.status == source.pending,
+        source.model.settlement_batch_id.is_(None),
+        source.date >= period_start,
+        source.date < period_end,
+    ]
+
+
+def _driver_totals(db, source: SettlementSource, conditions):
+    """Sum (in centavos) and count per driver, aggregated by the database"""
+    statement = select(
+        source.model.driver_id, func.coalesce(func.sum(source.amount), 0), func.count()
+    ).where(*conditions).group_by(source.model.driver_id)
+    return {driver_id: (to_cents(total), count) for driver_id, total, count in db.execute(statement)}
+
+
+def net_settlements(payout_totals: dict, collection_totals: dict):
+    """Combine per-driver totals (centavos) into one settlement per driver
+
+    net_amount > 0: the owner pays the driver, net_amount < 0: the driver pays the owner.
+    """
+    settlements = []
+    for driver_id in sorted(set(payout_totals) | set(collection_totals)):
+        payouts_total, payout_count = payout_totals.get(driver_id, (0, 0))
+        commission_total, collection_count = collection_totals.get(driver_id, (0, 0))
+        settlements.append({
+            "driver_id": driver_id,
+            "payouts_total": from_cents(payouts_total),
+            "commission_total": from_cents(commission_total),
+            "net_amount": from_cents(payouts_total - commission_total),
+            "payout_count": payout_count,
+            "collection_count": collection_count,
+        })
+    return settlements
+
+
+def run_settlement(db, payouts: SettlementSource, collections: SettlementSource, settlement_model,
+                   period_start: datetime, period_end: datetime, dry_run: bool = False,
+                   settlement_status=None, created_by: str = None):
+    """Settle all pending rows in [period_start, period_end). The caller commits.
+
+    In dry-run mode nothing is written, the settlements that would be created are returned.
+    """
+    if dry_run:
+        settlements = net_settlements(
+            _driver_totals(db, payouts, _pending_conditions(payouts, period_start, period_end)),
+            _driver_totals(db, collections, _pending_conditions(collections, period_start, period_end)),
+        )
+        return {"batch_id": None, "dry_run": True, "settlements": settlements}
+
+    batch_id = new_id()
+    now = datetime.utcnow()
+
+    # Claim and mark rows with one UPDATE per table. Rows already claimed by a
+    # concurrent run no longer match settlement_batch_id IS NULL.
+    for source in (payouts, collections):
+        db.execute(
+            update(source.model)
+            .where(*_pending_conditions(source, period_start, period_end))
+            .values({source.status: source.settled, source.model.settlement_batch_id: batch_id})
+            .execution_options(synchronize_session=False)
+        )
+
+    settlements = net_settlements(
+        _driver_totals(db, payouts, [payouts.model.settlement_batch_id == batch_id]),
+        _driver_totals(db, collections, [collections.model.settlement_batch_id == batch_id]),
+    )
+    if settlements:
+        db.execute(insert(settlement_model), [
+            dict(
+                settlement,
+                id=new_id(),
+                batch_id=batch_id,
+                period_start=period_start,
+                period_end=period_end,
+                status=settlement_status,
+                created_at=now,
+                created_by=created_by,
+            )
+            for settlement in settlements
+        ])
+
+    return {"batch_id": batch_id, "dry_run": False, "settlements": settlements}
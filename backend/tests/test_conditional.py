@@ -0,0 +1,78 @@
+import os
+import sys
+
+from sqlalchemy import Column, DateTime, Integer, String, create_engine, update
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from conditional import read_versions, track_changes  # noqa: E402
+
+Base = declarative_base()
+
+
+class User(Base):
+    __tablename__ = "users"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    verification_code = Column(String, nullable=True)
+    total_orders = Column(Integer, default=0, nullable=False)
+
+
+class ChangeVersion(Base):
+    __tablename__ = "change_versions"
+
+    resource = Column(String, primary_key=True)
+    version = Column(Integer, default=0, nullable=False)
+    changed_at = Column(DateTime, nullable=True)
+
+
+RESOURCES = ("users", "users.totals")
+
+
+def session_factory():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    track_changes(Session, ChangeVersion, column_resources={
+        "users": {"verification_code": None, "total_orders": "users.totals"},
+    })
+    return Session
+
+
+def versions(Session):
+    with Session() as db:
+        return {resource: version for resource, (version, _) in read_versions(db, ChangeVersion, RESOURCES).items()}
+
+
+def test_column_resources_keep_table_version():
+    Session = session_factory()
+    with Session() as db:
+        db.add(User(id=1, name="Ana"))
+        db.commit()
+    assert versions(Session) == {"users": 1, "users.totals": 0}
+
+    with Session() as db:
+        db.get(User, 1).verification_code = "123456" # Shown by no endpoint
+        db.commit()
+        db.query(User).filter(User.id == 1).update({User.total_orders: User.total_orders + 1}, synchronize_session=False)
+        db.commit()
+    assert versions(Session) == {"users": 1, "users.totals": 1}
+
+    with Session() as db:
+        user = db.get(User, 1)
+        user.name, user.total_orders = "Ana María", 5
+        db.commit()
+        db.execute(update(User).where(User.id == 1).values(name="Ana"))
+        db.commit()
+    assert versions(Session) == {"users": 3, "users.totals": 2}
+
+
+def test_unchanged_flush_bumps_nothing():
+    Session = session_factory()
+    with Session() as db:
+        db.add(User(id=1, name="Ana"))
+        db.commit()
+        db.get(User, 1).name = "Ana" # Same value: nothing is written
+        db.commit()
+    assert versions(Session) == {"users": 1, "users.totals": 0}
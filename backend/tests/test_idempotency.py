@@ -0,0 +1,138 @@
+import asyncio
+import os
+import sys
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+from sqlalchemy import Boolean, Column, Float, Integer, LargeBinary, String, create_engine
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from idempotency import DatabaseIdempotencyStore, IdempotencyStore, idempotency_middleware  # noqa: E402
+
+Base = declarative_base()
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(64), primary_key=True)
+    fingerprint = Column(String(32), nullable=False)
+    status_code = Column(Integer, nullable=True)
+    media_type = Column(String, nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    compressed = Column(Boolean, default=False, nullable=False)
+    expires_at = Column(Float, nullable=False, index=True)
+
+
+HEADERS = {"Idempotency-Key": "retry-123", "Authorization": "Bearer client-a"}
+
+# PostgreSQL runs too when TEST_DATABASE_URL points at one (the table is created and dropped)
+ENGINE_URLS = ["sqlite"] + ([os.environ["TEST_DATABASE_URL"]] if os.environ.get("TEST_DATABASE_URL") else [])
+
+
+@pytest.fixture(params=ENGINE_URLS, ids=lambda url: url.split(":")[0])
+def Session(request, tmp_path):
+    # A file, not sqlite://: every worker thread gets its own connection to the same database
+    url = f"sqlite:///{tmp_path / 'idempotency.db'}" if request.param == "sqlite" else request.param
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+def worker(store, executions, delay=0.2):
+    """One app process: its own middleware and store, the executions counter shared between workers"""
+    app = FastAPI()
+    app.middleware("http")(idempotency_middleware(store, [r"/api/orders"], wait_timeout=5, blocking=isinstance(store, DatabaseIdempotencyStore)))
+
+    @app.post("/api/orders")
+    async def create_order(payload: dict):
+        executions.append(payload["title"])
+        await asyncio.sleep(delay) # Every duplicate arrives while the first one is in flight
+        if payload["title"] == "fail":
+            raise HTTPException(status_code=503, detail="try again")
+        return {"order_id": f"order-{len(executions)}", "title": payload["title"]}
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+async def post_all(clients, count, title="Mandado", headers=HEADERS):
+    return await asyncio.gather(*[
+        clients[index % len(clients)].post("/api/orders", json={"title": title}, headers=headers) for index in range(count)
+    ])
+
+
+def test_in_memory_duplicates_in_flight_run_once():
+    executions = []
+
+    async def scenario():
+        async with worker(IdempotencyStore(ttl_seconds=60), executions) as client:
+            return await post_all([client], 20)
+
+    responses = asyncio.run(scenario())
+    assert executions == ["Mandado"]
+    assert {response.text for response in responses} == {responses[0].text} and all(r.status_code == 200 for r in responses)
+
+
+def test_duplicates_across_workers_run_once(Session):
+    executions = []
+
+    async def scenario():
+        # Two workers, one table: the placeholder row is the only thing they share
+        async with worker(DatabaseIdempotencyStore(Session, IdempotencyKey, poll_interval=0.01), executions) as first, \
+                worker(DatabaseIdempotencyStore(Session, IdempotencyKey, poll_interval=0.01), executions) as second:
+            responses = await post_all([first, second], 20)
+            replay = await second.post("/api/orders", json={"title": "Mandado"}, headers=HEADERS)
+            mismatch = await first.post("/api/orders", json={"title": "Otro"}, headers=HEADERS)
+        return responses, replay, mismatch
+
+    responses, replay, mismatch = asyncio.run(scenario())
+    assert executions == ["Mandado"]
+    assert {response.text for response in responses} == {responses[0].text} and all(r.status_code == 200 for r in responses)
+    assert replay.headers.get("Idempotent-Replayed") == "true" and replay.text == responses[0].text
+    assert mismatch.status_code == 422 and executions == ["Mandado"]
+    with Session() as db:
+        row = db.query(IdempotencyKey).one()
+        assert row.status_code == 200 and row.fingerprint is not None
+
+
+def test_server_error_releases_the_key(Session):
+    executions = []
+    store = DatabaseIdempotencyStore(Session, IdempotencyKey, poll_interval=0.01)
+
+    async def scenario():
+        async with worker(store, executions, delay=0) as client:
+            failed = await client.post("/api/orders", json={"title": "fail"}, headers=HEADERS)
+            retried = await client.post("/api/orders", json={"title": "fail"}, headers=HEADERS)
+        return failed, retried
+
+    failed, retried = asyncio.run(scenario())
+    assert failed.status_code == retried.status_code == 503 and "Idempotent-Replayed" not in retried.headers
+    assert executions == ["fail", "fail"] # Not stored: the retry ran again
+    with Session() as db:
+        assert db.query(IdempotencyKey).count() == 0
+
+
+def test_expired_rows_are_taken_over_and_purged(Session):
+    now = [1000.0]
+    store = DatabaseIdempotencyStore(Session, IdempotencyKey, ttl_seconds=60, lease_seconds=10, purge_every=3, clock=lambda: now[0])
+    key, other = b"k" * 32, b"o" * 32
+
+    state, entry = store.begin(key, b"f" * 16)
+    assert state == "new"
+    assert store.begin(key, b"f" * 16)[0] == "in_flight"
+    now[0] += 11 # The worker holding the key died: its lease ran out
+    state, entry = store.begin(key, b"f" * 16)
+    assert state == "new"
+    store.complete(entry, 201, b'{"ok":true}', "application/json")
+    state, stored = store.begin(key, b"f" * 16)
+    assert state == "replay" and stored.response().status_code == 201 and stored.response().body == b'{"ok":true}'
+
+    now[0] += 61 # The stored response expired too; the third claim of this store purges it
+    assert store.begin(other, b"g" * 16)[0] == "new"
+    with Session() as db:
+        assert [row.key for row in db.query(IdempotencyKey)] == [other.hex()]
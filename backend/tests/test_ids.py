@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+import uuid
+
+import pytest
+from sqlalchemy import Column, String, create_engine, select, text
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ids import NIL_ID, UUIDKey, new_id, uuid7  # noqa: E402
+
+Base = declarative_base()
+
+
+class Order(Base):
+    __tablename__ = "test_id_orders"
+
+    id = Column(UUIDKey(), primary_key=True, default=new_id)
+    client_id = Column(UUIDKey(), nullable=True, index=True)
+    title = Column(String, nullable=False)
+
+
+# PostgreSQL runs too when TEST_DATABASE_URL points at one (the table is created and dropped)
+ENGINE_URLS = ["sqlite://"] + ([os.environ["TEST_DATABASE_URL"]] if os.environ.get("TEST_DATABASE_URL") else [])
+
+
+@pytest.fixture(params=ENGINE_URLS, ids=lambda url: url.split(":")[0])
+def Session(request):
+    engine = create_engine(request.param)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+def test_uuid7_layout():
+    before = time.time_ns() // 1_000_000
+    value = uuid7()
+    after = time.time_ns() // 1_000_000
+    assert value.version == 7 and value.variant == uuid.RFC_4122
+    assert before <= value.int >> 80 <= after # Leading 48 bits: unix time in ms
+
+
+def test_ids_sort_by_creation_time():
+    ids = []
+    for _ in range(5):
+        ids += [new_id() for _ in range(200)]
+        time.sleep(0.002)
+    timestamps = [uuid.UUID(value).int >> 80 for value in ids]
+    assert timestamps == sorted(timestamps)
+    # Across milliseconds the string form sorts like the creation order (within one ms the order is random)
+    first_ms = [value for value, ms in zip(ids, timestamps) if ms == timestamps[0]]
+    last_ms = [value for value, ms in zip(ids, timestamps) if ms == timestamps[-1]]
+    assert max(first_ms) < min(last_ms)
+
+
+def test_ids_are_unique_dashed_strings():
+    ids = [new_id() for _ in range(10_000)]
+    assert len(set(ids)) == len(ids)
+    assert all(len(value) == 36 and str(uuid.UUID(value)) == value for value in ids)
+
+
+def test_round_trip_keeps_the_dashed_string(Session):
+    client_id = new_id()
+    legacy_id = str(uuid.uuid4()) # Pre-migration uuid4 ids keep working
+    with Session() as db:
+        db.add_all([Order(title="new", client_id=client_id), Order(id=legacy_id, title="legacy", client_id=client_id)])
+        db.commit()
+    with Session() as db:
+        rows = db.execute(select(Order.id, Order.client_id, Order.title).order_by(Order.title)).all()
+        assert rows[0] == (legacy_id, client_id, "legacy")
+        assert rows[1].client_id == client_id and isinstance(rows[1].id, str) and uuid.UUID(rows[1].id).version == 7
+        assert db.get(Order, legacy_id).title == "legacy"
+        assert db.query(Order).filter(Order.client_id == client_id).count() == 2
+
+
+def test_lookups_accept_any_uuid_spelling(Session):
+    order_id = new_id()
+    with Session() as db:
+        db.add(Order(id=order_id, title="spelling"))
+        db.commit()
+    with Session() as db:
+        for spelling in (order_id.upper(), order_id.replace("-", ""), f"{{{order_id}}}", uuid.UUID(order_id)):
+            assert db.query(Order.title).filter(Order.id == spelling).scalar() == "spelling", spelling
+
+
+def test_malformed_ids_find_nothing_instead_of_raising(Session):
+    with Session() as db:
+        db.add(Order(title="real"))
+        db.commit()
+    with Session() as db:
+        for malformed in ("not-a-uuid", "123", "", "'; DROP TABLE test_id_orders; --"):
+            assert db.query(Order).filter(Order.id == malformed).first() is None
+        assert db.query(Order).count() == 1
+
+
+def test_storage_is_native_uuid_or_32_hex_digits(Session):
+    order_id = new_id()
+    with Session() as db:
+        db.add(Order(id=order_id, title="stored"))
+        db.commit()
+        stored = db.execute(text("SELECT id FROM test_id_orders")).scalar()
+        if db.get_bind().dialect.name == "postgresql":
+            assert stored == uuid.UUID(order_id)
+        else:
+            assert stored == order_id.replace("-", "")
+    assert NIL_ID == str(uuid.UUID(int=0))
@@ -0,0 +1,240 @@
+import os
+import sys
+from collections import defaultdict
+from datetime import datetime
+
+import pytest
+from sqlalchemy import Column, DateTime, Integer, String, create_engine, func, select, update
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ledger  # noqa: E402
+from ids import UUIDKey, new_id  # noqa: E402
+from money import Cents, from_cents, to_cents  # noqa: E402
+from settlement import SettlementSource, net_settlements, run_settlement  # noqa: E402
+
+Base = declarative_base()
+
+
+class LedgerEntry(Base):
+    __tablename__ = "ledger_entries"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    transaction_id = Column(UUIDKey(), nullable=False, index=True)
+    driver_id = Column(UUIDKey(), nullable=False, index=True)
+    account = Column(String, nullable=False)
+    amount = Column(Cents, nullable=False)
+    entry_type = Column(String, nullable=False)
+    reference_type = Column(String, nullable=True)
+    reference_id = Column(UUIDKey(), nullable=True)
+    created_at = Column(DateTime, nullable=False)
+
+
+class DriverBalance(Base):
+    __tablename__ = "driver_balances"
+
+    driver_id = Column(UUIDKey(), primary_key=True)
+    balance = Column(Cents, default=0, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+
+class Payout(Base):
+    __tablename__ = "driver_payouts"
+
+    id = Column(UUIDKey(), primary_key=True, default=new_id)
+    driver_id = Column(UUIDKey(), nullable=False, index=True)
+    amount = Column(Cents, nullable=False)
+    transfer_status = Column(String, default="pending", nullable=False)
+    settlement_batch_id = Column(UUIDKey(), nullable=True, index=True)
+    created_at = Column(DateTime, nullable=False)
+
+
+class Collection(Base):
+    __tablename__ = "cash_collections"
+
+    id = Column(UUIDKey(), primary_key=True, default=new_id)
+    driver_id = Column(UUIDKey(), nullable=False, index=True)
+    commission_owed = Column(Cents, nullable=False)
+    payment_status = Column(String, default="pending", nullable=False)
+    collection_date = Column(DateTime, nullable=False)
+    settlement_batch_id = Column(UUIDKey(), nullable=True, index=True)
+
+
+class Settlement(Base):
+    __tablename__ = "driver_settlements"
+
+    id = Column(UUIDKey(), primary_key=True, default=new_id)
+    batch_id = Column(UUIDKey(), nullable=False)
+    driver_id = Column(UUIDKey(), nullable=False)
+    period_start = Column(DateTime, nullable=False)
+    period_end = Column(DateTime, nullable=False)
+    payouts_total = Column(Cents, nullable=False)
+    commission_total = Column(Cents, nullable=False)
+    net_amount = Column(Cents, nullable=False)
+    payout_count = Column(Integer, nullable=False)
+    collection_count = Column(Integer, nullable=False)
+    status = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    created_by = Column(UUIDKey(), nullable=True)
+
+
+class ExpectedBalance(Base): # What the source tables say each driver's balance is
+    __tablename__ = "expected_balances"
+
+    driver_id = Column(UUIDKey(), primary_key=True)
+    balance = Column(Cents, nullable=False)
+
+
+PAYOUTS = SettlementSource(Payout, Payout.amount, Payout.transfer_status, Payout.created_at, "pending", "completed")
+COLLECTIONS = SettlementSource(Collection, Collection.commission_owed, Collection.payment_status, Collection.collection_date, "pending", "paid")
+PERIOD = (datetime(2026, 9, 1), datetime(2026, 10, 1))
+DRIVERS = sorted(new_id() for _ in range(3))
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        yield session
+
+
+def post(db, postings):
+    return ledger.post_entries(db, LedgerEntry, DriverBalance, postings)
+
+
+def balances(db):
+    return dict(db.execute(select(DriverBalance.driver_id, DriverBalance.balance)).all())
+
+
+def ledger_totals(db):
+    statement = select(LedgerEntry.driver_id, func.sum(LedgerEntry.amount)).where(
+        LedgerEntry.account == ledger.DRIVER_ACCOUNT
+    ).group_by(LedgerEntry.driver_id)
+    return dict(db.execute(statement).all())
+
+
+def test_every_transaction_balances_to_zero(db):
+    a, b, _ = DRIVERS
+    posted = post(db, [
+        (a, ledger.PAYOUT_ACCRUED, 81.09, "driver_payout", new_id()),
+        (a, ledger.COMMISSION_OWED, 19.33, "cash_collection", new_id()),
+        (b, ledger.PAYOUT_ACCRUED, 0.01, "driver_payout", new_id()),
+        (b, ledger.PAYOUT_PAID, 0.01, "driver_payout", new_id()),
+        (b, ledger.COMMISSION_OWED, 0, "cash_collection", new_id()), # Zero amounts post nothing
+    ])
+    assert posted == 4
+    legs = defaultdict(list)
+    for entry in db.query(LedgerEntry):
+        legs[entry.transaction_id].append(entry)
+    assert len(legs) == 4
+    for entries in legs.values():
+        assert sorted(entry.account for entry in entries) == [ledger.DRIVER_ACCOUNT, ledger.PLATFORM_ACCOUNT]
+        assert sum(to_cents(entry.amount) for entry in entries) == 0
+    assert db.execute(select(func.sum(LedgerEntry.amount))).scalar() == 0
+
+
+def test_driver_legs_follow_the_sign_convention(db):
+    a = DRIVERS[0]
+    for entry_type, sign in ledger.DRIVER_SIGN.items():
+        post(db, [(a, entry_type, 10.0, None, None)])
+        driver_leg = db.query(LedgerEntry).filter(LedgerEntry.account == ledger.DRIVER_ACCOUNT).order_by(LedgerEntry.id.desc()).first()
+        assert driver_leg.entry_type == entry_type and driver_leg.amount == sign * 10.0
+
+
+def test_balances_match_the_sum_of_entries(db):
+    a, b, c = DRIVERS
+    postings = [
+        (a, ledger.PAYOUT_ACCRUED, 100.10, None, None),
+        (a, ledger.COMMISSION_OWED, 15.02, None, None),
+        (b, ledger.COMMISSION_OWED, 0.1, None, None),
+        (b, ledger.COMMISSION_OWED, 0.2, None, None), # 0.1 + 0.2 is exactly 0.30 in centavos
+        (c, ledger.PAYOUT_ACCRUED, 33.33, None, None),
+    ]
+    post(db, postings[:2])
+    post(db, postings[2:]) # Existing and first-time balance rows
+    ledger.post_entry(db, LedgerEntry, DriverBalance, c, ledger.PAYOUT_PAID, 33.33)
+    db.commit()
+
+    expected = defaultdict(int)
+    for driver_id, entry_type, amount, _, _ in postings + [(c, ledger.PAYOUT_PAID, 33.33, None, None)]:
+        expected[driver_id] += ledger.DRIVER_SIGN[entry_type] * to_cents(amount)
+    assert balances(db) == ledger_totals(db) == {driver_id: from_cents(cents) for driver_id, cents in expected.items()}
+    assert balances(db) == {a: 85.08, b: -0.3, c: 0.0}
+
+
+def test_reconciliation_reports_and_fixes_drift(db):
+    a, b, _ = DRIVERS
+    post(db, [(a, ledger.PAYOUT_ACCRUED, 50.0, None, None), (b, ledger.COMMISSION_OWED, 20.0, None, None)])
+    db.execute(update(DriverBalance).where(DriverBalance.driver_id == a).values(balance=49.99)) # Stale materialized row
+    db.add_all([ExpectedBalance(driver_id=a, balance=50.0), ExpectedBalance(driver_id=b, balance=-25.0)]) # b owes 25.00, not 20.00
+    db.commit()
+    expected_statement = select(ExpectedBalance.driver_id, ExpectedBalance.balance).order_by(ledger.driver_order(db, ExpectedBalance.driver_id))
+
+    report = ledger.reconcile_driver_balances(db, LedgerEntry, DriverBalance, expected_statement, fix=True)
+    db.commit()
+    assert report["drivers_checked"] == 2
+    assert report["balance_mismatches"] == 1 and report["ledger_mismatches"] == 1 and report["adjusted"] == 1
+    assert balances(db) == ledger_totals(db) == {a: 50.0, b: -25.0}
+    again = ledger.reconcile_driver_balances(db, LedgerEntry, DriverBalance, expected_statement)
+    assert again["ledger_mismatches"] == again["balance_mismatches"] == 0
+
+
+def test_net_settlements_nets_payouts_against_commission():
+    a, b, c = DRIVERS
+    settlements = net_settlements(
+        {a: (10_010, 2), b: (500, 1)},
+        {a: (1_502, 3), c: (999, 1)},
+    )
+    assert settlements == [
+        {"driver_id": a, "payouts_total": 100.10, "commission_total": 15.02, "net_amount": 85.08, "payout_count": 2, "collection_count": 3},
+        {"driver_id": b, "payouts_total": 5.0, "commission_total": 0.0, "net_amount": 5.0, "payout_count": 1, "collection_count": 0},
+        {"driver_id": c, "payouts_total": 0.0, "commission_total": 9.99, "net_amount": -9.99, "payout_count": 0, "collection_count": 1},
+    ]
+
+
+def seed_settlement_rows(db):
+    a, b, c = DRIVERS
+    inside, before, after = datetime(2026, 9, 15), datetime(2026, 8, 31, 23, 59), PERIOD[1]
+    db.add_all([
+        Payout(driver_id=a, amount=60.05, created_at=inside),
+        Payout(driver_id=a, amount=40.05, created_at=PERIOD[0]), # Period start is included
+        Payout(driver_id=a, amount=999.0, created_at=before),
+        Payout(driver_id=a, amount=999.0, created_at=after), # Period end is excluded
+        Payout(driver_id=b, amount=12.5, created_at=inside),
+        Payout(driver_id=b, amount=999.0, created_at=inside, transfer_status="completed"),
+        Payout(driver_id=b, amount=999.0, created_at=inside, settlement_batch_id=new_id()), # Settled by an earlier run
+        Collection(driver_id=a, commission_owed=15.02, collection_date=inside),
+        Collection(driver_id=c, commission_owed=7.49, collection_date=inside),
+        Collection(driver_id=c, commission_owed=2.5, collection_date=inside),
+        Collection(driver_id=c, commission_owed=999.0, collection_date=after),
+    ])
+    db.commit()
+
+
+def test_settlement_run_nets_pending_rows_in_the_period(db):
+    a, b, c = DRIVERS
+    seed_settlement_rows(db)
+    result = run_settlement(db, PAYOUTS, COLLECTIONS, Settlement, *PERIOD, settlement_status="pending")
+    db.commit()
+
+    nets = {row["driver_id"]: (row["net_amount"], row["payout_count"], row["collection_count"]) for row in result["settlements"]}
+    assert nets == {a: (85.08, 2, 1), b: (12.5, 1, 0), c: (-9.99, 0, 2)}
+    stored = {row.driver_id: row.net_amount for row in db.query(Settlement)}
+    assert stored == {a: 85.08, b: 12.5, c: -9.99}
+    assert {row.batch_id for row in db.query(Settlement)} == {result["batch_id"]}
+    assert db.query(Payout).filter(Payout.settlement_batch_id == result["batch_id"], Payout.transfer_status == "completed").count() == 3
+    assert db.query(Collection).filter(Collection.settlement_batch_id == result["batch_id"], Collection.payment_status == "paid").count() == 3
+
+    # Nothing is left to settle: a second run claims no rows
+    second = run_settlement(db, PAYOUTS, COLLECTIONS, Settlement, *PERIOD)
+    assert second["settlements"] == []
+
+
+def test_dry_run_matches_the_real_run_and_writes_nothing(db):
+    seed_settlement_rows(db)
+    preview = run_settlement(db, PAYOUTS, COLLECTIONS, Settlement, *PERIOD, dry_run=True)
+    assert preview["batch_id"] is None and db.query(Settlement).count() == 0
+    assert db.query(Payout).filter(Payout.settlement_batch_id.isnot(None)).count() == 1
+    result = run_settlement(db, PAYOUTS, COLLECTIONS, Settlement, *PERIOD)
+    assert preview["settlements"] == result["settlements"]
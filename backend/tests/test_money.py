@@ -0,0 +1,119 @@
+import os
+import sys
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from financials import (  # noqa: E402
+    FINANCIAL_FIELDS, IVA_RATE, calculate_order_financials_batch, calculate_order_financials_cents,
+    calculate_order_financials_single, financials_rows, summarize_financials,
+)
+from money import cents_array, from_cents, pesos_array, to_cents  # noqa: E402
+
+
+def half_up(value: Decimal) -> int:
+    return int(value.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def scalar_financials(price, commission_rate, service_fee, iva_rate=IVA_RATE):
+    """One order at a time in exact decimal centavos, rounded half-up like a cashier"""
+    subtotal, fee = to_cents(price), to_cents(service_fee)
+    commission = half_up(subtotal * Decimal(str(commission_rate)))
+    iva = half_up((subtotal + fee) * Decimal(str(iva_rate)))
+    return {
+        "subtotal": subtotal,
+        "service_fee": fee,
+        "iva_amount": iva,
+        "commission_amount": commission,
+        "driver_earnings": subtotal - commission,
+        "owner_earnings": commission + fee + iva,
+        "total_amount": subtotal + fee + iva,
+    }
+
+
+@pytest.mark.parametrize("pesos,cents", [
+    (19.99, 1999), (0.29, 29), (1.005, 101), (0.125, 13), (2.675, 268), (0.005, 1), (0.004, 0), (1e-9, 0),
+    ("10.10", 1010), (Decimal("3.335"), 334), (7, 700), (None, None),
+])
+def test_to_cents_rounds_half_up(pesos, cents):
+    assert to_cents(pesos) == cents
+
+
+def test_cents_array_matches_to_cents_including_half_centavos():
+    rng = np.random.default_rng(3)
+    prices = np.concatenate([
+        np.round(rng.uniform(0, 100_000, 50_000), 3),
+        np.arange(0, 20_000, 5) / 1000, # Every half centavo up to 20 pesos
+    ])
+    assert np.array_equal(cents_array(prices), [to_cents(float(price)) for price in prices])
+    assert cents_array([]).dtype == np.int64
+
+
+def test_pesos_round_trip():
+    cents = np.array([0, 1, 29, 1999, 10_010, 123_456_789])
+    assert np.array_equal(cents_array(pesos_array(cents)), cents)
+    assert all(to_cents(from_cents(int(value))) == value for value in cents)
+
+
+@pytest.mark.parametrize("commission_rate", [0.15, 0.10, 0.12, 0.175, 0.2, 0.125, 0.3333])
+@pytest.mark.parametrize("service_fee", [0, 15.0, 12.5, 9.99])
+def test_vectorized_financials_match_the_scalar_formula(commission_rate, service_fee):
+    prices = np.concatenate([np.arange(1, 3001) / 100, [100.10, 180.0, 999.99, 1000.0, 12_345.67]])
+    batch = calculate_order_financials_cents(cents_array(prices), commission_rate, to_cents(service_fee))
+    for index in range(0, len(prices), 7):
+        expected = scalar_financials(float(prices[index]), commission_rate, service_fee)
+        assert {field: int(batch[field][index]) for field in FINANCIAL_FIELDS} == expected, prices[index]
+
+
+@pytest.mark.parametrize("price,commission_rate,commission", [
+    (100.10, 0.15, 1502), # 1501.5 centavos
+    (1.80, 0.175, 32), # 31.5: 180 * 0.175 is 31.4999... in floats
+    (3.40, 0.175, 60), # 59.5
+    (0.10, 0.15, 2), # 1.5
+    (0.30, 0.15, 5), # 4.5
+])
+def test_half_centavo_commission_rounds_up(price, commission_rate, commission):
+    assert calculate_order_financials_single(price, commission_rate, 0)["commission_amount"] == from_cents(commission)
+
+
+@pytest.mark.parametrize("price,service_fee,iva", [
+    (0.01, 0, 0), # 0.16 centavos
+    (0.03, 0, 0), # 0.48
+    (0.04, 0, 1), # 0.64
+    (3.125, 0, 50), # 313 centavos after half-up -> 50.08
+    (9.375, 0.0, 150), # 938 -> 150.08
+    (12.50, 0, 200), # Exactly 200
+    (15.625, 0, 250), # 1563 -> 250.08
+    (0.25, 12.25, 200), # 1250 -> 200 exactly
+    (100.00, 15.00, 1840),
+])
+def test_iva_on_boundary_prices(price, service_fee, iva):
+    financials = calculate_order_financials_single(price, 0.15, service_fee)
+    assert financials["iva_amount"] == from_cents(iva)
+    assert financials == {field: from_cents(value) for field, value in scalar_financials(price, 0.15, service_fee).items()}
+
+
+def test_parts_add_up_to_the_total_for_every_order():
+    rng = np.random.default_rng(9)
+    prices = np.round(rng.uniform(0.01, 5000, 20_000), 2)
+    batch = calculate_order_financials_cents(cents_array(prices), 0.175, to_cents(12.5))
+    assert np.array_equal(batch["driver_earnings"] + batch["owner_earnings"], batch["total_amount"])
+    assert np.array_equal(batch["subtotal"] + batch["service_fee"] + batch["iva_amount"], batch["total_amount"])
+
+
+def test_single_order_is_a_batch_of_one_and_sums_are_exact():
+    prices = [100.10, 0.29, 1.80, 999.99]
+    batch = calculate_order_financials_batch(prices, 0.175, 12.5)
+    rows = financials_rows(batch)
+    assert rows == [calculate_order_financials_single(price, 0.175, 12.5) for price in prices]
+    totals = summarize_financials(batch)
+    assert totals["total_amount"] == from_cents(sum(to_cents(row["total_amount"]) for row in rows))
+
+
+def test_rates_with_many_digits_do_not_overflow():
+    subtotal = np.array([10**12, 1, 0], dtype=np.int64) # 10 billion pesos
+    rate = 0.1234567890123
+    commission = calculate_order_financials_cents(subtotal, rate, 0)["commission_amount"]
+    assert commission.tolist() == [half_up(int(value) * Decimal(str(rate))) for value in subtotal]
@@ -0,0 +1,100 @@
+import os
+import sys
+from datetime import datetime
+from enum import Enum
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from order_state import (  # noqa: E402
+    ACCEPTED, ADMIN, CANCELLED, CLIENT, DELIVERED, DRIVER, EVENT_STATUS_CHANGED, IN_PROGRESS, PENDING, TRANSITIONS,
+    InvalidTransition, allowed_transitions, apply_transition,
+)
+
+NOW = datetime(2026, 10, 19, 12, 30)
+
+
+class OrderStatus(str, Enum): # Like server.py's: transitions compare by value
+    PENDING = "pending"
+    ACCEPTED = "accepted"
+    DELIVERED = "delivered"
+
+
+def order(status, driver_id="driver-1"):
+    return SimpleNamespace(status=status, driver_id=driver_id, accepted_at=None, delivered_at=None)
+
+
+def test_accept_stamps_accepted_at_and_returns_the_event():
+    row = order(PENDING)
+    event = apply_transition(row, ACCEPTED, DRIVER, now=NOW)
+    assert row.status == ACCEPTED and row.accepted_at == NOW and row.delivered_at is None
+    assert event == {"event_type": EVENT_STATUS_CHANGED, "from_status": PENDING, "to_status": ACCEPTED, "created_at": NOW}
+
+
+def test_deliver_stamps_delivered_at():
+    row = order(IN_PROGRESS)
+    apply_transition(row, DELIVERED, DRIVER, now=NOW)
+    assert row.status == DELIVERED and row.delivered_at == NOW and row.accepted_at is None
+
+
+def test_transition_without_timestamp_stamps_nothing():
+    row = order(ACCEPTED)
+    apply_transition(row, IN_PROGRESS, ADMIN, now=NOW)
+    assert row.status == IN_PROGRESS and row.accepted_at is None and row.delivered_at is None
+
+
+def test_enum_statuses_and_roles_compare_by_value():
+    row = order(OrderStatus.PENDING)
+    event = apply_transition(row, OrderStatus.ACCEPTED, SimpleNamespace(value=DRIVER), now=NOW)
+    assert row.status is OrderStatus.ACCEPTED
+    assert event["from_status"] == PENDING and event["to_status"] == ACCEPTED
+
+
+@pytest.mark.parametrize("from_status,to_status", [
+    (PENDING, DELIVERED), (PENDING, IN_PROGRESS), (ACCEPTED, DELIVERED), (DELIVERED, CANCELLED),
+    (CANCELLED, PENDING), (DELIVERED, PENDING), (ACCEPTED, PENDING),
+])
+def test_illegal_transitions_are_rejected_untouched(from_status, to_status):
+    row = order(from_status)
+    with pytest.raises(InvalidTransition) as error:
+        apply_transition(row, to_status, ADMIN, now=NOW)
+    assert error.value.status_code == 400
+    assert row.status == from_status and row.accepted_at is None and row.delivered_at is None
+
+
+@pytest.mark.parametrize("from_status,to_status,role", [
+    (PENDING, ACCEPTED, CLIENT),
+    (PENDING, CANCELLED, DRIVER),
+    (PENDING, CANCELLED, CLIENT),
+    (IN_PROGRESS, DELIVERED, CLIENT),
+    (IN_PROGRESS, CANCELLED, DRIVER),
+])
+def test_roles_outside_the_transition_get_403(from_status, to_status, role):
+    row = order(from_status)
+    with pytest.raises(InvalidTransition) as error:
+        apply_transition(row, to_status, role, now=NOW)
+    assert error.value.status_code == 403
+    assert row.status == from_status
+
+
+@pytest.mark.parametrize("from_status,to_status", [(PENDING, ACCEPTED), (ACCEPTED, IN_PROGRESS), (IN_PROGRESS, DELIVERED)])
+def test_driver_guard_fails_without_a_driver(from_status, to_status):
+    row = order(from_status, driver_id=None)
+    with pytest.raises(InvalidTransition) as error:
+        apply_transition(row, to_status, ADMIN, now=NOW)
+    assert error.value.status_code == 400
+    assert row.status == from_status and row.accepted_at is None and row.delivered_at is None
+
+
+def test_cancel_needs_no_driver():
+    row = order(PENDING, driver_id=None)
+    apply_transition(row, CANCELLED, ADMIN, now=NOW)
+    assert row.status == CANCELLED
+
+
+def test_allowed_transitions_follow_the_table():
+    assert sorted(allowed_transitions(PENDING)) == [ACCEPTED, CANCELLED]
+    assert sorted(allowed_transitions(IN_PROGRESS)) == [CANCELLED, DELIVERED]
+    assert allowed_transitions(DELIVERED) == [] and allowed_transitions(CANCELLED) == []
+    assert all(ADMIN in transition.roles for transition in TRANSITIONS.values()) # Admins can always intervene
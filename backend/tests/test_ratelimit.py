@@ -0,0 +1,68 @@
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ratelimit import InMemoryBuckets, Limit, _client_ip  # noqa: E402
+
+LOGIN_PER_IP = Limit(20, 1 / 3)
+LOGIN_PER_USER = Limit(5, 1 / 60)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_per_user_bucket_outlives_shorter_limits():
+    # Bursts against one account from a new IP every 70 s: the per-IP limit is full again after
+    # 60 s, which must not reset the per-user bucket (5 tokens, then 1 per minute)
+    clock = FakeClock()
+    buckets = InMemoryBuckets(clock=clock)
+    allowed = 0
+    for burst in range(9):
+        clock.now = burst * 70.0
+        for attempt in range(10):
+            ip_allowed = buckets.take(f"ip:10.0.{burst}.{attempt}:/api/auth/login", LOGIN_PER_IP) == 0
+            if ip_allowed and buckets.take("user:victim@example.com:/api/auth/login", LOGIN_PER_USER) == 0:
+                allowed += 1
+    assert allowed <= LOGIN_PER_USER.capacity + clock.now * LOGIN_PER_USER.refill_per_second + 1
+
+
+def test_full_buckets_are_pruned():
+    clock = FakeClock()
+    buckets = InMemoryBuckets(clock=clock)
+    for _ in range(3):
+        buckets.take("user:a", LOGIN_PER_USER) # Full again after 180 s
+    buckets.take("ip:a", LOGIN_PER_IP) # After 3 s
+    clock.now = 61.0
+    buckets.take("ip:b", LOGIN_PER_IP)
+    assert "user:a" in buckets._buckets and "ip:a" in buckets._buckets # Behind user:a in LRU order
+    clock.now = 301.0
+    buckets.take("ip:c", LOGIN_PER_IP)
+    assert list(buckets._buckets) == ["ip:c"]
+
+
+def test_max_keys_bounds_memory():
+    buckets = InMemoryBuckets(max_keys=3, clock=FakeClock())
+    for i in range(10):
+        buckets.take(f"ip:{i}", LOGIN_PER_IP)
+    assert list(buckets._buckets) == ["ip:7", "ip:8", "ip:9"]
+
+
+def request(forwarded=None, host="10.1.1.1"):
+    headers = {"x-forwarded-for": forwarded} if forwarded is not None else {}
+    return SimpleNamespace(headers=headers, client=SimpleNamespace(host=host))
+
+
+def test_client_ip_uses_the_hop_added_by_the_trusted_proxy():
+    assert _client_ip(request("203.0.113.9")) == "203.0.113.9"
+    # A client sending its own X-Forwarded-For cannot pick the address it is limited as
+    assert _client_ip(request("1.2.3.4, 203.0.113.9")) == "203.0.113.9"
+    assert _client_ip(request("1.2.3.4, 203.0.113.9, 198.51.100.7"), trusted_proxies=2) == "203.0.113.9"
+    assert _client_ip(request("203.0.113.9"), trusted_proxies=2) == "10.1.1.1"
+    assert _client_ip(request("203.0.113.9"), trusted_proxies=0) == "10.1.1.1"
+    assert _client_ip(request()) == "10.1.1.1"
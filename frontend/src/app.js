@@ -434,6 +434,25 @@ const RegisterModal = ({ onClose }) => {
   );
 };
 
+// Admin dashboard lists: rows per page, and the most /admin/dashboard returns per section
+const DASHBOARD_PAGE_SIZE = 200;
+const DASHBOARD_MAX_LIMIT = 5000;
+const DASHBOARD_SECTIONS = ['users', 'orders', 'payments', 'payouts', 'cash_collections', 'pending_drivers'];
+
+const LoadMoreButton = ({ section, hasMore, limits, onLoadMore }) => {
+  if (!hasMore[section] || limits[section] >= DASHBOARD_MAX_LIMIT) return null;
+  return (
+    <div className="text-center py-4 border-t">
+      <button
+        onClick={() => onLoadMore(section)}
+        className="text-blue-600 hover:text-blue-900 font-medium"
+      >
+        Cargar más
+      </button>
+    </div>
+  );
+};
+
 const AdminDashboard = () => {
   const { user, logout } = useAuth();
   const [stats, setStats] = useState(null);
@@ -446,38 +465,40 @@ const AdminDashboard = () => {
   const [commissionConfig, setCommissionConfig] = useState(null);
   const [activeTab, setActiveTab] = useState('overview');
   const [loading, setLoading] = useState(true);
+  const [limits, setLimits] = useState(Object.fromEntries(DASHBOARD_SECTIONS.map((section) => [section, DASHBOARD_PAGE_SIZE])));
+  const [hasMore, setHasMore] = useState({});
 
   useEffect(() => {
     fetchData();
   }, []);
 
-  const fetchData = async () => {
+  const fetchData = async (sectionLimits = limits) => {
     try {
-      const [statsRes, usersRes, ordersRes, configRes, paymentsRes, payoutsRes, cashRes, pendingRes] = await Promise.all([
-        axios.get(`${API}/admin/stats`),
-        axios.get(`${API}/admin/users`),
-        axios.get(`${API}/orders`),
-        axios.get(`${API}/admin/commission-config`),
-        axios.get(`${API}/payments/transactions`),
-        axios.get(`${API}/admin/driver-payouts`),
-        axios.get(`${API}/admin/cash-collections`),
-        axios.get(`${API}/admin/pending-drivers`)
-      ]);
-
-      setStats(statsRes.data);
-      setUsers(usersRes.data);
-      setOrders(ordersRes.data);
-      setCommissionConfig(configRes.data);
-      setPayments(paymentsRes.data);
-      setPayouts(payoutsRes.data);
-      setCashCollections(cashRes.data);
-      setPendingDrivers(pendingRes.data);
+      // All panel sections in one request, newest rows first; refreshes keep the rows already loaded
+      const params = Object.fromEntries(DASHBOARD_SECTIONS.map((section) => [`${section}_limit`, sectionLimits[section]]));
+      const { data } = await axios.get(`${API}/admin/dashboard`, { params });
+
+      setStats(data.stats);
+      setUsers(data.users.items);
+      setOrders(data.orders.items);
+      setCommissionConfig(data.commission_config);
+      setPayments(data.payments.items);
+      setPayouts(data.payouts.items);
+      setCashCollections(data.cash_collections.items);
+      setPendingDrivers(data.pending_drivers.items);
+      setHasMore(Object.fromEntries(DASHBOARD_SECTIONS.map((section) => [section, data[section].has_more])));
     } catch (error) {
       console.error('Error fetching admin data:', error);
     }
     setLoading(false);
   };
 
+  const loadMore = (section) => {
+    const sectionLimits = { ...limits, [section]: Math.min(limits[section] + DASHBOARD_PAGE_SIZE, DASHBOARD_MAX_LIMIT) };
+    setLimits(sectionLimits);
+    fetchData(sectionLimits);
+  };
+
   const approveDriver = async (driverId, approved, comments = '') => {
     try {
       await axios.post(`${API}/admin/approve-driver/${driverId}`, {
@@ -787,6 +808,7 @@ const AdminDashboard = () => {
                       ))}
                     </tbody>
                   </table>
+                  <LoadMoreButton section="orders" hasMore={hasMore} limits={limits} onLoadMore={loadMore} />
                 </div>
               </div>
             )}
@@ -870,6 +892,7 @@ const AdminDashboard = () => {
                     ))}
                   </tbody>
                 </table>
+                <LoadMoreButton section="users" hasMore={hasMore} limits={limits} onLoadMore={loadMore} />
               </div>
             </div>
           </div>
@@ -962,6 +985,7 @@ const AdminDashboard = () => {
                     ))}
                   </tbody>
                 </table>
+                <LoadMoreButton section="pending_drivers" hasMore={hasMore} limits={limits} onLoadMore={loadMore} />
 
                 {pendingDrivers.length === 0 && (
                   <div className="text-center py-12">
@@ -1035,6 +1059,7 @@ const AdminDashboard = () => {
                     ))}
                   </tbody>
                 </table>
+                <LoadMoreButton section="payments" hasMore={hasMore} limits={limits} onLoadMore={loadMore} />
               </div>
             </div>
           </div>
@@ -1103,6 +1128,7 @@ const AdminDashboard = () => {
                     ))}
                   </tbody>
                 </table>
+                <LoadMoreButton section="payouts" hasMore={hasMore} limits={limits} onLoadMore={loadMore} />
               </div>
             </div>
           </div>
@@ -1175,6 +1201,7 @@ const AdminDashboard = () => {
                     ))}
                   </tbody>
                 </table>
+                <LoadMoreButton section="cash_collections" hasMore={hasMore} limits={limits} onLoadMore={loadMore} />
               </div>
             </div>
           </div>
@@ -1868,7 +1895,7 @@ const DriverVerificationSystem = () => {
           file_data: base64Data
         });
 
-        alert('Documento subido y verificado exitosamente');
+        alert('Documento recibido, lo estamos verificando');
         fetchDocuments();
         fetchVerificationStatus();
       };